@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+# Routes that can hold a worker thread and a DB connection for a long time.
+# Keys are "METHOD /path" or just "/path" (any method).
+DEFAULT_ROUTE_LIMITS = {
+    "GET /export-csv/sales_with_products": {"concurrency": 2, "queue": 4, "queue_timeout": 10},
+    "GET /dashboard": {"concurrency": 4, "queue": 8, "queue_timeout": 5},
+}
+
+class RouteLimit:
+    """
+    Concurrency limit for one route: at most `concurrency` requests run at once,
+    up to `queue` more wait for at most `queue_timeout` seconds, the rest get 503.
+    """
+
+    def __init__(self, concurrency: int, queue: int = 0, queue_timeout: float = 0.0, retry_after: Optional[int] = None):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after if retry_after is not None else max(1, math.ceil(queue_timeout))
+        self._semaphore = None
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    async def acquire(self) -> bool:
+        # Created lazily so the semaphore binds to the server's running event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        if self._semaphore.locked():
+            if self.queued >= self.queue:
+                self.rejected_queue_full += 1
+                return False
+            self.queued += 1
+            # Not wait_for: on Python 3.11 it can time out after the acquire went through,
+            # leaking the permit. A waiter given up on hands back whatever it got.
+            acquiring = asyncio.ensure_future(self._semaphore.acquire())
+            try:
+                done, _ = await asyncio.wait({acquiring}, timeout=self.queue_timeout)
+            except BaseException: # Cancelled while queued (client gone)
+                self._abandon(acquiring)
+                raise
+            finally:
+                self.queued -= 1
+            if not done:
+                self._abandon(acquiring)
+                self.rejected_timeout += 1
+                return False
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted_total += 1
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def _abandon(self, acquiring):
+        if acquiring.done():
+            self._release_if_acquired(acquiring)
+        else:
+            acquiring.cancel()
+            acquiring.add_done_callback(self._release_if_acquired)
+
+    def _release_if_acquired(self, acquiring):
+        # The cancellation may land after the permit was granted
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue": self.queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted_total": self.admitted_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_total": self.rejected_queue_full + self.rejected_timeout,
+        }
+
+class AdmissionController:
+    """Holds the configured RouteLimits and resolves which one applies to a request."""
+
+    def __init__(self, limits: Dict[str, dict]):
+        self.routes: Dict[Tuple[Optional[str], str], RouteLimit] = {}
+        for key, options in limits.items():
+            method, _, path = key.strip().rpartition(" ")
+            self.routes[(method.upper() or None, self._normalize(path))] = RouteLimit(**options)
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return path.rstrip("/") or "/"
+
+    def match(self, method: str, path: str) -> Optional[RouteLimit]:
+        path = self._normalize(path)
+        return self.routes.get((method, path)) or self.routes.get((None, path))
+
+    def stats(self) -> dict:
+        return {
+            (f"{method} {path}" if method else path): limit.stats()
+            for (method, path), limit in self.routes.items()
+        }
+
+def load_route_limits() -> Dict[str, dict]:
+    """Reads ADMISSION_LIMITS (a JSON object keyed like DEFAULT_ROUTE_LIMITS), falling back to the defaults."""
+    raw = os.getenv("ADMISSION_LIMITS")
+    if not raw:
+        return DEFAULT_ROUTE_LIMITS
+    try:
+        return json.loads(raw)
+    except ValueError as e:
+        logging.error(f"Invalid ADMISSION_LIMITS, using defaults: {e}")
+        return DEFAULT_ROUTE_LIMITS
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware enforcing per-route concurrency limits.
+
+    Implemented as plain ASGI (not BaseHTTPMiddleware) so the slot is held until
+    the whole response body, including streamed CSV exports, has been sent.
+    """
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.controller.match(scope["method"], scope["path"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limit.acquire():
+            await self._reject(send, limit)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
+
+    @staticmethod
+    async def _reject(send, limit: RouteLimit):
+        body = json.dumps({"detail": "Server is busy with this kind of request. Retry later."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(limit.retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+admission_controller = AdmissionController(load_route_limits())
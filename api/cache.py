@@ -0,0 +1,68 @@
+from collections import OrderedDict
+import os
+import threading
+
+class QueryCache:
+    """
+    Small in-process LRU cache for computed query results.
+
+    Every entry is tagged with the tables it was computed from ("sales", "products",
+    "categories"). Writes call `invalidate(tag)`, which bumps that tag's version; an
+    entry is only served while all of its tags still have the versions they had
+    when it was loaded, so invalidation is O(1) regardless of the number of entries.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _current_versions(self, tags):
+        return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def get_or_load(self, key, loader, tags=()):
+        tags = tuple(tags)
+        with self._lock:
+            entry = self._entries.get(key)
+            versions = self._current_versions(tags)
+            if entry is not None and entry[1] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Versions are captured before loading: a write that lands while the
+        # loader runs leaves the new entry stale rather than silently fresh.
+        value = loader()
+
+        with self._lock:
+            self._entries[key] = (value, versions)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "versions": dict(self._versions),
+            }
+
+query_cache = QueryCache(max_entries=int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256")))
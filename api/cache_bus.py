@@ -0,0 +1,261 @@
+import logging
+import os
+import select
+import threading
+
+from sqlalchemy import event, text, update
+from sqlalchemy.exc import IntegrityError
+
+from . import models
+from .cache import query_cache
+from .database import SessionLocal, engine
+
+CACHE_TAGS = ("categories", "products", "sales")
+NOTIFY_CHANNEL = "gesturepro_cache"
+# Counters bumped inside the writer's transaction in every mode, so they move exactly
+# with the data: they version the sales export (crud.get_export_version). Product and
+# category writes are rare enough for that row lock; sales never take it.
+VERSIONED_TAGS = ("categories", "products")
+
+def mark_dirty(db, *tags):
+    """
+    Records that the current transaction of `db` changes data behind the given cache tags.
+
+    Nothing is invalidated yet: the tags are published with the transaction
+    (NOTIFY) or right after it commits (version bump), see CacheInvalidationBus,
+    and evicted locally once it commits. A rollback discards them.
+    """
+    db.info.setdefault("cache_tags", set()).update(tags)
+
+class CacheInvalidationBus:
+    """
+    Keeps the in-process query caches of several worker processes coherent.
+
+    - `notify` mode (PostgreSQL): committing writers send `pg_notify` inside their
+      transaction, so the message is delivered only if the write commits. Every
+      worker LISTENs on a dedicated connection and evicts the matching tags.
+    - `poll` mode (SQLite, tests): once a write commits, its tags' counters in the
+      `cache_versions` table are bumped in a short transaction of their own (inside
+      the writer's, that row lock would serialize every writer), and every worker
+      polls that table periodically. A worker's own bumps are not reported back to it.
+    - `off`: local invalidation only (single-process deployments).
+
+    Whatever the mode, the `VERSIONED_TAGS` counters are bumped inside the writer's
+    transaction (and not again after it).
+    """
+
+    def __init__(self, mode: str, poll_interval: float = 1.0):
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self._pid = os.getpid()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._seen_versions = {}
+        self._versions_lock = threading.Lock()
+        self._listeners = []
+        self.received_total = 0
+        self.last_error = None
+
+    # --- Publishing ---
+
+    def publish(self, session, tags):
+        """
+        Runs inside the writer's transaction: notifies (notify mode) and bumps the
+        `VERSIONED_TAGS` counters. Returns the versions those bumps reached.
+        """
+        if self.mode == "notify":
+            for tag in sorted(tags):
+                session.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": NOTIFY_CHANNEL, "payload": f"{self._pid}:{tag}"},
+                )
+        cache_versions = models.CacheVersion.__table__
+        bumped = {}
+        for tag in sorted(set(tags).intersection(VERSIONED_TAGS)):
+            version = session.execute(
+                update(cache_versions)
+                .where(cache_versions.c.tag == tag)
+                .values(version=cache_versions.c.version + 1)
+                .returning(cache_versions.c.version)
+            ).scalar()
+            if version is not None:
+                bumped[tag] = version
+        return bumped
+
+    def publish_committed(self, tags, bumped):
+        """Runs after the writer committed (poll mode); `bumped` are the versions `publish` reached."""
+        if self.mode != "poll":
+            return
+        bumped = dict(bumped)
+        cache_versions = models.CacheVersion.__table__
+        remaining = sorted(set(tags).difference(bumped))
+        if remaining:
+            try:
+                with engine.begin() as conn:
+                    for tag in remaining:
+                        conn.execute(
+                            cache_versions.update()
+                            .where(cache_versions.c.tag == tag)
+                            .values(version=cache_versions.c.version + 1)
+                        )
+                    rows = conn.execute(cache_versions.select().where(cache_versions.c.tag.in_(remaining))).all()
+                bumped.update((row.tag, row.version) for row in rows)
+            except Exception as e:
+                # The write itself is committed; other workers see it once their entries expire
+                self.last_error = str(e)
+                logging.error(f"Cache bus: bumping cache_versions for {remaining} failed: {e}")
+        with self._versions_lock:
+            for tag, version in bumped.items():
+                # Only our own bump since the last poll: not a write by another worker
+                if self._seen_versions.get(tag) == version - 1:
+                    self._seen_versions[tag] = version
+
+    # --- Listening ---
+
+    def start(self):
+        if self.mode not in ("notify", "poll") or self._thread is not None:
+            return
+        # Our pid may differ from import time when the app is loaded before gunicorn forks.
+        self._pid = os.getpid()
+        if self.mode == "poll":
+            self._seen_versions = self._init_versions()
+        target = self._listen if self.mode == "notify" else self._poll
+        self._stopping.clear()
+        self._thread = threading.Thread(target=target, name=f"cache-bus-{self.mode}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def add_listener(self, callback):
+        """Calls `callback(tags)` whenever tags are received from other workers (after the cache eviction)."""
+        self._listeners.append(callback)
+
+    def _evict(self, tags):
+        if tags:
+            self.received_total += len(tags)
+            query_cache.invalidate(*tags)
+            for callback in self._listeners:
+                try:
+                    callback(tags)
+                except Exception as e:
+                    logging.error(f"Cache bus: listener {callback} failed: {e}")
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                dbapi_conn = raw.connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                # Anything may have changed while we weren't listening.
+                self._evict(CACHE_TAGS)
+                while not self._stopping.is_set():
+                    if select.select([dbapi_conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    tags = set()
+                    while dbapi_conn.notifies:
+                        pid, _, tag = dbapi_conn.notifies.pop(0).payload.partition(":")
+                        if pid != str(self._pid):
+                            tags.add(tag)
+                    self._evict(tags)
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Cache bus: LISTEN connection failed, reconnecting: {e}")
+                self._stopping.wait(self.poll_interval)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+
+    def _poll(self):
+        while not self._stopping.wait(self.poll_interval):
+            try:
+                if not self._seen_versions:
+                    # start() couldn't read them; everything counts as changed once it can
+                    self._ensure_version_rows()
+                versions = self._read_versions()
+                with self._versions_lock:
+                    # Versions only grow; one read before our own bump was recorded is not a change
+                    changed = [tag for tag, version in versions.items() if version > self._seen_versions.get(tag, -1)]
+                    for tag in changed:
+                        self._seen_versions[tag] = versions[tag]
+                self._evict(changed)
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Cache bus: polling cache_versions failed: {e}")
+
+    def _read_versions(self):
+        with engine.connect() as conn:
+            rows = conn.execute(models.CacheVersion.__table__.select()).all()
+        return {row.tag: row.version for row in rows}
+
+    def _init_versions(self):
+        # Fails soft: an unmigrated database (no cache_versions yet) mustn't stop the app
+        try:
+            self._ensure_version_rows()
+            return self._read_versions()
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f"Cache bus: cache_versions is unavailable (run the migrations), polling will retry: {e}")
+            return {}
+
+    def _ensure_version_rows(self):
+        existing = self._read_versions()
+        for tag in CACHE_TAGS:
+            if tag in existing:
+                continue
+            try:
+                with engine.begin() as conn:
+                    conn.execute(models.CacheVersion.__table__.insert().values(tag=tag, version=0))
+            except IntegrityError:
+                pass # Another worker created it first
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "running": self._thread is not None,
+            "received_total": self.received_total,
+            "last_error": self.last_error,
+        }
+
+def _default_mode():
+    mode = os.getenv("CACHE_BUS")
+    if mode:
+        return mode.strip().lower()
+    return "notify" if engine.dialect.name == "postgresql" else "poll"
+
+cache_bus = CacheInvalidationBus(
+    mode=_default_mode(),
+    poll_interval=int(os.getenv("CACHE_BUS_POLL_INTERVAL_MS", "1000")) / 1000,
+)
+
+# --- Session hooks: publish with (notify, versioned tags) or after (poll) the transaction, evict locally after commit ---
+
+@event.listens_for(SessionLocal, "before_commit")
+def _publish_cache_tags(session):
+    tags = session.info.get("cache_tags")
+    if tags:
+        session.info["cache_versions"] = cache_bus.publish(session, tags)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _evict_cache_tags(session):
+    tags = session.info.pop("cache_tags", None)
+    bumped = session.info.pop("cache_versions", {})
+    if tags:
+        query_cache.invalidate(*tags)
+        cache_bus.publish_committed(tags, bumped)
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_cache_tags(session, previous_transaction):
+    session.info.pop("cache_tags", None)
+    session.info.pop("cache_versions", None)
@@ -0,0 +1,8 @@
+import os
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """Reads a boolean environment variable ("1", "true", "yes", "on" are truthy)."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
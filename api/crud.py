@@ -1,10 +1,23 @@
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, select
+from sqlalchemy.orm import Session, aliased, joinedload, load_only
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy import case, delete, func, insert, lambda_stmt, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from . import models, schemas
+from .cache import query_cache
+from .cache_bus import VERSIONED_TAGS, mark_dirty
+from .database import after_commit
+from .product_index import product_index
+from .sale_events import sale_events
+from .sale_sketches import sale_sketches
+from .sales_columns import epoch_day, sales_columns
+from .sale_watermark import SaleWatermark
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
+from functools import lru_cache, partial
+import hashlib
 from typing import Optional, List, Tuple
 import logging
+import os
 from fastapi import HTTPException, status
 
 # ========= Category CRUD =========
@@ -18,7 +31,7 @@ def get_category_by_name(db: Session, name: str):
 def get_category_by_exact_name(db: Session, name: str):
     return db.query(models.Category).filter(models.Category.name == name).first()
 
-def get_categories(db: Session, skip: int = 0, limit: int = 10, name: Optional[str] = None) -> Tuple[List[models.Category], int]:
+def get_categories(db: Session, skip: int = 0, limit: int = 10, name: Optional[str] = None, with_stats: bool = False) -> Tuple[List, int]:
     query = select(models.Category)
     count_query = select(func.count()).select_from(models.Category)
 
@@ -31,16 +44,50 @@ def get_categories(db: Session, skip: int = 0, limit: int = 10, name: Optional[s
 
     query = query.order_by(models.Category.id).offset(skip).limit(limit)
 
+    if with_stats:
+        return _get_categories_page_stats(db, query), total_count
+
     categories = db.execute(query).scalars().all()
 
     return categories, total_count
 
+def _get_categories_page_stats(db: Session, page_query) -> List[dict]:
+    # One grouped LEFT JOIN over the page only (the products' maintained sales counters),
+    # so categories without products still show up with zeros.
+    page = page_query.subquery()
+    category = aliased(models.Category, page)
+    rows = db.execute(
+        select(
+            category,
+            func.count(models.Product.id),
+            func.coalesce(func.sum(models.Product.units_sold), 0),
+            func.coalesce(func.sum(models.Product.revenue), 0),
+        )
+        .outerjoin(models.Product, models.Product.category_id == category.id)
+        .group_by(*page.c)
+        .order_by(category.id)
+    ).all()
+    return [
+        {
+            "id": row_category.id,
+            "name": row_category.name,
+            "created_at": row_category.created_at,
+            "updated_at": row_category.updated_at,
+            "product_count": product_count,
+            "units_sold": units_sold,
+            "revenue": float(revenue),
+        }
+        for row_category, product_count, units_sold, revenue in rows
+    ]
+
 def create_category(db: Session, category: schemas.CategoryCreate):
+    # Flushes only: the caller's transaction commits (see database.get_db_transaction).
+    # id, created_at and updated_at come back with the INSERT (eager_defaults).
     db_category = models.Category(name=category.name)
     try:
         db.add(db_category)
-        db.commit()
-        db.refresh(db_category)
+        mark_dirty(db, "categories")
+        db.flush()
         return db_category
     except IntegrityError:
         db.rollback()
@@ -74,8 +121,8 @@ def update_category_name(db: Session, category_id: int, category_update: schemas
     db_category.name = category_update.name
 
     try:
-        db.commit()
-        db.refresh(db_category)
+        mark_dirty(db, "categories")
+        db.flush() # The new updated_at comes back with the UPDATE
         return db_category
     except IntegrityError:
         db.rollback()
@@ -94,23 +141,75 @@ def update_category_name(db: Session, category_id: int, category_update: schemas
 # ========= Product CRUD ==========
 
 def get_product(db: Session, product_id: int):
-    return db.query(models.Product).options(joinedload(models.Product.category)).filter(models.Product.id == product_id).first()
+    stmt = lambda_stmt(lambda: select(models.Product).options(joinedload(models.Product.category)))
+    stmt += lambda s: s.where(models.Product.id == product_id)
+    return db.execute(stmt).scalars().first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100, category_name: Optional[str] = None, name: Optional[str] = None):
-    query = db.query(models.Product).options(joinedload(models.Product.category))
-    if category_name:
-        query = query.join(models.Category).filter(models.Category.name.ilike(f"%{category_name}%"))
-    if name:
-        query = query.filter(models.Product.name.ilike(f"%{name}%"))
-    return query.offset(skip).limit(limit).all()
+def get_products_by_ids(db: Session, product_ids: List[int]) -> List[models.Product]:
+    """Loads the given products and their categories with one `IN` query (unordered, missing IDs skipped)."""
+    if not product_ids:
+        return []
+    stmt = lambda_stmt(lambda: select(models.Product).options(joinedload(models.Product.category)))
+    stmt += lambda s: s.where(models.Product.id.in_(product_ids))
+    return db.execute(stmt).scalars().all()
 
-def get_products_count(db: Session, category_name: Optional[str] = None, name: Optional[str] = None) -> int:
-    query = db.query(models.Product)
+def _filter_products(stmt, category_name: Optional[str] = None, name: Optional[str] = None, category_id: Optional[int] = None):
+    # Each optional filter is its own lambda so every filter combination maps
+    # to a stable cache key, with the search values as bound parameters.
+    if category_id is not None:
+        stmt += lambda s: s.where(models.Product.category_id == category_id)
     if category_name:
-        query = query.join(models.Category).filter(models.Category.name.ilike(f"%{category_name}%"))
+        category_search = f"%{category_name}%"
+        stmt += lambda s: s.join(models.Category).where(models.Category.name.ilike(category_search))
     if name:
-        query = query.filter(models.Product.name.ilike(f"%{name}%"))
-    return query.count()
+        name_search = f"%{name}%"
+        stmt += lambda s: s.where(models.Product.name.ilike(name_search))
+    return stmt
+
+def _sort_products(stmt, sort: Optional[str]):
+    # Best first; each order matches one of the (category_id, counter, id) indexes on products.
+    if sort == "units_sold":
+        stmt += lambda s: s.order_by(models.Product.units_sold.desc(), models.Product.id.desc())
+    elif sort == "revenue":
+        stmt += lambda s: s.order_by(models.Product.revenue.desc(), models.Product.id.desc())
+    elif sort == "last_sold_at":
+        stmt += lambda s: s.order_by(models.Product.last_sold_at.desc().nullslast(), models.Product.id.desc())
+    return stmt
+
+def get_products(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    category_name: Optional[str] = None,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+    sort: Optional[str] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+):
+    if fields is None:
+        stmt = lambda_stmt(lambda: select(models.Product).options(joinedload(models.Product.category)))
+    else:
+        # Sparse fieldset (see fieldsets.py): load only the requested columns.
+        options = _product_field_options(fields)
+        stmt = lambda_stmt(lambda: select(models.Product))
+        stmt = stmt.add_criteria(lambda s: s.options(*options), track_on=[options])
+    stmt = _filter_products(stmt, category_name=category_name, name=name, category_id=category_id)
+    stmt = _sort_products(stmt, sort)
+    stmt += lambda s: s.offset(skip).limit(limit)
+    return db.execute(stmt).scalars().all()
+
+@lru_cache(maxsize=256)
+def _product_field_options(fields: Tuple[str, ...]):
+    columns = [getattr(models.Product, field) for field in fields if field != "category"]
+    options = [load_only(*columns)]
+    if "category" in fields:
+        options.append(joinedload(models.Product.category))
+    return tuple(options)
+
+def get_products_count(db: Session, category_name: Optional[str] = None, name: Optional[str] = None, category_id: Optional[int] = None) -> int:
+    stmt = lambda_stmt(lambda: select(func.count(models.Product.id)))
+    stmt = _filter_products(stmt, category_name=category_name, name=name, category_id=category_id)
+    return db.execute(stmt).scalar_one()
 
 def create_product(db: Session, product: schemas.ProductCreateInternal) -> models.Product:
     product_data = product.model_dump()
@@ -133,15 +232,16 @@ def create_product(db: Session, product: schemas.ProductCreateInternal) -> model
         )
 
     db_product = models.Product(**product_data)
+    db_product.category = category # Already loaded: the response needs no SELECT for it
 
     try:
         logging.info(f"Attempting to add product to session: {db_product.__dict__}")
         db.add(db_product)
-        logging.info("Attempting to commit transaction...")
-        db.commit()
-        logging.info("Commit successful. Refreshing product...")
-        db.refresh(db_product)
-        logging.info(f"Product created successfully: ID {db_product.id}")
+        logging.info("Attempting to flush product...")
+        mark_dirty(db, "products")
+        db.flush()
+        after_commit(db, partial(product_index.upsert, db_product.id, db_product.name, db_product.brand, db_product.category_id, db_product.units_sold))
+        logging.info(f"Product flushed: ID {db_product.id}")
         return db_product
     except IntegrityError as e:
         db.rollback()
@@ -186,12 +286,16 @@ def create_multiple_products(db: Session, products: list[schemas.ProductCreateIn
         return [], []
 
     try:
+        mark_dirty(db, "products")
         db.commit()
+        indexed = []
         for p in new_products:
             try:
                 db.refresh(p)
+                indexed.append((p.id, p.name, p.brand, p.category_id, p.units_sold))
             except Exception as refresh_exc:
                 errors.append({"index": "refresh", "product_id": p.id, "error": f"Failed to refresh product: {refresh_exc}"})
+        product_index.upsert_many(indexed)
     except IntegrityError as e:
         db.rollback()
         errors.append({"index": "commit", "error": f"Database commit integrity error: {e}. No products were created."})
@@ -203,18 +307,173 @@ def create_multiple_products(db: Session, products: list[schemas.ProductCreateIn
 
     return new_products, errors
 
+PRODUCT_UPSERT_BATCH_SIZE = 1000
+PRODUCT_UPSERT_COLUMNS = ("name", "description", "price", "category_id", "brand")
+MAX_PRODUCT_PRICE = Decimal("100000000") # DECIMAL(10, 2)
+
+def upsert_products(db: Session, products: List[Tuple[int, schemas.ProductUpsertApiInput]], batch_size: int = PRODUCT_UPSERT_BATCH_SIZE) -> List[dict]:
+    """
+    Inserts or updates products by ID with one `INSERT ... ON CONFLICT (id) DO UPDATE` per batch.
+
+    `products` holds (row number, input) pairs. Returns one outcome per row, in order:
+    "inserted", "updated" or "error". Rows with an invalid price or unknown category
+    are reported and left out of their batch. Each batch commits (and invalidates
+    the product caches) once, so a batch rejected by the database doesn't undo the others.
+    The autocomplete index takes all the committed rows in one merge at the end.
+    """
+    outcomes = {}
+    latest = {} # id -> (row, values): the last row for an ID wins
+    for row, product in products:
+        try:
+            price = Decimal(product.price)
+            if not price.is_finite() or price < 0 or price >= MAX_PRODUCT_PRICE:
+                raise ValueError
+        except (ArithmeticError, ValueError):
+            outcomes[row] = {"row": row, "id": product.id, "status": "error", "error": f"Invalid price: '{product.price}'"}
+            continue
+        if product.id in latest:
+            previous_row = latest[product.id][0]
+            outcomes[previous_row] = {"row": previous_row, "id": product.id, "status": "error", "error": f"Duplicate id, superseded by row {row}"}
+        latest[product.id] = (row, {
+            "id": product.id,
+            "name": product.name,
+            "description": product.description,
+            "price": price,
+            "category_id": product.category_id,
+            "brand": product.brand,
+        })
+
+    pending = list(latest.values())
+    committed = []
+    try:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            batch_outcomes = _upsert_product_batch(db, batch)
+            outcomes.update(batch_outcomes)
+            committed.extend(values for row, values in batch if batch_outcomes[row]["status"] != "error")
+    finally:
+        # One index merge for the whole request, including batches committed before a failure
+        product_index.upsert_many((values["id"], values["name"], values["brand"], values["category_id"], None) for values in committed)
+    return [outcomes[row] for row, _ in products]
+
+def _upsert_product_batch(db: Session, batch: List[Tuple[int, dict]]) -> dict:
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        insert_stmt = postgresql.insert(models.Product.__table__)
+    elif dialect == "sqlite":
+        insert_stmt = sqlite.insert(models.Product.__table__)
+    else:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=f"Bulk upsert is not supported on {dialect}.")
+
+    ids = [values["id"] for _, values in batch]
+    category_ids = {values["category_id"] for _, values in batch}
+    known_categories = set(db.execute(select(models.Category.id).where(models.Category.id.in_(category_ids))).scalars())
+    # Looked up beforehand to tell inserts from updates: RETURNING can't tell them apart
+    # portably (PostgreSQL's `xmax = 0` trick has no SQLite equivalent).
+    existing = set(db.execute(select(models.Product.id).where(models.Product.id.in_(ids))).scalars())
+
+    outcomes = {}
+    rows = []
+    for row, values in batch:
+        if values["category_id"] not in known_categories:
+            outcomes[row] = {"row": row, "id": values["id"], "status": "error", "error": f"Category ID {values['category_id']} not found"}
+            continue
+        rows.append((row, values))
+        outcomes[row] = {"row": row, "id": values["id"], "status": "updated" if values["id"] in existing else "inserted", "error": None}
+    if not rows:
+        return outcomes
+
+    insert_stmt = insert_stmt.values([values for _, values in rows])
+    stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[models.Product.__table__.c.id],
+        set_={**{column: insert_stmt.excluded[column] for column in PRODUCT_UPSERT_COLUMNS}, "updated_at": func.now()},
+    )
+    try:
+        db.execute(stmt)
+        inserted_ids = [values["id"] for _, values in rows if values["id"] not in existing]
+        if inserted_ids and dialect == "postgresql":
+            _advance_product_id_sequence(db, max(inserted_ids))
+        mark_dirty(db, "products")
+        db.commit()
+    except DBAPIError as e: # Integrity or data errors: the batch fails, not the request
+        db.rollback()
+        logging.error(f"Bulk product upsert: batch of {len(rows)} rejected: {e.orig}")
+        for row, values in rows:
+            outcomes[row] = {"row": row, "id": values["id"], "status": "error", "error": f"Batch rejected by the database: {e.orig}"}
+    return outcomes
+
+def _advance_product_id_sequence(db: Session, max_id: int):
+    # Explicit IDs bypass the serial sequence: move it past them (never backwards)
+    # so the next POST /products doesn't collide.
+    sequence = db.execute(text("SELECT pg_get_serial_sequence('products', 'id')")).scalar()
+    db.execute(text(f"SELECT setval(:sequence, :max_id) FROM {sequence} WHERE last_value < :max_id"), {"sequence": sequence, "max_id": max_id})
+
 # ========= Sale CRUD ============
 
 def get_sale(db: Session, sale_id: int):
     return db.query(models.Sale).filter(models.Sale.id == sale_id).first()
 
-def get_sales(db: Session, skip: int = 0, limit: int = 100, category_id: Optional[int] = None):
-    query = db.query(models.Sale).options(joinedload(models.Sale.product).joinedload(models.Product.category))
+def get_sales(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    category_id: Optional[int] = None,
+    fields: Optional[Tuple[str, ...]] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    if _reaches_archive(db, since=start_date):
+        return _get_sales_with_archive(db, skip, limit, category_id, fields, start_date, end_date)
+
+    if fields is None:
+        stmt = lambda_stmt(
+            lambda: select(models.Sale).options(joinedload(models.Sale.product).joinedload(models.Product.category))
+        )
+    else:
+        # Sparse fieldset (see fieldsets.py): load only the requested columns.
+        options = _sale_field_options(fields)
+        stmt = lambda_stmt(lambda: select(models.Sale))
+        stmt = stmt.add_criteria(lambda s: s.options(*options), track_on=[options])
+
+    if category_id is not None:
+        stmt += lambda s: s.join(models.Product).where(models.Product.category_id == category_id)
+    # end_date is inclusive, so compare against midnight of the following day.
+    if start_date is not None:
+        start = datetime.combine(start_date, time.min)
+        stmt += lambda s: s.where(models.Sale.date >= start)
+    if end_date is not None:
+        end = datetime.combine(end_date + timedelta(days=1), time.min)
+        stmt += lambda s: s.where(models.Sale.date < end)
+
+    # A stable order for skip/limit paging, whichever columns (and so indexes) are read.
+    stmt += lambda s: s.order_by(models.Sale.id).offset(skip).limit(limit)
+    return db.execute(stmt).scalars().all()
 
+def _get_sales_with_archive(db: Session, skip, limit, category_id, fields, start_date, end_date):
+    # Same page as get_sales, read from sales UNION ALL sales_archive.
+    sale = _sales_with_archive()
+    stmt = select(sale).options(*_sale_field_options(fields, sale))
     if category_id is not None:
-        query = query.join(models.Product).filter(models.Product.category_id == category_id)
+        stmt = stmt.join(sale.product)
+    stmt = _filter_sales_window(stmt, start_date, end_date, category_id, sale=sale)
+    stmt = stmt.order_by(sale.id).offset(skip).limit(limit)
+    return db.execute(stmt).scalars().all()
 
-    return query.offset(skip).limit(limit).all()
+@lru_cache(maxsize=256)
+def _sale_field_options(fields: Optional[Tuple[str, ...]], sale=models.Sale):
+    if fields is None:
+        return (joinedload(sale.product).joinedload(models.Product.category),)
+    columns = [getattr(sale, field) for field in fields if field != "product" and "." not in field]
+    options = [load_only(*columns)]
+    product_fields = tuple(field.partition(".")[2] for field in fields if field.startswith("product."))
+    if "product" in fields:
+        options.append(joinedload(sale.product).joinedload(models.Product.category))
+    elif product_fields:
+        product_columns = [getattr(models.Product, field) for field in product_fields if field != "category"]
+        options.append(joinedload(sale.product).load_only(*product_columns))
+        if "category" in product_fields:
+            options.append(joinedload(sale.product).joinedload(models.Product.category))
+    return tuple(options)
 
 def create_sale(db: Session, sale: schemas.SaleCreate):
     product = get_product(db, sale.product_id)
@@ -233,8 +492,13 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
     )
     try:
         db.add(db_sale)
-        db.commit()
-        db.refresh(db_sale)
+        db.flush() # id and date come back with the INSERT
+        increment_product_sales_counters(db, sale.product_id, sale.quantity, total_price_calculated)
+        mark_dirty(db, "sales")
+        event = sale_event(db_sale, product.category_id)
+        after_commit(db, partial(sale_events.publish_sales, [event]))
+        if sales_columns.enabled:
+            after_commit(db, partial(sales_columns.try_append, [(event["id"], event["product_id"], event["quantity"], event["total_price"], event["date"])]))
         return db_sale
     except IntegrityError as e:
         db.rollback()
@@ -251,30 +515,627 @@ def create_sale(db: Session, sale: schemas.SaleCreate):
             detail="An unexpected error occurred while creating the sale."
         )
 
+def sale_event(sale, category_id: int) -> dict:
+    # What the dashboard stream needs to know about a committed sale (see sale_events.py).
+    return {
+        "id": sale.id,
+        "product_id": sale.product_id,
+        "category_id": category_id,
+        "quantity": sale.quantity,
+        "total_price": sale.total_price,
+        "date": sale.date,
+    }
+
+def price_buffered_sale(db: Session, sale: schemas.SaleCreate) -> Decimal:
+    """
+    Validates a sale headed for the write-behind buffer and returns its total price.
+
+    Validation happens here, before the sale is acknowledged, so the buffer only
+    ever holds sales the database is expected to accept.
+    """
+    if sale.quantity <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Quantity must be greater than zero."
+        )
+
+    product = get_product(db, sale.product_id)
+    if not product:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Product with ID {sale.product_id} not found."
+        )
+
+    return product.price * Decimal(sale.quantity)
+
+def increment_product_sales_counters(db: Session, product_id: int, quantity: int, revenue: Decimal, sold_at=None):
+    """
+    Adds a sale to the denormalized `units_sold` / `revenue` / `last_sold_at`
+    counters of its product, inside the caller's transaction.
+
+    `last_sold_at` only moves forward, so replaying older buffered sales can't rewind it.
+    """
+    sold_at = sold_at if sold_at is not None else func.now()
+    db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(
+            units_sold=models.Product.units_sold + quantity,
+            revenue=models.Product.revenue + revenue,
+            last_sold_at=case(
+                (or_(models.Product.last_sold_at.is_(None), models.Product.last_sold_at < sold_at), sold_at),
+                else_=models.Product.last_sold_at,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+def reconcile_product_sales_counters(db: Session) -> int:
+    """
+    Rebuilds every product's sales counters from `sales` (and `sales_archive`) in one statement.
+
+    Returns the number of products whose counters were wrong.
+
+    Sales keep being recorded meanwhile, so the counter increments are held off first:
+    the sums are read from the statement's snapshot, and an increment committed after
+    it would be overwritten. On PostgreSQL a SHARE ROW EXCLUSIVE lock on products
+    waits for the transactions that already incremented a counter and blocks new
+    increments (not reads, nor the sale inserts) until the commit; they then add to
+    the rebuilt value. SQLite runs one write transaction at a time anyway.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE products IN SHARE ROW EXCLUSIVE MODE"))
+    sale = sales_source(db)
+    sales_of_product = sale.product_id == models.Product.id
+    units_sold = select(func.coalesce(func.sum(sale.quantity), 0)).where(sales_of_product).scalar_subquery()
+    revenue = select(func.coalesce(func.sum(sale.total_price), 0)).where(sales_of_product).scalar_subquery()
+    last_sold_at = select(func.max(sale.date)).where(sales_of_product).scalar_subquery()
+
+    result = db.execute(
+        update(models.Product)
+        .where(or_(
+            models.Product.units_sold.is_distinct_from(units_sold),
+            models.Product.revenue.is_distinct_from(revenue),
+            models.Product.last_sold_at.is_distinct_from(last_sold_at),
+        ))
+        .values(units_sold=units_sold, revenue=revenue, last_sold_at=last_sold_at)
+        .execution_options(synchronize_session=False)
+    )
+    mark_dirty(db, "products")
+    db.commit()
+    return result.rowcount
+
+# ========= Sales archive ==========
+
+SALE_COLUMNS = ("id", "product_id", "quantity", "total_price", "date")
+SALES_ARCHIVE_BATCH_SIZE = int(os.getenv("SALES_ARCHIVE_BATCH_SIZE", "5000"))
+SALES_FOLLOW_CHUNK = 10000 # Rows per fetch when the sketches / column store catch up
+
+def get_sales_archive_bounds(db: Session) -> Optional[dict]:
+    """
+    The newest `date` and highest `id` in sales_archive (two index lookups), or None
+    while nothing is archived. Cached until the next sales write.
+    """
+    def load():
+        # One subquery per max(): SQLite only reads a max() off an index when it's alone
+        newest_date, max_id = db.execute(select(
+            select(func.max(models.SaleArchive.date)).scalar_subquery(),
+            select(func.max(models.SaleArchive.id)).scalar_subquery(),
+        )).one()
+        return None if max_id is None else {"newest_date": newest_date, "max_id": max_id}
+
+    return query_cache.get_or_load(("sales-archive-bounds",), load, tags=("sales",))
+
+def _reaches_archive(db: Session, since=None, since_id: Optional[int] = None) -> bool:
+    # Whether rows after the `since` date/datetime and `since_id` watermarks can be archived.
+    bounds = get_sales_archive_bounds(db)
+    if bounds is None:
+        return False
+    if since_id is not None and since_id >= bounds["max_id"]:
+        return False
+    if since is not None:
+        since_day = since.date() if isinstance(since, datetime) else since
+        # Compared by day with a day of slack, so time zones can only widen what is read.
+        if since_day > bounds["newest_date"].date() + timedelta(days=1):
+            return False
+    return True
+
+@lru_cache(maxsize=1)
+def _sales_with_archive():
+    # `models.Sale` mapped over sales UNION ALL sales_archive (ids are disjoint).
+    live = select(*(models.Sale.__table__.c[column] for column in SALE_COLUMNS))
+    archived = select(*(models.SaleArchive.__table__.c[column] for column in SALE_COLUMNS))
+    return aliased(models.Sale, live.union_all(archived).subquery("sales_all"))
+
+def sales_source(db: Session, since=None, since_id: Optional[int] = None):
+    """
+    The entity to read sales from: `models.Sale`, or an alias of it over
+    `sales UNION ALL sales_archive` when the range after `since` / `since_id` reaches archived sales.
+    """
+    return _sales_with_archive() if _reaches_archive(db, since, since_id) else models.Sale
+
+def _rollup_month(sold_at: datetime) -> date:
+    if sold_at.tzinfo is not None:
+        sold_at = sold_at.astimezone(timezone.utc)
+    return date(sold_at.year, sold_at.month, 1)
+
+def _add_to_monthly_rollup(db: Session, rows):
+    totals = {}
+    for row in rows:
+        key = (_rollup_month(row.date), row.product_id)
+        sales_count, quantity, total_price = totals.get(key, (0, 0, Decimal(0)))
+        totals[key] = (sales_count + 1, quantity + row.quantity, total_price + Decimal(row.total_price))
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        insert_stmt = postgresql.insert(models.SaleMonthlyRollup.__table__)
+    else:
+        insert_stmt = sqlite.insert(models.SaleMonthlyRollup.__table__)
+    rollup = models.SaleMonthlyRollup.__table__.c
+    stmt = insert_stmt.on_conflict_do_update(
+        index_elements=[rollup.month, rollup.product_id],
+        set_={column: rollup[column] + insert_stmt.excluded[column] for column in ("sales_count", "quantity", "total_price")},
+    )
+    db.execute(stmt, [
+        {"month": month, "product_id": product_id, "sales_count": sales_count, "quantity": quantity, "total_price": total_price}
+        for (month, product_id), (sales_count, quantity, total_price) in totals.items()
+    ])
+
+def archive_sales(db: Session, before: datetime, batch_size: int = SALES_ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Moves the oldest batch of sales dated before `before` from `sales` to `sales_archive`
+    and adds them to sales_monthly_rollup, in one transaction.
+
+    Product counters are untouched (they already include these sales). Returns the
+    number of sales moved; 0 once nothing older than `before` is left.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=f"Sales archival is not supported on {dialect}.")
+
+    rows = db.execute(
+        select(*(models.Sale.__table__.c[column] for column in SALE_COLUMNS))
+        .where(models.Sale.date < before)
+        .order_by(models.Sale.date, models.Sale.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if not rows:
+        return 0
+
+    try:
+        db.execute(insert(models.SaleArchive.__table__), [row._asdict() for row in rows])
+        _add_to_monthly_rollup(db, rows)
+        db.execute(delete(models.Sale.__table__).where(models.Sale.id.in_([row.id for row in rows])))
+        mark_dirty(db, "sales")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(rows)
+
 # ========= Dashboard CRUD ==========
 
 def get_dashboard_summary(db: Session, category_id: Optional[int] = None):
-    product_query = db.query(func.count(models.Product.id))
+    """
+    Product count and sales KPIs, overall or for one category. Answered from the
+    NumPy column store with ANALYTICS_ENGINE=numpy, otherwise with SQL.
+    """
+    if sales_columns.enabled:
+        return _columns_dashboard_summary(db, category_id)
+    return _query_dashboard_summary(db, category_id)
+
+def _query_dashboard_summary(db: Session, category_id: Optional[int] = None):
+    product_stmt = lambda_stmt(lambda: select(func.count(models.Product.id)))
     if category_id is not None:
-        product_query = product_query.filter(models.Product.category_id == category_id)
-    total_products = product_query.scalar()
+        product_stmt += lambda s: s.where(models.Product.category_id == category_id)
+    total_products = db.execute(product_stmt).scalar()
 
-    sales_base_query = db.query(models.Sale).join(models.Product)
+    # The sales aggregates share one scan instead of separate queries.
+    sales_stmt = lambda_stmt(
+        lambda: select(
+            func.coalesce(func.sum(models.Sale.total_price), 0.0),
+            func.coalesce(func.sum(models.Sale.quantity), 0),
+            func.count(models.Sale.id),
+            func.max(models.Sale.id),
+        ).join(models.Product)
+    )
     if category_id is not None:
-        sales_base_query = sales_base_query.filter(models.Product.category_id == category_id)
+        sales_stmt += lambda s: s.where(models.Product.category_id == category_id)
+    total_sales_value, total_items_sold, sales_count, last_sale_id = db.execute(sales_stmt).one()
+    total_sales_value = float(total_sales_value)
 
-    total_sales_value = sales_base_query.with_entities(func.coalesce(func.sum(models.Sale.total_price), 0.0)).scalar()
-    total_items_sold = sales_base_query.with_entities(func.coalesce(func.sum(models.Sale.quantity), 0)).scalar()
-    average_sale_value = sales_base_query.with_entities(func.coalesce(func.avg(models.Sale.total_price), 0.0)).scalar()
+    # Archived sales are counted from their monthly rollup
+    if get_sales_archive_bounds(db) is not None:
+        rollup_stmt = lambda_stmt(
+            lambda: select(
+                func.coalesce(func.sum(models.SaleMonthlyRollup.total_price), 0.0),
+                func.coalesce(func.sum(models.SaleMonthlyRollup.quantity), 0),
+                func.coalesce(func.sum(models.SaleMonthlyRollup.sales_count), 0),
+            ).join(models.Product)
+        )
+        if category_id is not None:
+            rollup_stmt += lambda s: s.where(models.Product.category_id == category_id)
+        archived_value, archived_items, archived_count = db.execute(rollup_stmt).one()
+        total_sales_value += float(archived_value)
+        total_items_sold += int(archived_items)
+        sales_count += int(archived_count)
 
     return {
         "registered_products": total_products or 0,
-        "total_sales_value": float(total_sales_value),
+        "total_sales_value": total_sales_value,
         "total_items_sold": total_items_sold,
-        "average_sale_value": float(average_sale_value)
+        "average_sale_value": total_sales_value / sales_count if sales_count else 0.0,
+        # Used by the dashboard stream to apply deltas to this snapshot
+        "sales_count": sales_count,
+        "last_sale_id": last_sale_id,
+    }
+
+def _columns_dashboard_summary(db: Session, category_id: Optional[int] = None):
+    ensure_sales_columns(db)
+    summary = sales_columns.summary(category_id)
+    total_sales_value = summary["cents"] / 100
+    return {
+        "registered_products": sales_columns.product_count(category_id),
+        "total_sales_value": total_sales_value,
+        "total_items_sold": summary["quantity"],
+        "average_sale_value": total_sales_value / summary["sales_count"] if summary["sales_count"] else 0.0,
+        "sales_count": summary["sales_count"],
+        "last_sale_id": summary["last_sale_id"],
+    }
+
+def _sales_after_watermark(db: Session, watermark: SaleWatermark, columns):
+    """
+    The sales not yet consumed by `watermark`, as partitions of `columns(sale)` rows in
+    id order: a primary key seek past it, plus its pending gaps. Reaches into the
+    archive only when the watermark does (e.g. on the first read).
+    """
+    gap_ids = watermark.pending_gaps()
+    sale = sales_source(db, since_id=min([watermark.value, *gap_ids]))
+    after_watermark = sale.id > watermark.value
+    stmt = (
+        columns(sale)
+        .where(or_(after_watermark, sale.id.in_(gap_ids)) if gap_ids else after_watermark)
+        .order_by(sale.id)
+        .execution_options(yield_per=SALES_FOLLOW_CHUNK)
+    )
+    return db.execute(stmt).partitions()
+
+def sync_sale_sketches(db: Session) -> int:
+    """
+    Feeds the sale value sketches the sales committed since their watermark (a primary
+    key seek, reaching into the archive only on the first sync). Returns the rows read.
+    """
+    with sale_sketches.sync_lock:
+        if sale_sketches.needs_check:
+            # A snapshot ahead of the database belongs to another (or a reset) database.
+            live_max_id = db.execute(select(func.max(models.Sale.id))).scalar() or 0
+            archived_max_id = (get_sales_archive_bounds(db) or {}).get("max_id", 0)
+            if max(live_max_id, archived_max_id) < sale_sketches.watermark.value:
+                logging.warning("Sale sketches: snapshot is ahead of the database, rebuilding.")
+                sale_sketches.reset()
+            sale_sketches.needs_check = False
+        read = 0
+        for rows in _sales_after_watermark(db, sale_sketches.watermark, lambda sale: (
+            select(sale.id, sale.total_price, sale.date, models.Product.category_id)
+            .join(models.Product, models.Product.id == sale.product_id)
+        )):
+            sale_sketches.add_sales(rows)
+            read += len(rows)
+    sale_sketches.maybe_save_snapshot()
+    return read
+
+def _load_sales_columns_products(db: Session):
+    rows = db.execute(select(models.Product.id, models.Product.category_id)).all()
+    sales_columns.set_products([row.id for row in rows], [row.category_id for row in rows])
+
+def sync_sales_columns(db: Session) -> int:
+    """
+    Appends the sales committed since the column store's watermark (a primary key
+    seek; the first sync loads every sale, archived ones included) and reloads the
+    product -> category mapping after product writes. Returns the sales read.
+    """
+    with sales_columns.sync_lock:
+        sales_columns.behind = False
+        read = 0
+        for rows in _sales_after_watermark(db, sales_columns.watermark, lambda sale: (
+            select(sale.id, sale.product_id, sale.quantity, sale.total_price, sale.date)
+        )):
+            sales_columns.append(rows)
+            read += len(rows)
+        # Read after the sales, so it knows the product of every sale read
+        query_cache.get_or_load(("sales-columns-products",), lambda: _load_sales_columns_products(db), tags=("products",))
+        if sales_columns.unknown_products:
+            _load_sales_columns_products(db)
+    return read
+
+def ensure_sales_columns(db: Session):
+    # Catches up only after sales or product writes (by any worker, through the cache bus),
+    # or after a refused append
+    if sales_columns.behind:
+        sync_sales_columns(db)
+    query_cache.get_or_load(("sales-columns-sync",), lambda: sync_sales_columns(db), tags=("sales", "products"))
+
+def get_sale_value_quantiles(db: Session, category_id: Optional[int] = None) -> dict:
+    """
+    Median, p90 and p99 of the sale value, from the mergeable per (category, month)
+    sketches: within SALE_SKETCHES_RELATIVE_ACCURACY (1% by default) of the exact value
+    of the same rank. The sketches catch up only after sales writes.
+    """
+    query_cache.get_or_load(("sale-sketches-sync",), lambda: sync_sale_sketches(db), tags=("sales",))
+    quantiles = {q: value if value is None else round(value, 2) for q, value in sale_sketches.quantiles(category_id).items()}
+    return {
+        "median_sale_value": quantiles[0.5],
+        "p90_sale_value": quantiles[0.9],
+        "p99_sale_value": quantiles[0.99],
     }
 
-def get_all_sales_with_details(db: Session) -> List[models.Sale]:
-    return db.query(models.Sale).options(
-        joinedload(models.Sale.product).joinedload(models.Product.category)
-    ).order_by(models.Sale.id).all() 
\ No newline at end of file
+# Sales newer than this may still be joined by lower ids / earlier dates committing late
+EXPORT_SETTLE_SECONDS = float(os.getenv("EXPORT_SETTLE_SECONDS", "60"))
+
+def get_all_sales_with_details(
+    db: Session,
+    since_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None,
+) -> List[models.Sale]:
+    """
+    Sales with their product and category, oldest first.
+
+    Without `since`, ordered by id: `since_id` keeps only the sales after it (a primary
+    key seek). With `since`, ordered by (date, id) and paged on that pair: the sales
+    dated after `since`, or at `since` with an id above `since_id`, so a page boundary
+    inside one timestamp loses nothing. That mode leaves out the sales of the last
+    EXPORT_SETTLE_SECONDS: `date` is when the transaction started (or the buffer
+    accepted the sale), so a sale committing late can be dated behind newer ones.
+    Archived sales are included only when the watermark reaches back into the archive.
+    """
+    if since is not None:
+        sale = sales_source(db, since=since)
+        horizon = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+        after = sale.date > since
+        if since_id is not None:
+            after = or_(after, (sale.date == since) & (sale.id > since_id))
+        query = db.query(sale).filter(after, sale.date <= horizon).order_by(sale.date, sale.id)
+    else:
+        sale = sales_source(db, since_id=since_id)
+        query = db.query(sale)
+        if since_id is not None:
+            query = query.filter(sale.id > since_id)
+        query = query.order_by(sale.id)
+    query = query.options(joinedload(sale.product).joinedload(models.Product.category))
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def settled_sales_count(sales: List[models.Sale], since_id: Optional[int] = None) -> int:
+    """
+    How many of `sales` (in id order, after `since_id`) an id watermark can move past.
+
+    Ids are allocated at INSERT but visible at commit, so a missing id below a recent
+    sale may belong to a transaction still in flight: the watermark stops before the
+    first such gap (the sales from there on come again in the next pull). A gap whose
+    next sale is older than EXPORT_SETTLE_SECONDS is taken as a rollback and skipped.
+    """
+    horizon = datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+    previous = since_id
+    for position, sale in enumerate(sales):
+        sold_at = sale.date if sale.date.tzinfo is not None else sale.date.replace(tzinfo=timezone.utc)
+        if previous is not None and sale.id > previous + 1 and sold_at > horizon:
+            return position
+        previous = sale.id
+    return len(sales)
+
+def get_export_version(db: Session) -> str:
+    """
+    Fingerprint of the data behind the full sales export: changes with any sale, product
+    or category write (archival moves sales without changing it). The same data gives
+    the same version in every worker. Cached until the next such write.
+
+    Sales are fingerprinted without reading them: every sale write adds its quantity
+    (always positive) to its product's `units_sold` in the same transaction, so the
+    totals over products change with each sale, a late-committing lower id included.
+    The highest sale ids (two index lookups) also cover rows inserted without counters.
+    Product and category writes bump their `cache_versions` counters in the writing
+    transaction (see cache_bus.VERSIONED_TAGS); unlike `updated_at`, a counter moves
+    with every commit, same-second and late ones included.
+    """
+    def load():
+        live_max_id = db.execute(select(func.max(models.Sale.id))).scalar()
+        archived_max_id = db.execute(select(func.max(models.SaleArchive.id))).scalar()
+        units_sold = db.execute(select(func.sum(models.Product.units_sold))).scalar()
+        cache_versions = models.CacheVersion.__table__
+        versions = db.execute(
+            select(cache_versions.c.tag, cache_versions.c.version)
+            .where(cache_versions.c.tag.in_(VERSIONED_TAGS))
+            .order_by(cache_versions.c.tag)
+        ).all()
+        fingerprint = repr((
+            max(live_max_id or 0, archived_max_id or 0), units_sold,
+            tuple(tuple(row) for row in versions),
+        ))
+        return hashlib.sha1(fingerprint.encode()).hexdigest()[:20]
+
+    return query_cache.get_or_load(("export-version",), load, tags=("sales", "products", "categories"))
+
+# ========= Analytics CRUD ==========
+
+ANALYTICS_CACHE_TAGS = ("sales", "products", "categories")
+
+def _filter_sales_window(stmt, start_date: Optional[date] = None, end_date: Optional[date] = None, category_id: Optional[int] = None, sale=models.Sale):
+    # end_date is inclusive, so compare against midnight of the following day.
+    if start_date is not None:
+        stmt = stmt.where(sale.date >= datetime.combine(start_date, time.min))
+    if end_date is not None:
+        stmt = stmt.where(sale.date < datetime.combine(end_date + timedelta(days=1), time.min))
+    if category_id is not None:
+        stmt = stmt.where(models.Product.category_id == category_id)
+    return stmt
+
+def _query_top_products(db: Session, start_date, end_date, category_id, rank_by, limit, per_category):
+    sale = sales_source(db, since=start_date)
+    units_sold = func.sum(sale.quantity).label("units_sold")
+    revenue = func.sum(sale.total_price).label("revenue")
+    per_product = _filter_sales_window(
+        select(sale.product_id, units_sold, revenue).join(models.Product, models.Product.id == sale.product_id),
+        start_date, end_date, category_id, sale=sale,
+    ).group_by(sale.product_id).subquery()
+
+    metric = per_product.c.revenue if rank_by == "revenue" else per_product.c.units_sold
+    ranked = (
+        select(
+            models.Product.id.label("product_id"),
+            models.Product.name,
+            models.Product.brand,
+            models.Category.id.label("category_id"),
+            models.Category.name.label("category_name"),
+            per_product.c.units_sold,
+            per_product.c.revenue,
+            func.rank().over(order_by=metric.desc()).label("rank"),
+            func.rank().over(partition_by=models.Product.category_id, order_by=metric.desc()).label("category_rank"),
+        )
+        .join_from(per_product, models.Product, models.Product.id == per_product.c.product_id)
+        .join(models.Category, models.Category.id == models.Product.category_id)
+        .subquery()
+    )
+
+    stmt = select(ranked)
+    if per_category is not None:
+        stmt = stmt.where(ranked.c.category_rank <= per_category)
+    stmt = stmt.order_by(ranked.c.rank, ranked.c.product_id).limit(limit)
+
+    return [
+        {
+            "rank": row.rank,
+            "category_rank": row.category_rank,
+            "product_id": row.product_id,
+            "name": row.name,
+            "brand": row.brand,
+            "category": {"id": row.category_id, "name": row.category_name},
+            "units_sold": int(row.units_sold),
+            "revenue": float(row.revenue),
+        }
+        for row in db.execute(stmt)
+    ]
+
+def get_top_products(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    rank_by: str = "revenue",
+    limit: int = 10,
+    per_category: Optional[int] = None,
+) -> List[dict]:
+    """
+    Ranks products by revenue or units sold in a single statement.
+
+    `rank` is the overall position and `category_rank` the position within the
+    product's category (`RANK() OVER (PARTITION BY category_id ...)`); `per_category`
+    keeps only the top N of each category. Results are cached until the next write.
+    """
+    key = ("top-products", start_date, end_date, category_id, rank_by, limit, per_category)
+    return query_cache.get_or_load(
+        key,
+        lambda: _query_top_products(db, start_date, end_date, category_id, rank_by, limit, per_category),
+        tags=ANALYTICS_CACHE_TAGS,
+    )
+
+def _query_top_categories(db: Session, start_date, end_date, category_id, rank_by, limit):
+    sale = sales_source(db, since=start_date)
+    units_sold = func.sum(sale.quantity)
+    revenue = func.sum(sale.total_price)
+    metric = revenue if rank_by == "revenue" else units_sold
+    stmt = _filter_sales_window(
+        select(
+            models.Category.id.label("category_id"),
+            models.Category.name,
+            func.count(func.distinct(sale.product_id)).label("products_sold"),
+            units_sold.label("units_sold"),
+            revenue.label("revenue"),
+            func.rank().over(order_by=metric.desc()).label("rank"),
+        )
+        .select_from(sale)
+        .join(models.Product, models.Product.id == sale.product_id)
+        .join(models.Category, models.Category.id == models.Product.category_id),
+        start_date, end_date, category_id, sale=sale,
+    ).group_by(models.Category.id, models.Category.name).order_by(metric.desc(), models.Category.id).limit(limit)
+
+    return [
+        {
+            "rank": row.rank,
+            "category_id": row.category_id,
+            "name": row.name,
+            "products_sold": row.products_sold,
+            "units_sold": int(row.units_sold),
+            "revenue": float(row.revenue),
+        }
+        for row in db.execute(stmt)
+    ]
+
+def get_top_categories(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    rank_by: str = "revenue",
+    limit: int = 10,
+) -> List[dict]:
+    """Ranks categories by revenue or units sold in a single grouped statement, cached until the next write."""
+    key = ("top-categories", start_date, end_date, category_id, rank_by, limit)
+    return query_cache.get_or_load(
+        key,
+        lambda: _query_top_categories(db, start_date, end_date, category_id, rank_by, limit),
+        tags=ANALYTICS_CACHE_TAGS,
+    )
+
+def _sale_month(db: Session, sale):
+    # The UTC month of a sale as "YYYY-MM"
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(func.timezone("UTC", sale.date), "YYYY-MM")
+    return func.strftime("%Y-%m", sale.date)
+
+def _query_monthly_sales(db: Session, start_date, end_date, category_id):
+    sale = sales_source(db, since=start_date)
+    month = _sale_month(db, sale).label("month")
+    stmt = _filter_sales_window(
+        select(month, func.count(sale.id).label("sales_count"), func.sum(sale.quantity).label("units_sold"), func.sum(sale.total_price).label("revenue"))
+        .join(models.Product, models.Product.id == sale.product_id),
+        start_date, end_date, category_id, sale=sale,
+    ).group_by(month).order_by(month)
+    return [
+        {"month": row.month, "sales_count": row.sales_count, "units_sold": int(row.units_sold), "revenue": float(row.revenue)}
+        for row in db.execute(stmt)
+    ]
+
+def _columns_monthly_sales(db: Session, start_date, end_date, category_id):
+    ensure_sales_columns(db)
+    months = sales_columns.monthly(
+        category_id,
+        start_day=None if start_date is None else epoch_day(start_date),
+        end_day=None if end_date is None else epoch_day(end_date),
+    )
+    return [
+        {"month": month["month"], "sales_count": month["sales_count"], "units_sold": month["quantity"], "revenue": month["cents"] / 100}
+        for month in months
+    ]
+
+def get_monthly_sales(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+) -> List[dict]:
+    """
+    Sales count, units and revenue per UTC month, oldest first. A `bincount` over the
+    NumPy column store with ANALYTICS_ENGINE=numpy; otherwise one grouped statement,
+    cached until the next write.
+    """
+    if sales_columns.enabled:
+        return _columns_monthly_sales(db, start_date, end_date, category_id)
+    key = ("monthly-sales", start_date, end_date, category_id)
+    return query_cache.get_or_load(
+        key,
+        lambda: _query_monthly_sales(db, start_date, end_date, category_id),
+        tags=ANALYTICS_CACHE_TAGS,
+    )
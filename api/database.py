@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import logging
 import os
+import threading
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .config import env_flag
+from .slow_query_log import SlowQueryLog
+
 current_dir = Path(__file__).parent
 dotenv_path = current_dir / '.env'
 
@@ -19,6 +25,63 @@ engine = create_engine(
     DATABASE_URL, connect_args={}
 )
 
+class StatementCacheStats:
+    """
+    Counts how often executed statements were served from SQLAlchemy's compiled cache.
+
+    Statements built with `select()` / `lambda_stmt()` produce a cache key and are
+    compiled only once per distinct shape; anything reported as uncached (raw DDL,
+    `text()` without a key, ...) is counted separately so it doesn't skew the rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def record(self, context):
+        cache_hit = getattr(context, "cache_hit", None)
+        with self._lock:
+            if cache_hit is CACHE_HIT:
+                self.hits += 1
+            elif cache_hit is CACHE_MISS:
+                self.misses += 1
+            else:
+                self.uncached += 1
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.uncached = 0
+
+    def snapshot(self):
+        with self._lock:
+            cacheable = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "uncached": self.uncached,
+                "hit_rate": (self.hits / cacheable) if cacheable else 0.0,
+            }
+
+statement_cache_stats = StatementCacheStats()
+
+@event.listens_for(engine, "after_cursor_execute")
+def _record_statement_cache_usage(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        statement_cache_stats.record(context)
+
+# Slow-query log: statements slower than the threshold are kept in a ring buffer
+# (GET /admin/slow-queries), with EXPLAIN plans for a sample of them
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200")),
+    explain_sample_rate=float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0.1")),
+    max_entries=int(os.getenv("SLOW_QUERY_LOG_SIZE", "200")),
+    log_file=os.getenv("SLOW_QUERY_LOG_FILE") or None,
+)
+if env_flag("SLOW_QUERY_LOG_ENABLED", default=True):
+    slow_query_log.install(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -28,4 +91,43 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+def get_db_transaction():
+    """
+    Session for write endpoints, declared as `Depends(get_db_transaction, scope="function")`.
+
+    The crud writes only flush; the request's transaction commits once when the path
+    operation returns, or rolls back if it raises. The "function" scope runs the commit
+    before the response is sent, so a failed commit is still reported to the client.
+    Objects stay loaded after the commit: serializing them doesn't SELECT them again.
+    """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def after_commit(db, callback):
+    """
+    Runs `callback()` once the current transaction of `db` commits (never if it rolls
+    back), for side effects that must only see committed writes. Callbacks get plain
+    values captured at flush time, not ORM objects.
+    """
+    db.info.setdefault("after_commit", []).append(callback)
+
+@event.listens_for(SessionLocal, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", ()):
+        try:
+            callback()
+        except Exception as e: # The data is committed; a failed side effect must not turn it into an error
+            logging.error(f"After-commit callback failed: {e}")
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_after_commit(session, previous_transaction):
+    session.info.pop("after_commit", None) 
\ No newline at end of file
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .config import env_flag
+
+class ExportCache:
+    """
+    Rendered full CSV exports, one file per data version, in a local directory.
+
+    A version is rendered once (concurrent requests for it wait for the same render)
+    and then served from disk with `FileResponse`, which handles `Range` requests and
+    lets the server use sendfile. While a newer version renders in the background,
+    requests keep getting the previous file. Each CSV has a `.json` sidecar with the
+    response headers that describe its content; both are written to temporary files
+    and renamed, so other workers sharing the directory only ever see complete files.
+    Old versions are evicted beyond `max_files` or `max_bytes`, always keeping the
+    two newest (the one served and the one being replaced).
+    """
+
+    def __init__(self, directory: Path, max_files: int = 5, max_bytes: int = 1024 ** 3, enabled: bool = True):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._rendering = {} # version -> threading.Event set when its render ends
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+        self.renders = 0
+        self.evicted = 0
+        self.last_render_seconds = None
+        self.last_error = None
+
+    def _paths(self, version: str):
+        return self.directory / f"{version}.csv", self.directory / f"{version}.json"
+
+    def _entry(self, version: str) -> Optional[dict]:
+        csv_path, meta_path = self._paths(version)
+        try:
+            headers = json.loads(meta_path.read_text(encoding="utf-8"))
+            stat_result = csv_path.stat()
+        except (OSError, ValueError):
+            return None
+        return {"version": version, "path": csv_path, "stat": stat_result, "etag": f'"{version}"', "headers": headers}
+
+    def lookup(self, version: str) -> Optional[dict]:
+        """The rendered export of `version`, or None."""
+        entry = self._entry(version)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def latest(self) -> Optional[dict]:
+        """The most recently rendered export of any version, or None."""
+        for csv_path, _ in self._csv_files():
+            entry = self._entry(csv_path.stem)
+            if entry is not None:
+                with self._lock:
+                    self.stale_served += 1
+                return entry
+        return None
+
+    def render(self, version: str, write: Callable) -> Optional[dict]:
+        """
+        Renders `version` with `write(file)`, which writes the CSV and returns its headers,
+        unless another thread is already rendering it; then waits for that render.
+        """
+        with self._lock:
+            done = self._rendering.get(version)
+            owner = done is None
+            if owner:
+                done = self._rendering[version] = threading.Event()
+        if not owner:
+            done.wait()
+            return self._entry(version)
+
+        try:
+            self._render(version, write)
+        finally:
+            with self._lock:
+                del self._rendering[version]
+            done.set()
+        return self._entry(version)
+
+    def render_in_background(self, version: str, write: Callable):
+        """Starts rendering `version` on a background thread, once."""
+        with self._lock:
+            if version in self._rendering:
+                return
+        threading.Thread(target=self._render_quietly, args=(version, write), name="export-render", daemon=True).start()
+
+    def _render_quietly(self, version: str, write: Callable):
+        try:
+            self.render(version, write)
+        except Exception as e:
+            logging.error(f"Export cache: background render of {version} failed: {e}")
+
+    def _render(self, version: str, write: Callable):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        csv_path, meta_path = self._paths(version)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        csv_tmp = csv_path.with_name(csv_path.name + suffix)
+        meta_tmp = meta_path.with_name(meta_path.name + suffix)
+        started = time.perf_counter()
+        try:
+            with open(csv_tmp, "w", encoding="utf-8", newline="") as f:
+                headers = write(f)
+            meta_tmp.write_text(json.dumps(headers), encoding="utf-8")
+            # The sidecar lands first: a CSV without one is never served.
+            os.replace(meta_tmp, meta_path)
+            os.replace(csv_tmp, csv_path)
+        except Exception as e:
+            self.last_error = str(e)
+            for path in (csv_tmp, meta_tmp):
+                path.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self.renders += 1
+            self.last_render_seconds = round(time.perf_counter() - started, 3)
+        self.evict()
+
+    def _csv_files(self):
+        # Rendered CSVs with their stat, newest first
+        files = []
+        for path in self.directory.glob("*.csv"):
+            try:
+                files.append((path, path.stat()))
+            except OSError: # Evicted meanwhile
+                continue
+        files.sort(key=lambda item: item[1].st_mtime, reverse=True)
+        return files
+
+    def evict(self):
+        kept_bytes = 0
+        for position, (csv_path, stat_result) in enumerate(self._csv_files()):
+            kept_bytes += stat_result.st_size
+            if position < 2 or (position < self.max_files and kept_bytes <= self.max_bytes):
+                continue
+            for path in self._paths(csv_path.stem):
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self.evicted += 1
+
+    def stats(self) -> dict:
+        files = self._csv_files()
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "directory": str(self.directory),
+                "files": len(files),
+                "bytes": sum(stat_result.st_size for _, stat_result in files),
+                "max_files": self.max_files,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_served": self.stale_served,
+                "renders": self.renders,
+                "rendering": sorted(self._rendering),
+                "evicted": self.evicted,
+                "last_render_seconds": self.last_render_seconds,
+                "last_error": self.last_error,
+            }
+
+export_cache = ExportCache(
+    directory=Path(os.getenv("EXPORT_CACHE_DIR", Path(__file__).parent / "export_cache")),
+    max_files=int(os.getenv("EXPORT_CACHE_MAX_FILES", "5")),
+    max_bytes=int(os.getenv("EXPORT_CACHE_MAX_MB", "1024")) * 1024 * 1024,
+    enabled=env_flag("EXPORT_CACHE_ENABLED", default=True),
+)
@@ -0,0 +1,72 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple, get_args, get_origin
+
+from fastapi import HTTPException, status
+from pydantic import ConfigDict, TypeAdapter, create_model
+
+# Fields accepted by `fields=` on the list endpoints. "category" / "product" are the
+# nested objects; for sales, "product.<field>" selects fields of the nested product.
+PRODUCT_FIELDS = ("id", "name", "description", "price", "brand", "category", "units_sold", "revenue", "last_sold_at")
+SALE_FIELDS = ("id", "product_id", "quantity", "total_price", "date", "product") + tuple(f"product.{field}" for field in PRODUCT_FIELDS)
+
+def parse_fields(fields: Optional[str], allowed: Tuple[str, ...]) -> Optional[Tuple[str, ...]]:
+    """
+    Parses a comma-separated `fields=` value into a normalized tuple (`id` first, no
+    duplicates, allowed order), or None when no fieldset was requested.
+
+    Raises 400 for unknown fields.
+    """
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = sorted(requested - set(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    # The nested product always carries its id, like every top-level object.
+    if any(field.startswith("product.") for field in requested) and "product" not in requested:
+        requested.add("product.id")
+    requested.add("id")
+    return tuple(field for field in allowed if field in requested)
+
+@lru_cache(maxsize=256)
+def partial_model(model: type, fields: Tuple[str, ...]) -> type:
+    """
+    A copy of the pydantic `model` restricted to `fields`, for serializing sparse fieldsets.
+
+    Dotted fields ("product.name") select inside a nested model, or inside the items
+    of a `List[model]` field; naming the nested field alone keeps the whole nested model.
+    Models are built once per distinct fieldset.
+    """
+    selected = set()
+    nested = {}
+    for field in fields:
+        name, _, rest = field.partition(".")
+        if rest:
+            nested.setdefault(name, []).append(rest)
+        else:
+            selected.add(name)
+
+    definitions = {}
+    for name, info in model.model_fields.items():
+        if name in selected:
+            definitions[name] = (info.annotation, info)
+        elif name in nested:
+            annotation = info.annotation
+            if get_origin(annotation) in (list, List):
+                definitions[name] = (List[partial_model(get_args(annotation)[0], tuple(nested[name]))], ...)
+            else:
+                definitions[name] = (partial_model(annotation, tuple(nested[name])), ...)
+
+    return create_model(
+        f"{model.__name__}Partial",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+@lru_cache(maxsize=256)
+def list_adapter(model: type) -> TypeAdapter:
+    """A cached `TypeAdapter(List[model])`, to validate and dump a whole page at once."""
+    return TypeAdapter(List[model])
@@ -1,20 +1,67 @@
+from contextlib import asynccontextmanager
+from functools import partial
+import logging
 from fastapi import FastAPI
 # Import CORS middleware
 from fastapi.middleware.cors import CORSMiddleware
 # Import database components
-from . import models
-from .database import engine, Base
+from . import crud, models
+from .admission import AdmissionControlMiddleware, admission_controller
+from .cache_bus import cache_bus
+from .config import env_flag
+from .database import SessionLocal
+from .product_index import product_index
+from .sale_buffer import sale_buffer
+from .sale_events import sale_events
+from .sale_sketches import sale_sketches
+from .sales_columns import sales_columns
 
-# Create database tables if they don't exist
-# This is okay for development, but for production consider using Alembic migrations
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic migrations (api/migrations):
+#   alembic -c api/alembic.ini upgrade head
+# Set AUTO_MIGRATE=true to apply them on startup (single-process development setups).
+if env_flag("AUTO_MIGRATE"):
+    from .migrate import upgrade_database
+    upgrade_database()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers are started once per process and drained on shutdown
+    sale_sketches.load_snapshot()
+    try:
+        product_index.rebuild(SessionLocal)
+    except Exception as e: # e.g. not migrated yet: /products/autocomplete retries on first use
+        logging.error(f"Product index: initial build failed: {e}")
+    cache_bus.add_listener(partial(product_index.on_invalidate, SessionLocal))
+    cache_bus.add_listener(partial(sale_events.on_invalidate, SessionLocal))
+    if sales_columns.enabled:
+        db = SessionLocal()
+        try:
+            crud.ensure_sales_columns(db)
+        except Exception as e: # The dashboard loads them on first use instead
+            sales_columns.last_error = str(e)
+            logging.error(f"Sales columns: initial load failed: {e}")
+        finally:
+            db.close()
+    cache_bus.start()
+    sale_buffer.start()
+    yield
+    sale_events.close()
+    sale_buffer.stop()
+    cache_bus.stop()
+    sale_sketches.save_snapshot()
 
 app = FastAPI(
     title="GesturePro API",
     description="API for managing categories, products, and sales for GesturePro.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+# Admission control: per-route concurrency limits for expensive endpoints
+# (configured via ADMISSION_LIMITS). Added before CORS so 503 responses
+# still carry the CORS headers.
+app.add_middleware(AdmissionControlMiddleware, controller=admission_controller)
+
 # CORS Middleware Configuration
 # WARNING: Allowing all origins ('*') is suitable for development.
 # For production, replace '*' with the specific origin(s) of your frontend.
@@ -36,8 +83,10 @@ def read_root():
     return {"message": "Welcome to GesturePro API"}
 
 # Include routers
-from api.routers import categories, products, sales, dashboard # Use relative imports
+from api.routers import categories, products, sales, dashboard, analytics, admin # Use relative imports
 app.include_router(categories.router)
 app.include_router(products.router)
 app.include_router(sales.router)
-app.include_router(dashboard.router) 
\ No newline at end of file
+app.include_router(dashboard.router)
+app.include_router(analytics.router)
+app.include_router(admin.router) 
\ No newline at end of file
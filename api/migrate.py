@@ -0,0 +1,16 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_INI = Path(__file__).parent / "alembic.ini"
+
+def alembic_config() -> Config:
+    config = Config(str(ALEMBIC_INI))
+    # Keep the application's logging setup; alembic.ini's is for the CLI.
+    config.attributes["configure_logger"] = False
+    return config
+
+def upgrade_database(revision: str = "head"):
+    """Applies the pending migrations (same as `alembic -c api/alembic.ini upgrade head`)."""
+    command.upgrade(alembic_config(), revision)
@@ -0,0 +1,64 @@
+"""Initial schema (formerly database_setup.sql)
+
+Exactly the schema of the original database_setup.sql: databases created by it
+already have these tables, mark them as migrated with
+`alembic -c api/alembic.ini stamp 0001` and upgrade from there. Everything added
+since (sales counters, cache_versions, ...) comes in later revisions.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-02 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    categories = op.create_table(
+        'categories',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False, unique=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(255), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('price', sa.DECIMAL(10, 2), sa.CheckConstraint('price >= 0'), nullable=False),
+        sa.Column('category_id', sa.Integer(), sa.ForeignKey('categories.id', ondelete='RESTRICT'), nullable=False),
+        sa.Column('brand', sa.String(100), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+    op.create_table(
+        'sales',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='RESTRICT'), nullable=False),
+        sa.Column('quantity', sa.Integer(), sa.CheckConstraint('quantity > 0'), nullable=False),
+        sa.Column('total_price', sa.DECIMAL(12, 2), sa.CheckConstraint('total_price >= 0'), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+
+    op.create_index('idx_products_category_id', 'products', ['category_id'])
+    op.create_index('idx_sales_product_id', 'sales', ['product_id'])
+    op.create_index('idx_sales_date', 'sales', ['date'])
+
+    op.bulk_insert(categories, [{'name': 'Eletrônicos'}, {'name': 'Roupas'}, {'name': 'Alimentos'}, {'name': 'Livros'}])
+
+
+def downgrade():
+    op.drop_table('sales')
+    op.drop_table('products')
+    op.drop_table('categories')
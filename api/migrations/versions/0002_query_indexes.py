@@ -0,0 +1,61 @@
+"""Functional and covering indexes matched to the crud queries
+
+- crud.get_category_by_name filters on lower(name): unique functional index.
+  This also makes category names unique regardless of case, which is what
+  update_category_name already enforces.
+- Dashboard aggregates and get_sales(category_id) reach sales through
+  product_id: (product_id, date) INCLUDE (quantity, total_price) serves them
+  with index-only scans and supersedes idx_sales_product_id.
+- Date-range reads (analytics, exports): idx_sales_date gains
+  INCLUDE (product_id, quantity, total_price).
+- Product counts / joins filtered by category: (category_id, id) supersedes
+  idx_products_category_id for index-only scans.
+
+INCLUDE columns are PostgreSQL-only; other backends get the key columns.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-02 10:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ux_categories_name_lower', 'categories', [sa.text('lower(name)')], unique=True)
+
+    op.create_index(
+        'idx_sales_product_id_date', 'sales', ['product_id', 'date'],
+        postgresql_include=['quantity', 'total_price'],
+    )
+    op.drop_index('idx_sales_product_id', table_name='sales')
+
+    op.drop_index('idx_sales_date', table_name='sales')
+    op.create_index(
+        'idx_sales_date', 'sales', ['date'],
+        postgresql_include=['product_id', 'quantity', 'total_price'],
+    )
+
+    op.create_index('idx_products_category_id_id', 'products', ['category_id', 'id'])
+    op.drop_index('idx_products_category_id', table_name='products')
+
+
+def downgrade():
+    op.create_index('idx_products_category_id', 'products', ['category_id'])
+    op.drop_index('idx_products_category_id_id', table_name='products')
+
+    op.drop_index('idx_sales_date', table_name='sales')
+    op.create_index('idx_sales_date', 'sales', ['date'])
+
+    op.create_index('idx_sales_product_id', 'sales', ['product_id'])
+    op.drop_index('idx_sales_product_id_date', table_name='sales')
+
+    op.drop_index('ux_categories_name_lower', table_name='categories')
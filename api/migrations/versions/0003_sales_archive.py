@@ -0,0 +1,57 @@
+"""Cold storage for old sales
+
+- sales_archive: same columns (and ids) as sales, filled by crud.archive_sales
+  (`python -m api.scripts.archive_sales`) with the sales older than the horizon.
+- sales_monthly_rollup: per month and product totals of the archived sales, so
+  the dashboard KPIs keep counting them without reading the archive.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-06-09 09:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'sales_archive',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='RESTRICT'), nullable=False),
+        sa.Column('quantity', sa.Integer(), sa.CheckConstraint('quantity > 0'), nullable=False),
+        sa.Column('total_price', sa.DECIMAL(12, 2), sa.CheckConstraint('total_price >= 0'), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index('idx_sales_archive_product_id_date', 'sales_archive', ['product_id', 'date'])
+    op.create_index('idx_sales_archive_date', 'sales_archive', ['date'])
+
+    op.create_table(
+        'sales_monthly_rollup',
+        sa.Column('month', sa.Date(), primary_key=True),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id', ondelete='RESTRICT'), primary_key=True),
+        sa.Column('sales_count', sa.Integer(), nullable=False),
+        sa.Column('quantity', sa.BigInteger(), nullable=False),
+        sa.Column('total_price', sa.DECIMAL(16, 2), nullable=False),
+    )
+    op.create_index('idx_sales_monthly_rollup_product_id', 'sales_monthly_rollup', ['product_id'])
+
+
+def downgrade():
+    # Archived sales go back to `sales` first, so downgrading loses nothing.
+    op.execute(
+        'INSERT INTO sales (id, product_id, quantity, total_price, date) '
+        'SELECT id, product_id, quantity, total_price, date FROM sales_archive'
+    )
+    op.drop_index('idx_sales_monthly_rollup_product_id', table_name='sales_monthly_rollup')
+    op.drop_table('sales_monthly_rollup')
+    op.drop_index('idx_sales_archive_date', table_name='sales_archive')
+    op.drop_index('idx_sales_archive_product_id_date', table_name='sales_archive')
+    op.drop_table('sales_archive')
@@ -0,0 +1,31 @@
+"""Idempotency key for buffered sales
+
+- sales.buffer_id: the id the write-behind buffer acknowledged the sale with
+  (NULL for sales written directly). Unique, so a WAL segment replayed after a
+  crash between the flush commit and the segment removal inserts nothing twice.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-06-16 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sales', sa.Column('buffer_id', sa.String(32), nullable=True))
+    # NULLs don't collide, so only buffered sales are constrained
+    op.create_index('ux_sales_buffer_id', 'sales', ['buffer_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ux_sales_buffer_id', table_name='sales')
+    op.drop_column('sales', 'buffer_id')
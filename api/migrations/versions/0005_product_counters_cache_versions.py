@@ -0,0 +1,103 @@
+"""Product sales counters and cache_versions, split out of the initial schema
+
+- products.units_sold / revenue / last_sold_at: per-product sales counters kept
+  by the sale write paths, with the (X, id) and (category_id, X, id) indexes
+  behind GET /products?sort=units_sold|revenue|last_sold_at. When the columns
+  are added here they are backfilled from sales and sales_archive, in the same
+  statement crud.reconcile_product_sales_counters would run.
+- cache_versions: per-tag counters of the cache bus in poll mode.
+
+These used to be created by 0001. Databases that got them from that version of
+0001 (or from a later database_setup.sql) already have them: every object is
+only created when missing.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-06-23 10:00:00
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+COUNTER_INDEXES = (
+    ('idx_products_units_sold', ['units_sold', 'id']),
+    ('idx_products_revenue', ['revenue', 'id']),
+    ('idx_products_last_sold_at', ['last_sold_at', 'id']),
+    ('idx_products_category_units_sold', ['category_id', 'units_sold', 'id']),
+    ('idx_products_category_revenue', ['category_id', 'revenue', 'id']),
+    ('idx_products_category_last_sold_at', ['category_id', 'last_sold_at', 'id']),
+)
+
+
+def _existing():
+    # Tables, products columns and products indexes already there (nothing when emitting SQL offline)
+    if context.is_offline_mode():
+        return set(), set(), set()
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    columns = {column['name'] for column in inspector.get_columns('products')}
+    indexes = {index['name'] for index in inspector.get_indexes('products')}
+    return tables, columns, indexes
+
+
+BACKFILL_COUNTERS = """
+UPDATE products SET
+    units_sold = COALESCE((SELECT SUM(quantity) FROM sales WHERE product_id = products.id), 0)
+        + COALESCE((SELECT SUM(quantity) FROM sales_archive WHERE product_id = products.id), 0),
+    revenue = COALESCE((SELECT SUM(total_price) FROM sales WHERE product_id = products.id), 0)
+        + COALESCE((SELECT SUM(total_price) FROM sales_archive WHERE product_id = products.id), 0),
+    last_sold_at = (
+        SELECT MAX(date) FROM (
+            SELECT date FROM sales WHERE product_id = products.id
+            UNION ALL
+            SELECT date FROM sales_archive WHERE product_id = products.id
+        ) AS product_sales
+    )
+WHERE id IN (SELECT product_id FROM sales UNION SELECT product_id FROM sales_archive)
+"""
+
+
+def upgrade():
+    tables, columns, indexes = _existing()
+
+    # Counters that already exist have been kept up to date since they were created
+    backfill = not {'units_sold', 'revenue', 'last_sold_at'} <= columns
+    if 'units_sold' not in columns:
+        op.add_column('products', sa.Column('units_sold', sa.Integer(), server_default='0', nullable=False))
+    if 'revenue' not in columns:
+        op.add_column('products', sa.Column('revenue', sa.DECIMAL(14, 2), server_default='0', nullable=False))
+    if 'last_sold_at' not in columns:
+        op.add_column('products', sa.Column('last_sold_at', sa.DateTime(timezone=True), nullable=True))
+    if backfill:
+        # Existing sales would otherwise start every product at 0
+        op.execute(BACKFILL_COUNTERS)
+
+    last_sold_at_desc = {'last_sold_at': 'DESC NULLS LAST', 'id': 'DESC'}
+    for name, index_columns in COUNTER_INDEXES:
+        if name not in indexes:
+            ops = last_sold_at_desc if 'last_sold_at' in index_columns else {}
+            op.create_index(name, 'products', index_columns, postgresql_ops=ops)
+
+    if 'cache_versions' not in tables:
+        cache_versions = op.create_table(
+            'cache_versions',
+            sa.Column('tag', sa.String(64), primary_key=True),
+            sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+        )
+        op.bulk_insert(cache_versions, [{'tag': 'categories'}, {'tag': 'products'}, {'tag': 'sales'}])
+
+
+def downgrade():
+    op.drop_table('cache_versions')
+    for name, _ in reversed(COUNTER_INDEXES):
+        op.drop_index(name, table_name='products')
+    op.drop_column('products', 'last_sold_at')
+    op.drop_column('products', 'revenue')
+    op.drop_column('products', 'units_sold')
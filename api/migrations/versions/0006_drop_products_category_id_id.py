@@ -0,0 +1,27 @@
+"""Drop the (category_id, id) products index
+
+- idx_products_category_id_id: redundant since 0005. The (category_id, X, id)
+  counter indexes start with category_id too, and the planner picks them for the
+  category filters (counts, the dashboard's product lookup, the foreign key).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-06-30 10:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.drop_index('idx_products_category_id_id', table_name='products')
+
+
+def downgrade():
+    op.create_index('idx_products_category_id_id', 'products', ['category_id', 'id'])
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, DECIMAL
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, ForeignKey, Text, Date, DateTime, DECIMAL, Index
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from .database import Base
 from datetime import datetime
@@ -14,6 +14,15 @@ class Category(Base):
 
     products = relationship("Product", back_populates="category")
 
+    # Server-generated columns (id, created_at, updated_at) are read back with
+    # INSERT / UPDATE ... RETURNING on flush instead of a SELECT after the commit.
+    __mapper_args__ = {"eager_defaults": True}
+
+    # get_category_by_name compares lower(name): served by (and unique on) this functional index
+    __table_args__ = (
+        Index("ux_categories_name_lower", func.lower(name), unique=True),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -26,9 +35,32 @@ class Product(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    # Denormalized sales counters, maintained by the sale write paths
+    # (crud.increment_product_sales_counters) and rebuilt by crud.reconcile_product_sales_counters
+    units_sold = Column(Integer, nullable=False, default=0, server_default="0")
+    revenue = Column(DECIMAL(14, 2), nullable=False, default=0, server_default="0")
+    last_sold_at = Column(DateTime(timezone=True), nullable=True)
+
     category = relationship("Category", back_populates="products")
     sales = relationship("Sale", back_populates="product")
 
+    __mapper_args__ = {"eager_defaults": True}
+
+    # One index per sort order of GET /products, with and without a category filter
+    # (the category ones also serve every other lookup by category_id).
+    # last_sold_at sorts DESC NULLS LAST: PostgreSQL needs that spelled out in the index
+    # (emitted through postgresql_ops), other backends scan the ascending index backwards.
+    __table_args__ = (
+        Index("idx_products_units_sold", units_sold, id),
+        Index("idx_products_revenue", revenue, id),
+        Index("idx_products_last_sold_at", last_sold_at, id,
+              postgresql_ops={"last_sold_at": "DESC NULLS LAST", "id": "DESC"}),
+        Index("idx_products_category_units_sold", category_id, units_sold, id),
+        Index("idx_products_category_revenue", category_id, revenue, id),
+        Index("idx_products_category_last_sold_at", category_id, last_sold_at, id,
+              postgresql_ops={"last_sold_at": "DESC NULLS LAST", "id": "DESC"}),
+    )
+
 class Sale(Base):
     __tablename__ = "sales"
 
@@ -37,5 +69,59 @@ class Sale(Base):
     quantity = Column(Integer, nullable=False)
     total_price = Column(DECIMAL(12, 2), nullable=False)
     date = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Set by the write-behind buffer (sale_buffer.py) so a replayed sale is inserted
+    # once; deferred because nothing reads it back and sales_archive doesn't keep it.
+    buffer_id = deferred(Column(String(32), nullable=True))
+
+    product = relationship("Product", back_populates="sales")
+
+    __mapper_args__ = {"eager_defaults": True}
+
+    # Covering indexes (INCLUDE is PostgreSQL-only): per-product aggregates for the
+    # dashboard and category-filtered listings, and date-range scans for analytics.
+    __table_args__ = (
+        Index("idx_sales_product_id_date", product_id, date,
+              postgresql_include=["quantity", "total_price"]),
+        Index("idx_sales_date", date,
+              postgresql_include=["product_id", "quantity", "total_price"]),
+        Index("ux_sales_buffer_id", "buffer_id", unique=True),
+    )
+
+class SaleArchive(Base):
+    # Sales moved out of `sales` by crud.archive_sales (scripts/archive_sales.py), with
+    # their ids. Reads only union it in when their date / id range reaches it.
+    __tablename__ = "sales_archive"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    total_price = Column(DECIMAL(12, 2), nullable=False)
+    date = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("idx_sales_archive_product_id_date", product_id, date),
+        Index("idx_sales_archive_date", date),
+    )
+
+class SaleMonthlyRollup(Base):
+    # Per product and month (UTC) totals of the archived sales, so the all-time
+    # dashboard KPIs stay intact without scanning the archive
+    __tablename__ = "sales_monthly_rollup"
+
+    month = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    sales_count = Column(Integer, nullable=False)
+    quantity = Column(BigInteger, nullable=False)
+    total_price = Column(DECIMAL(16, 2), nullable=False)
+
+    __table_args__ = (
+        Index("idx_sales_monthly_rollup_product_id", product_id),
+    )
+
+class CacheVersion(Base):
+    # One row per cache tag, bumped by writers: categories/products always (they version
+    # the sales export), sales when the cache bus runs in polling mode
+    __tablename__ = "cache_versions"
 
-    product = relationship("Product", back_populates="sales") 
\ No newline at end of file
+    tag = Column(String(64), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
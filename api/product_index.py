@@ -0,0 +1,307 @@
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_WORD = re.compile(r"\w+")
+_MAX_CHAR = "\U0010ffff"
+# Prefix ranges wider than this are answered by walking the products best sellers
+# first and stopping at `limit` matches, instead of ranking every candidate.
+BROAD_RANGE = 1000
+# Bulk writes up to this many products are still applied one `insort` at a time:
+# below it, shifting the lists per key is cheaper than rebuilding them.
+MERGE_THRESHOLD = 32
+
+def fold(text: str) -> str:
+    """Case- and accent-insensitive form of `text`: "Eletrônicos" -> "eletronicos"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def _words(*texts: Optional[str]) -> List[str]:
+    return sorted({word for text in texts if text for word in _WORD.findall(fold(text))})
+
+def _without(items: list, removed: list) -> list:
+    """A copy of the sorted list `items` without the `removed` items (those not in it are ignored)."""
+    positions = []
+    for item in removed:
+        position = bisect_left(items, item)
+        if position < len(items) and items[position] == item:
+            positions.append(position)
+    kept, start = [], 0
+    for position in sorted(positions):
+        kept.extend(items[start:position])
+        start = position + 1
+    kept.extend(items[start:])
+    return kept
+
+def _merged(items: list, new: list) -> list:
+    """The sorted lists `items` and `new` merged: `new` is bisected into place, `items` copied in slices."""
+    merged, start = [], 0
+    for item in new:
+        position = bisect_left(items, item, start)
+        merged.extend(items[start:position])
+        merged.append(item)
+        start = position
+    merged.extend(items[start:])
+    return merged
+
+class ProductPrefixIndex:
+    """
+    In-process prefix index over product names and brands for `GET /products/autocomplete`.
+
+    Every folded word of a product's name and brand is a `(word, product_id)` key in
+    one sorted list, so the products with a word starting with a prefix are a
+    contiguous range found with `bisect`. A query matches a product when each of its
+    words is a prefix of one of the product's words; the narrowest of those ranges
+    drives the lookup. Matches are ranked best sellers first (`units_sold` when the
+    product was last indexed), then by name.
+
+    Built from the database at startup, updated in place by the crud product writes of
+    this process (bulk writes merge their keys into new lists outside the lock, see
+    `upsert_many`), and rebuilt in the background when the cache bus reports product
+    writes by another worker. Queries never touch the database and only wait on the
+    lock for single-product writes and list swaps.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, int]] = []
+        self._products: Dict[int, dict] = {}
+        self._ranked: List[tuple] = [] # Rank keys of every product, best first
+        self._rebuilding = False
+        self._rerun = False # Invalidated during a rebuild: that rebuild may have read stale rows
+        self._generation = 0 # Bumped by every change of the key lists
+        self._replay = None # Writes made while a rebuild reads the table, re-applied after it
+        self.ready = False
+        self.builds = 0
+        self.queries = 0
+        self.last_error = None
+
+    # --- Building ---
+
+    def rebuild(self, session_factory):
+        """Reloads every product (id, name, brand, category, units sold) in one query."""
+        from sqlalchemy import select
+        from . import models
+
+        with self._lock:
+            self._replay = []
+        db = session_factory()
+        try:
+            rows = db.execute(select(
+                models.Product.id, models.Product.name, models.Product.brand,
+                models.Product.category_id, models.Product.units_sold,
+            )).all()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        finally:
+            db.close()
+
+        products = {row.id: self._entry(row.id, row.name, row.brand, row.category_id, row.units_sold) for row in rows}
+        keys = sorted((word, product_id) for product_id, entry in products.items() for word in entry["words"])
+        ranked = sorted(entry["rank"] for entry in products.values())
+        with self._lock:
+            replay, self._replay = self._replay or [], None
+            self._products = products
+            self._keys = keys
+            self._ranked = ranked
+            self._generation += 1
+            for product_id, entry in replay:
+                self._apply(product_id, entry)
+            self.ready = True
+            self.builds += 1
+
+    def rebuild_in_background(self, session_factory):
+        """
+        Rebuilds on a background thread, once at a time; queries keep using the current
+        index meanwhile. A request during a rebuild runs another one right after it.
+        """
+        with self._lock:
+            if self._rebuilding:
+                self._rerun = True
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild_quietly, args=(session_factory,), name="product-index-rebuild", daemon=True).start()
+
+    def _rebuild_quietly(self, session_factory):
+        while True:
+            with self._lock:
+                self._rerun = False
+            try:
+                self.rebuild(session_factory)
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Product index: rebuild failed: {e}")
+            with self._lock:
+                if not self._rerun:
+                    self._rebuilding = False
+                    return
+
+    def on_invalidate(self, session_factory, tags):
+        # Cache bus listener: products written by another worker
+        if "products" in tags:
+            self.rebuild_in_background(session_factory)
+
+    # --- Incremental updates ---
+
+    @staticmethod
+    def _entry(product_id: int, name: str, brand: Optional[str], category_id: int, units_sold: Optional[int]) -> dict:
+        return {
+            "id": product_id,
+            "name": name,
+            "brand": brand,
+            "category_id": category_id,
+            "units_sold": units_sold or 0,
+            "rank": (-(units_sold or 0), fold(name), product_id),
+            "words": _words(name, brand),
+        }
+
+    def upsert(self, product_id: int, name: str, brand: Optional[str], category_id: int, units_sold: Optional[int] = None):
+        """Adds or replaces one product (keeps its known `units_sold` when not given)."""
+        with self._lock:
+            if units_sold is None and product_id in self._products:
+                units_sold = self._products[product_id]["units_sold"]
+            self._apply(product_id, self._entry(product_id, name, brand, category_id, units_sold))
+
+    def upsert_many(self, products: Iterable[Tuple[int, str, Optional[str], int, Optional[int]]]):
+        """
+        `upsert` for many `(product_id, name, brand, category_id, units_sold)` products at once.
+
+        `insort` shifts the whole key list for every key, so a bulk write of k
+        products into an index of n keys would cost O(k * n). Here the replaced keys
+        are cut out and the new ones bisected into place, copying each list once in
+        slices: O(n) memory copies plus O(k log n) comparisons. The copies are made
+        outside the lock and swapped in, so queries don't wait for them; if another
+        write changed the lists meanwhile, the merge is redone under the lock.
+        """
+        entries, unknown_sales = {}, set()
+        for product_id, name, brand, category_id, units_sold in products:
+            if units_sold is None:
+                if product_id in entries:
+                    units_sold = entries[product_id]["units_sold"]
+                else:
+                    unknown_sales.add(product_id)
+            else:
+                unknown_sales.discard(product_id)
+            entries[product_id] = self._entry(product_id, name, brand, category_id, units_sold)
+        with self._lock:
+            for product_id in unknown_sales:
+                known = self._products.get(product_id)
+                if known is not None:
+                    entry = entries[product_id]
+                    entry["units_sold"] = known["units_sold"]
+                    entry["rank"] = (-known["units_sold"], *entry["rank"][1:])
+            if len(entries) <= MERGE_THRESHOLD:
+                for product_id, entry in entries.items():
+                    self._apply(product_id, entry)
+                return
+            generation = self._generation
+            keys, ranked = self._keys, self._ranked
+            previous = [self._products.get(product_id) for product_id in entries]
+        keys, ranked = self._merged_lists(keys, ranked, previous, entries)
+
+        with self._lock:
+            if self._generation != generation:
+                previous = [self._products.get(product_id) for product_id in entries]
+                keys, ranked = self._merged_lists(self._keys, self._ranked, previous, entries)
+            self._keys, self._ranked = keys, ranked
+            self._generation += 1
+            self._products.update(entries)
+            if self._replay is not None:
+                self._replay.extend(entries.items())
+
+    @staticmethod
+    def _merged_lists(keys: list, ranked: list, previous: List[Optional[dict]], entries: Dict[int, dict]) -> Tuple[list, list]:
+        # New key and rank lists with `entries` in place of the `previous` entries of those products
+        old_keys, old_ranks = [], []
+        for entry in previous:
+            if entry is not None:
+                old_keys.extend((word, entry["id"]) for word in entry["words"])
+                old_ranks.append(entry["rank"])
+        new_keys = sorted((word, product_id) for product_id, entry in entries.items() for word in entry["words"])
+        new_ranks = sorted(entry["rank"] for entry in entries.values())
+        return _merged(_without(keys, old_keys), new_keys), _merged(_without(ranked, old_ranks), new_ranks)
+
+    def remove(self, product_id: int):
+        with self._lock:
+            self._apply(product_id, None)
+
+    def _apply(self, product_id: int, entry: Optional[dict]):
+        # Replaces (or with None, removes) a product; the caller holds the lock.
+        self._generation += 1
+        previous = self._products.pop(product_id, None)
+        if previous is not None:
+            self._remove_keys(product_id, previous["words"])
+            position = bisect_left(self._ranked, previous["rank"])
+            if position < len(self._ranked) and self._ranked[position] == previous["rank"]:
+                del self._ranked[position]
+        if entry is not None:
+            self._products[product_id] = entry
+            for word in entry["words"]:
+                insort(self._keys, (word, product_id))
+            insort(self._ranked, entry["rank"])
+        if self._replay is not None:
+            self._replay.append((product_id, entry))
+
+    def _remove_keys(self, product_id: int, words: List[str]):
+        for word in words:
+            position = bisect_left(self._keys, (word, product_id))
+            if position < len(self._keys) and self._keys[position] == (word, product_id):
+                del self._keys[position]
+
+    # --- Queries ---
+
+    def search(self, query: str, limit: int = 10) -> List[dict]:
+        words = _WORD.findall(fold(query))
+        if not words:
+            return []
+
+        def matches(entry):
+            return all(any(word.startswith(query_word) for word in entry["words"]) for query_word in words)
+
+        with self._lock:
+            self.queries += 1
+            ranges = [
+                (bisect_left(self._keys, (word,)), bisect_left(self._keys, (word + _MAX_CHAR,)))
+                for word in words
+            ]
+            low, high = min(ranges, key=lambda bounds: bounds[1] - bounds[0])
+            if high - low <= BROAD_RANGE:
+                candidates = {self._keys[position][1] for position in range(low, high)}
+                best = heapq.nsmallest(
+                    limit,
+                    (entry for entry in map(self._products.__getitem__, candidates) if matches(entry)),
+                    key=lambda entry: entry["rank"],
+                )
+            else:
+                best = []
+                for _, _, product_id in self._ranked:
+                    entry = self._products[product_id]
+                    if matches(entry):
+                        best.append(entry)
+                        if len(best) == limit:
+                            break
+
+        return [
+            {"id": entry["id"], "name": entry["name"], "brand": entry["brand"], "category_id": entry["category_id"]}
+            for entry in best
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "products": len(self._products),
+                "keys": len(self._keys),
+                "builds": self.builds,
+                "rebuilding": self._rebuilding,
+                "queries": self.queries,
+                "last_error": self.last_error,
+            }
+
+product_index = ProductPrefixIndex()
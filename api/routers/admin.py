@@ -0,0 +1,143 @@
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.orm import Session
+
+from .. import crud # Use relative imports
+from ..admission import admission_controller # Use relative import
+from ..cache import query_cache # Use relative import
+from ..cache_bus import cache_bus # Use relative import
+from ..database import get_db, slow_query_log, statement_cache_stats # Use relative import
+from ..export_cache import export_cache # Use relative import
+from ..product_index import product_index # Use relative import
+from ..sale_buffer import sale_buffer # Use relative import
+from ..sale_events import sale_events # Use relative import
+from ..sale_sketches import sale_sketches # Use relative import
+from ..sales_columns import sales_columns # Use relative import
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["Admin"]
+)
+
+@router.get("/statement-cache", summary="Compiled statement cache hit rate")
+def get_statement_cache_stats():
+    """
+    Returns how many executed statements were served from SQLAlchemy's compiled cache
+    since the process started.
+
+    - **hits** / **misses**: Cacheable statements found / not found in the compiled cache.
+    - **uncached**: Statements that can't be cached (e.g. DDL).
+    - **hit_rate**: `hits / (hits + misses)`.
+    """
+    return statement_cache_stats.snapshot()
+
+@router.get("/query-cache", summary="In-process query result cache statistics")
+def get_query_cache_stats():
+    """
+    Returns entry count, hit/miss counters and the current invalidation version of
+    each table tag for the in-process query result cache, plus the state of the
+    cross-worker invalidation bus (`notify`, `poll` or `off`).
+    """
+    return {**query_cache.stats(), "bus": cache_bus.stats()}
+
+@router.get("/sale-buffer", summary="Write-behind sale buffer depth and flush lag")
+def get_sale_buffer_stats():
+    """
+    Reports the state of the buffered sale ingest mode.
+
+    - **depth**: Sales acknowledged but not yet written to the `sales` table.
+    - **flush_lag_seconds**: Age of the oldest pending sale.
+    - **accepted_total** / **flushed_total** / **rejected_total**: Counters since startup.
+    - **replayed_total**: Sales adopted from the WAL segments of crashed workers.
+    - **segments**: WAL files this worker holds (active, sealed and adopted).
+    """
+    return sale_buffer.stats()
+
+@router.get("/dashboard-stream", summary="Live dashboard stream subscribers")
+def get_dashboard_stream_stats():
+    """
+    Reports the server-sent events fan-out behind `GET /dashboard/stream` in this process.
+
+    - **subscribers**: Open streams.
+    - **published_total**: Sales published since startup.
+    - **fetched_total** / **watermark**: Sales read for the streams after other workers' writes,
+      and the highest sale id read or published (null while no stream is open).
+    - **dropped_total**: Times a slow open stream overflowed and was sent a `resync`.
+    """
+    return sale_events.stats()
+
+@router.get("/sale-sketches", summary="Sale value quantile sketches behind the dashboard percentiles")
+def get_sale_sketches_stats():
+    """
+    Reports the per category and month sale value sketches of this process.
+
+    - **sketches** / **buckets**: Number of sketches and their total bucket count (memory).
+    - **sales** / **watermark**: Sales counted and the highest sale id seen.
+    - **pending_gaps**: Skipped ids still re-checked in case their transaction commits late.
+    """
+    return sale_sketches.stats()
+
+@router.get("/export-cache", summary="Cached CSV export files")
+def get_export_cache_stats():
+    """
+    Reports the rendered full sales exports on disk.
+
+    - **files** / **bytes**: Cached versions and their size (bounded by `max_files` / `max_bytes`).
+    - **hits** / **misses**: Requests whose data version was already rendered, or not.
+    - **stale_served**: Requests answered with the previous version while the new one rendered.
+    - **rendering**: Versions being rendered right now.
+    """
+    return export_cache.stats()
+
+@router.get("/product-index", summary="Product autocomplete index size and rebuilds")
+def get_product_index_stats():
+    """
+    Reports the in-process prefix index behind `GET /products/autocomplete`.
+
+    - **products** / **keys**: Indexed products and (word, product) keys.
+    - **builds**: Full rebuilds (at startup and after product writes by other workers).
+    - **queries**: Autocomplete lookups served.
+    """
+    return product_index.stats()
+
+@router.get("/admission", summary="Per-route admission control counters")
+def get_admission_stats():
+    """
+    Returns, for every route with a concurrency limit, its configuration and the
+    current `in_flight` / `queued` requests plus admitted and rejected (503) counters.
+    """
+    return admission_controller.stats()
+
+@router.post("/reconcile-product-counters", summary="Rebuild product sales counters from the sales table")
+def reconcile_product_counters(db: Session = Depends(get_db)):
+    """
+    Recomputes `units_sold`, `revenue` and `last_sold_at` for every product from
+    the `sales` table and returns how many products had drifted. Sales recorded
+    meanwhile wait for it to finish before updating their product's counters.
+    """
+    return {"products_corrected": crud.reconcile_product_sales_counters(db)}
+
+@router.get("/slow-queries", summary="Recently recorded slow SQL statements")
+def get_slow_queries(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Returns the most recent statements that exceeded `SLOW_QUERY_THRESHOLD_MS`, newest first.
+
+    Each entry has the normalized SQL, the parameter shape (types only), the crud
+    function that issued it and, for a sample of SELECTs, its `EXPLAIN` plan.
+    """
+    return {**slow_query_log.stats(), "entries": slow_query_log.entries(limit)}
+
+@router.delete("/slow-queries", status_code=status.HTTP_204_NO_CONTENT, summary="Clear the slow-query ring buffer")
+def clear_slow_queries():
+    slow_query_log.clear()
+
+@router.get("/sales-columns", summary="In-memory NumPy sales columns behind the dashboard KPIs")
+def get_sales_columns_stats():
+    """
+    Reports the column store used with `ANALYTICS_ENGINE=numpy` (`enabled` is false otherwise).
+
+    - **sales** / **capacity**: Sales loaded and the allocated length of each column.
+    - **bytes** / **bytes_per_sale**: Memory held by the columns and the product -> category mapping.
+    - **watermark** / **pending_gaps**: Highest sale id loaded, and skipped ids still re-checked.
+    - **behind**: A new sale was too far past the watermark to append; the next read syncs it.
+    """
+    return sales_columns.stats()
@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Query, status, Depends
+from typing import List, Literal, Optional
+from sqlalchemy.orm import Session
+from datetime import date
+
+from .. import crud, schemas # Use relative imports
+from ..database import get_db # Use relative import
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["Analytics"]
+)
+
+def _validate_date_range(start_date: Optional[date], end_date: Optional[date]):
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must be on or before end_date."
+        )
+
+@router.get("/top-products", response_model=List[schemas.TopProduct], summary="Best-selling products ranked by revenue or units")
+def get_top_products(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    rank_by: Literal["revenue", "units"] = "revenue",
+    limit: int = Query(10, ge=1, le=1000),
+    per_category: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Returns the best-selling products, computed in a single SQL statement.
+
+    - **start_date** / **end_date** (Optional): Inclusive sale date range (`YYYY-MM-DD`).
+    - **category_id** (Optional): Only rank products of this category.
+    - **rank_by**: `revenue` (default) or `units`.
+    - **limit**: Maximum number of rows to return.
+    - **per_category** (Optional): Keep only the top N products of each category (category leaderboard).
+
+    Each row carries its overall `rank` and its `category_rank` within its category.
+    Results are cached until the next sale, product or category write.
+    """
+    _validate_date_range(start_date, end_date)
+    return crud.get_top_products(
+        db,
+        start_date=start_date,
+        end_date=end_date,
+        category_id=category_id,
+        rank_by=rank_by,
+        limit=limit,
+        per_category=per_category,
+    )
+
+@router.get("/top-categories", response_model=List[schemas.TopCategory], summary="Categories ranked by revenue or units")
+def get_top_categories(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    rank_by: Literal["revenue", "units"] = "revenue",
+    limit: int = Query(10, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    Returns the category leaderboard, computed in a single grouped SQL statement.
+
+    - **start_date** / **end_date** (Optional): Inclusive sale date range (`YYYY-MM-DD`).
+    - **category_id** (Optional): Restrict the result to one category.
+    - **rank_by**: `revenue` (default) or `units`.
+    - **limit**: Maximum number of categories to return.
+
+    Results are cached until the next sale, product or category write.
+    """
+    _validate_date_range(start_date, end_date)
+    return crud.get_top_categories(
+        db,
+        start_date=start_date,
+        end_date=end_date,
+        category_id=category_id,
+        rank_by=rank_by,
+        limit=limit,
+    )
+
+@router.get("/monthly-sales", response_model=List[schemas.MonthlySales], summary="Sales totals per month")
+def get_monthly_sales(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    category_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Returns the number of sales, units sold and revenue of every UTC month with sales, oldest first.
+
+    - **start_date** / **end_date** (Optional): Inclusive sale date range (`YYYY-MM-DD`).
+    - **category_id** (Optional): Only count sales of this category's products.
+
+    Computed from the in-memory column store with `ANALYTICS_ENGINE=numpy`, otherwise
+    in a single grouped SQL statement cached until the next write.
+    """
+    _validate_date_range(start_date, end_date)
+    return crud.get_monthly_sales(db, start_date=start_date, end_date=end_date, category_id=category_id)
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List, Optional
+from typing import List, Optional, Union
 from sqlalchemy.orm import Session
 
 from .. import crud, models, schemas # Use relative imports
-from ..database import get_db # Use relative import
+from ..database import get_db, get_db_transaction # Use relative import
 
 router = APIRouter(
     prefix="/categories", # Define prefix here
@@ -13,7 +13,7 @@ router = APIRouter(
 # Removed in-memory storage
 
 @router.post("", response_model=schemas.Category, status_code=status.HTTP_201_CREATED, summary="Create a new category")
-def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db)):
+def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db_transaction, scope="function")):
     """
     Creates a new category.
 
@@ -43,8 +43,12 @@ def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_
 
     return created_category
 
-@router.get("", response_model=schemas.CategoriesListResponse, summary="List categories with pagination")
-def list_categories(skip: int = 0, limit: int = 10, name: Optional[str] = None, db: Session = Depends(get_db)):
+@router.get(
+    "",
+    response_model=Union[schemas.CategoriesWithStatsListResponse, schemas.CategoriesListResponse],
+    summary="List categories with pagination"
+)
+def list_categories(skip: int = 0, limit: int = 10, name: Optional[str] = None, with_stats: bool = False, db: Session = Depends(get_db)):
     """
     Retrieves a list of **categories** from the database with pagination support.
 
@@ -52,8 +56,12 @@ def list_categories(skip: int = 0, limit: int = 10, name: Optional[str] = None,
 
     Supports pagination with `skip` and `limit` query parameters.
     Optionally filters by `name` (case-insensitive).
+    With `with_stats=true`, each category also has `product_count`, `units_sold` and `revenue`
+    (totals over its products), computed for the whole page in a single query.
     """
-    categories, total_count = crud.get_categories(db, skip=skip, limit=limit, name=name)
+    categories, total_count = crud.get_categories(db, skip=skip, limit=limit, name=name, with_stats=with_stats)
+    if with_stats:
+        return schemas.CategoriesWithStatsListResponse(categories=categories, total=total_count)
     return schemas.CategoriesListResponse(categories=categories, total=total_count)
 
 @router.get("/{category_id}", response_model=schemas.Category, summary="Get a specific category by ID")
@@ -74,7 +82,7 @@ def get_category(category_id: int, db: Session = Depends(get_db)):
 def update_category_name_endpoint(
     category_id: int,
     category_data: schemas.CategoryUpdate, # Use the new schema for the request body
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db_transaction, scope="function")
 ):
     """
     Updates the name of a specific category.
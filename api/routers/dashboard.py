@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse # Import StreamingResponse
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse # Import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional # Optional might be needed
 from sqlalchemy.orm import Session
 from datetime import datetime # Import datetime
@@ -7,9 +8,12 @@ from collections import defaultdict # Import defaultdict for grouping
 from decimal import Decimal # Import Decimal
 import csv # Import csv
 import io # Import io
+import json
 
 from .. import crud, models, schemas # Use relative imports
-from ..database import get_db # Use relative import
+from ..database import SessionLocal, get_db # Use relative import
+from ..export_cache import export_cache # Use relative import
+from ..sale_events import sale_events # Use relative import
 
 router = APIRouter(
     tags=["Dashboard"]
@@ -30,10 +34,13 @@ def get_dashboard_data_with_sales(
     - **total_sales_value**: Sum of 'total_price' for sales (filtered if category_id is provided).
     - **total_items_sold**: Sum of 'quantity' for sales (filtered if category_id is provided).
     - **average_sale_value**: Average 'total_price' across sales (filtered if category_id is provided).
+    - **median_sale_value** / **p90_sale_value** / **p99_sale_value**: Sale value quantiles from
+      per category and month sketches, within 1% (`SALE_SKETCHES_RELATIVE_ACCURACY`) of the exact value.
     - **sales_by_month**: List of monthly sales summaries (filtered if category_id is provided, limited results).
     """
     # Fetch summary data, passing category_id
     summary_data = crud.get_dashboard_summary(db, category_id=category_id)
+    quantiles = crud.get_sale_value_quantiles(db, category_id=category_id)
 
     # Fetch detailed sales data, passing category_id
     sales_details = crud.get_sales(db, limit=1000, category_id=category_id)
@@ -74,27 +81,84 @@ def get_dashboard_data_with_sales(
         "total_sales_value": summary_data["total_sales_value"], # Overall total
         "total_items_sold": summary_data["total_items_sold"],       # Overall total
         "average_sale_value": summary_data["average_sale_value"],   # Overall average
+        **quantiles,
         "sales_by_month": monthly_summaries # Use the processed list of monthly summaries
     }
 
-@router.get("/export-csv/sales_with_products", summary="Export all sales data with product details as CSV")
-def export_sales_data_csv(db: Session = Depends(get_db)):
+def _dashboard_snapshot(category_id: Optional[int]):
+    # A short-lived session: the stream itself must not hold a database connection.
+    db = SessionLocal()
+    try:
+        return crud.get_dashboard_summary(db, category_id=category_id)
+    finally:
+        db.close()
+
+def _sse(event_type: str, data, event_id=None) -> str:
+    message = f"event: {event_type}\n"
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data, default=str)}\n\n"
+
+@router.get("/dashboard/stream", summary="Live KPI deltas and new sales as server-sent events")
+async def stream_dashboard(request: Request, category_id: Optional[int] = None):
     """
-    Exports all sales data, including related product and category information,
-    as a CSV file suitable for download.
+    Opens a `text/event-stream` that keeps a dashboard up to date without polling `GET /dashboard`.
+
+    - **category_id** (Query Parameter, Optional): Only sales of products in this category.
+
+    Events:
+    - `summary`: sent once on connect; the KPIs of `GET /dashboard` plus `sales_count` and `last_sale_id`.
+    - `sale`: a newly committed sale (`sale`) and the change it makes to the KPIs (`delta`:
+      `total_sales_value`, `total_items_sold`, `sales_count`). The average is `total_sales_value / sales_count`.
+    - `resync`: events were dropped because the client fell behind (or sales recorded by another
+      worker couldn't be read); reconnect to get a fresh `summary`.
+
+    A comment line is sent every few seconds as a heartbeat. Open streams cost no database
+    queries after the initial snapshot: sales are pushed by the process that commits them,
+    and each process reads the sales of the others once (an id seek) for all its streams.
     """
-    sales_data = crud.get_all_sales_with_details(db)
+    # Subscribe before taking the snapshot so no sale falls in between;
+    # sales already counted by the snapshot are skipped by id below.
+    subscription = sale_events.subscribe(category_id)
+    try:
+        snapshot = await run_in_threadpool(_dashboard_snapshot, category_id)
+    except BaseException:
+        sale_events.unsubscribe(subscription)
+        raise
+    last_sale_id = snapshot["last_sale_id"] or 0
+    sale_events.follow_from(last_sale_id)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
+    async def event_stream():
+        try:
+            yield _sse("summary", snapshot)
+            while True:
+                event = await subscription.get(timeout=sale_events.heartbeat_interval)
+                if event is None: # Server shutting down
+                    return
+                if event["type"] == "heartbeat":
+                    yield ": heartbeat\n\n"
+                    continue
+                if event["type"] == "sale" and event["id"] is not None and event["id"] <= last_sale_id:
+                    continue
+                yield _sse(event["type"], event["data"], event.get("id"))
+        finally:
+            sale_events.unsubscribe(subscription)
 
-    # Define header row based on combined data
-    header = [
-        'sale_id', 'product_id', 'product_name', 'product_description',
-        'product_price', 'product_brand', 'category_id', 'category_name',
-        'quantity', 'total_price', 'date'
-    ]
-    writer.writerow(header)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+EXPORT_CSV_HEADER = [
+    'sale_id', 'product_id', 'product_name', 'product_description',
+    'product_price', 'product_brand', 'category_id', 'category_name',
+    'quantity', 'total_price', 'date'
+]
+
+def _write_sales_csv(output, sales_data):
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_CSV_HEADER)
 
     # Write data rows
     for sale in sales_data:
@@ -115,9 +179,113 @@ def export_sales_data_csv(db: Session = Depends(get_db)):
             writer.writerow(row)
         # else: Log or handle sales with missing product/category info if necessary
 
+def _watermark_headers(sales_data, since_id=None, since=None) -> dict:
+    # `sales_data` is in id order (date order when paging on `since`, see the endpoint)
+    headers = {}
+    if since is not None:
+        last = sales_data[-1] if sales_data else None
+        next_since, next_since_id = (last.date, last.id) if last else (since, since_id)
+        headers["X-Next-Since"] = next_since.isoformat()
+        if next_since_id is not None:
+            headers["X-Next-Since-Id"] = str(next_since_id)
+        return headers
+    settled = crud.settled_sales_count(sales_data, since_id)
+    next_since_id = sales_data[settled - 1].id if settled else since_id
+    if next_since_id is not None:
+        headers["X-Next-Since-Id"] = str(next_since_id)
+    next_since = max((sale.date for sale in sales_data[:settled] if sale.date), default=None)
+    if next_since is not None:
+        headers["X-Next-Since"] = next_since.isoformat()
+    return headers
+
+def _render_full_export(output) -> dict:
+    # Runs in the request thread or the export cache's background thread: own session.
+    db = SessionLocal()
+    try:
+        sales_data = crud.get_all_sales_with_details(db)
+        _write_sales_csv(output, sales_data)
+        return _watermark_headers(sales_data)
+    finally:
+        db.close()
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def _cached_full_export(request: Request, db: Session):
+    version = crud.get_export_version(db)
+    entry = export_cache.lookup(version)
+    if entry is None:
+        stale = export_cache.latest()
+        if stale is not None:
+            # Serve the previous version while the new one renders once, in the background
+            export_cache.render_in_background(version, _render_full_export)
+            entry = stale
+        else:
+            entry = export_cache.render(version, _render_full_export)
+
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache", **entry["headers"]}
+    if _etag_matches(request.headers.get("if-none-match"), entry["etag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(
+        entry["path"],
+        media_type="text/csv",
+        filename="sales_with_products.csv",
+        stat_result=entry["stat"],
+        headers=headers,
+    )
+
+@router.get("/export-csv/sales_with_products", summary="Export all sales data with product details as CSV")
+def export_sales_data_csv(
+    request: Request,
+    db: Session = Depends(get_db),
+    since_id: Optional[int] = Query(None, ge=0),
+    since: Optional[datetime] = None,
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Exports all sales data, including related product and category information,
+    as a CSV file suitable for download.
+
+    The full export is rendered once per data version into a cached file and served with
+    an `ETag`: send it back in `If-None-Match` to get **304 Not Modified** when nothing
+    changed, and use `Range` to resume an interrupted download. After a write, the
+    previous file keeps being served (with its own `ETag`) until the new one is rendered.
+
+    For incremental pulls (e.g. a nightly ETL), pass the watermark from the previous export:
+    - **since_id** (Query Parameter, Optional): Only sales with a greater `sale_id`, ordered by `sale_id`.
+    - **since** (Query Parameter, Optional): Only sales dated after this timestamp (or dated at it with a
+      `sale_id` greater than `since_id`), ordered by date then `sale_id`. Sales of the last
+      `EXPORT_SETTLE_SECONDS` (60 by default) are left for a later pull, since a sale can commit after
+      newer-dated ones. Handy for the first pull; `since_id` alone is exact and has no delay otherwise.
+    - **limit** (Query Parameter, Optional): At most this many sales, to pull a large delta in chunks.
+
+    The response headers carry the next watermark, to send back as is:
+    - `X-Next-Since-Id`: with `since_id` alone, the greatest `sale_id` no earlier `sale_id` can still
+      appear below; the sales after a possibly uncommitted id are held back until it commits or
+      `EXPORT_SETTLE_SECONDS` pass. With `since`, the `sale_id` of the last sale exported.
+    - `X-Next-Since`: with `since`, the date of the last sale exported; otherwise the latest
+      sale date up to `X-Next-Since-Id` (omitted if there was none).
+
+    The full export carries the same headers; sales after `X-Next-Since-Id` in it come again in
+    the next pull.
+    """
+    if since_id is None and since is None and limit is None and export_cache.enabled:
+        return _cached_full_export(request, db)
+
+    sales_data = crud.get_all_sales_with_details(db, since_id=since_id, since=since, limit=limit)
+    if since is None:
+        # Stop before a possibly in-flight id: those sales come with the next pull instead
+        sales_data = sales_data[:crud.settled_sales_count(sales_data, since_id)]
+
+    output = io.StringIO()
+    _write_sales_csv(output, sales_data)
+
     output.seek(0)
     return StreamingResponse(
         output,
         media_type="text/csv",
-        headers={ "Content-Disposition": "attachment; filename=sales_with_products.csv" }
-    ) 
\ No newline at end of file
+        headers={ "Content-Disposition": "attachment; filename=sales_with_products.csv", **_watermark_headers(sales_data, since_id, since) }
+    )
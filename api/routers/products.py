@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, File, UploadFile, Depends, Query, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from sqlalchemy.orm import Session
 import csv
 import io
+import json
 from pydantic import ValidationError
 
 from .. import crud, models, schemas
-from ..database import get_db
+from ..database import SessionLocal, get_db, get_db_transaction
+from ..fieldsets import PRODUCT_FIELDS, parse_fields, partial_model
+from ..product_index import product_index
 
 router = APIRouter(
     prefix="/products",
@@ -15,25 +20,48 @@ router = APIRouter(
 
 # Removed in-memory storage
 
+# Upper bound on the IDs accepted by /products/batch
+MAX_BATCH_IDS = 500
+
 @router.get("", response_model=schemas.ProductListResponse, summary="List all products")
-def list_products(skip: int = 0, limit: int = 100, category: Optional[str] = None, name: Optional[str] = None, db: Session = Depends(get_db)):
+def list_products(
+    skip: int = 0,
+    limit: int = 100,
+    category: Optional[str] = None,
+    name: Optional[str] = None,
+    category_id: Optional[int] = None,
+    sort: Optional[Literal["units_sold", "revenue", "last_sold_at"]] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated product fields to return, e.g. `name,price,category`"),
+    db: Session = Depends(get_db)
+):
     """
     Retrieves a list of all **products** from the database with pagination support and total count.
 
     Supports pagination with `skip` and `limit` query parameters.
     Optionally filters by `category` name (case-insensitive).
     Optionally filters by product `name` (case-insensitive).
+    Optionally filters by exact `category_id`.
+    Optionally sorts best first by `sort`: `units_sold`, `revenue` or `last_sold_at`
+    (served by an index, so "best sellers in a category" is an index scan).
+    Optionally returns only some fields of each product with `fields` (`id` is always included):
+    `name`, `description`, `price`, `brand`, `category`, `units_sold`, `revenue`, `last_sold_at`.
+    Only those columns are read from the database.
 
     Returns:
         - `products`: A list of product objects.
         - `totalProducts`: The total number of products available (respecting the filters).
     """
-    products = crud.get_products(db, skip=skip, limit=limit, category_name=category, name=name)
-    total_products = crud.get_products_count(db, category_name=category, name=name)
+    field_set = parse_fields(fields, PRODUCT_FIELDS)
+    products = crud.get_products(db, skip=skip, limit=limit, category_name=category, name=name, category_id=category_id, sort=sort, fields=field_set)
+    total_products = crud.get_products_count(db, category_name=category, name=name, category_id=category_id)
+    if field_set is not None:
+        response_model = partial_model(schemas.ProductListResponse, ("totalProducts",) + tuple(f"products.{field}" for field in field_set))
+        response = response_model.model_validate({"products": products, "totalProducts": total_products}, from_attributes=True)
+        return Response(content=response.model_dump_json(), media_type="application/json")
     return {"products": products, "totalProducts": total_products}
 
 @router.post("", response_model=schemas.Product, status_code=status.HTTP_201_CREATED, summary="Create a new product")
-def create_product(product_input: schemas.ProductCreateApiInput, db: Session = Depends(get_db)):
+def create_product(product_input: schemas.ProductCreateApiInput, db: Session = Depends(get_db_transaction, scope="function")):
     """
     Creates a new product entry in the database.
     Accepts price as a string (e.g., "20.00") and converts it to float.
@@ -88,6 +116,68 @@ def create_product(product_input: schemas.ProductCreateApiInput, db: Session = D
     # If result is not a string, it must be the db_product object
     return result
 
+@router.get("/autocomplete", response_model=List[schemas.ProductSuggestion], summary="Suggest products by name or brand prefix")
+async def autocomplete_products(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user typed so far"),
+    limit: int = Query(10, ge=1, le=50),
+):
+    """
+    Returns up to `limit` products whose name or brand words start with the words of `q`,
+    ignoring case and accents (`"eletro sam"` finds "Eletrônico Samsung ...").
+
+    Served from an in-process prefix index kept in sync with product writes, without
+    querying the database: meant to be called on every keystroke of a search box.
+    Best sellers come first, then by name.
+    """
+    if not product_index.ready:
+        await run_in_threadpool(product_index.rebuild, SessionLocal)
+    return product_index.search(q, limit=limit)
+
+def _get_products_batch(product_ids: List[int], db: Session):
+    unique_ids = list(dict.fromkeys(product_ids)) # Dedupe, keeping the first occurrence's position
+    if len(unique_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many IDs: {len(unique_ids)} (maximum {MAX_BATCH_IDS} per request)."
+        )
+    found = {product.id: product for product in crud.get_products_by_ids(db, unique_ids)}
+    return {
+        "products": [found[product_id] for product_id in unique_ids if product_id in found],
+        "missing_ids": [product_id for product_id in unique_ids if product_id not in found],
+    }
+
+# Declared before /{product_id} so "batch" isn't taken for a product ID
+@router.get("/batch", response_model=schemas.ProductBatchResponse, summary="Get many products by ID")
+def get_products_batch(
+    ids: str = Query(..., description="Comma-separated product IDs, e.g. `1,2,3`"),
+    db: Session = Depends(get_db)
+):
+    """
+    Retrieves several products and their categories in one call (one database query).
+
+    - **ids**: Comma-separated product IDs (at most 500 distinct IDs; use `POST /products/batch` for long lists).
+
+    Returns:
+        - `products`: The products found, in the order requested, each ID once.
+        - `missing_ids`: Requested IDs that don't exist.
+
+    Raises 400 if an ID is not an integer or there are too many IDs.
+    """
+    try:
+        product_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be a comma-separated list of integers.")
+    return _get_products_batch(product_ids, db)
+
+@router.post("/batch", response_model=schemas.ProductBatchResponse, summary="Get many products by ID (long lists)")
+def post_products_batch(batch: schemas.ProductBatchRequest, db: Session = Depends(get_db)):
+    """
+    Same as `GET /products/batch`, with the IDs in the request body to avoid URL length limits.
+
+    - **ids**: List of product IDs (at most 500 distinct IDs).
+    """
+    return _get_products_batch(batch.ids, db)
+
 @router.get("/{product_id}", response_model=schemas.Product, summary="Get a specific product by ID")
 def get_product(product_id: int, db: Session = Depends(get_db)):
     """
@@ -191,4 +281,105 @@ async def upload_products_csv(file: UploadFile = File(...), db: Session = Depend
         "db_errors": db_errors
     }
 
-# TODO: Add PUT and DELETE endpoints later if needed 
\ No newline at end of file
+def _first_error(e: ValidationError) -> str:
+    error = e.errors()[0]
+    location = ".".join(str(part) for part in error["loc"])
+    return f"{location}: {error['msg']}" if location else error["msg"]
+
+def _parse_upsert_csv(decoded_content: str):
+    # Same column layout as /upload-csv, but the `id` column is used.
+    rows, errors = [], []
+    csv_reader = csv.reader(io.StringIO(decoded_content))
+    header = next(csv_reader, None)
+    if not header or len(header) < 6:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid CSV format. Expected 6 columns: id, name, description, price, category_id, brand")
+    for i, row in enumerate(csv_reader, start=1):
+        if not row:
+            continue
+        if len(row) < 6:
+            errors.append({"row": i, "status": "error", "error": "Invalid number of columns (expected 6)"})
+            continue
+        try:
+            rows.append((i, schemas.ProductUpsertApiInput(
+                id=row[0],
+                name=row[1],
+                description=row[2] if len(row[2]) > 0 else None,
+                price=row[3],
+                category_id=row[4],
+                brand=row[5] if len(row[5]) > 0 else None,
+            )))
+        except ValidationError as e:
+            errors.append({"row": i, "status": "error", "error": _first_error(e)})
+    return rows, errors
+
+def _parse_upsert_json(payload):
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array of products.")
+    rows, errors = [], []
+    for i, item in enumerate(payload, start=1):
+        try:
+            rows.append((i, schemas.ProductUpsertApiInput.model_validate(item)))
+        except ValidationError as e:
+            errors.append({"row": i, "status": "error", "error": _first_error(e)})
+    return rows, errors
+
+@router.put(
+    "/bulk",
+    response_model=schemas.ProductBulkUpsertResponse,
+    summary="Insert or update products in bulk by ID",
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": schemas.ProductUpsertApiInput.model_json_schema()}},
+        "text/csv": {"schema": {"type": "string"}},
+        "multipart/form-data": {"schema": {"type": "object", "properties": {"file": {"type": "string", "format": "binary"}}}},
+    }}},
+)
+async def bulk_upsert_products(request: Request, db: Session = Depends(get_db)):
+    """
+    Inserts or updates many products at once, matched by `id` (e.g. a supplier price file).
+
+    The body is either:
+    - a JSON array of products (`id`, `name`, `description`, `price` as string, `category_id`, `brand`), or
+    - a CSV file (`text/csv` body, or a multipart `file` field) with the same columns as `/upload-csv`:
+      `id`, `name`, `description`, `price`, `category_id`, `brand`. Here the `id` column is used.
+
+    Rows are written in batches, one `INSERT ... ON CONFLICT DO UPDATE` per batch. Each batch
+    commits on its own and invalidates the product caches once.
+
+    Returns the number of inserted, updated and failed rows, and an outcome for every row.
+    When an ID appears more than once, the last row wins.
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing 'file' field.")
+        content = await upload.read()
+    else:
+        content = await request.body()
+
+    try:
+        decoded_content = content.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Body encoding must be UTF-8")
+
+    if content_type.startswith(("text/csv", "application/csv", "multipart/form-data")):
+        rows, parse_errors = _parse_upsert_csv(decoded_content)
+    else:
+        try:
+            payload = json.loads(decoded_content)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON body.")
+        rows, parse_errors = _parse_upsert_json(payload)
+
+    # Large files take a while: keep the database work off the event loop.
+    outcomes = await run_in_threadpool(crud.upsert_products, db, rows)
+    results = sorted(parse_errors + outcomes, key=lambda outcome: outcome["row"])
+    return {
+        "inserted": sum(1 for outcome in outcomes if outcome["status"] == "inserted"),
+        "updated": sum(1 for outcome in outcomes if outcome["status"] == "updated"),
+        "failed": sum(1 for outcome in results if outcome["status"] == "error"),
+        "results": results,
+    }
+
+# TODO: Add a DELETE endpoint later if needed 
\ No newline at end of file
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException, status, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from typing import List, Optional
 from sqlalchemy.orm import Session
+from datetime import date
 
 from .. import crud, models, schemas
-from ..database import get_db
+from ..database import get_db, get_db_transaction
+from ..fieldsets import SALE_FIELDS, list_adapter, parse_fields, partial_model
+from ..sale_buffer import sale_buffer
 
 router = APIRouter(
     prefix="/sales",
@@ -13,21 +18,49 @@ router = APIRouter(
 # Removed in-memory storage
 
 @router.get("/", response_model=List[schemas.SaleWithProductInfo], summary="List all sales")
-def list_sales(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def list_sales(
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = Query(None, description="Comma-separated sale fields to return, e.g. `quantity,total_price,product.name`"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
     """
     Retrieves a list of all **sales** recorded in the database.
 
     Includes associated product information for each sale.
     Supports pagination with `skip` and `limit` query parameters.
+    Optionally returns only some fields of each sale with `fields` (`id` is always included):
+    `product_id`, `quantity`, `total_price`, `date`, `product` (the whole product) or
+    `product.<field>` (e.g. `product.name`). Only those columns are read from the database.
+
+    - **start_date** / **end_date** (Optional): Inclusive sale date range (`YYYY-MM-DD`).
+      Archived sales are read only when the range reaches back into the archive.
     *Note: Profit is not calculated or included.*
     """
-    sales = crud.get_sales(db, skip=skip, limit=limit)
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start_date must be on or before end_date.")
+
+    field_set = parse_fields(fields, SALE_FIELDS)
+    if field_set is not None:
+        sales = crud.get_sales(db, skip=skip, limit=limit, fields=field_set, start_date=start_date, end_date=end_date)
+        items = list_adapter(partial_model(schemas.SaleWithProductInfo, field_set))
+        return Response(content=items.dump_json(items.validate_python(sales, from_attributes=True)), media_type="application/json")
+
+    sales = crud.get_sales(db, skip=skip, limit=limit, start_date=start_date, end_date=end_date)
     # The response_model List[schemas.SaleWithProductInfo] handles the conversion
     # Pydantic will automatically map the nested product model data
     return sales
 
-@router.post("/", response_model=schemas.Sale, status_code=status.HTTP_201_CREATED, summary="Record a new sale")
-def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
+@router.post(
+    "/",
+    response_model=schemas.Sale,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": schemas.SaleAccepted, "description": "Sale accepted into the write-behind buffer"}},
+    summary="Record a new sale"
+)
+def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db_transaction, scope="function")):
     """
     Records a new sale transaction in the database.
 
@@ -36,9 +69,21 @@ def create_sale(sale: schemas.SaleCreate, db: Session = Depends(get_db)):
     - **product_id**: The ID of an existing product being sold.
     - **quantity**: The number of units sold.
 
+    When buffered ingest is enabled (`SALES_BUFFER_ENABLED=true`), the sale is written
+    to the local write-ahead log and acknowledged with **202** and a `buffer_id`;
+    it reaches the `sales` table with the next background flush.
+
     Raises 404 if the product_id does not exist.
     Raises 400 on other database errors.
     """
+    if sale_buffer.enabled:
+        total_price = crud.price_buffered_sale(db=db, sale=sale)
+        accepted = sale_buffer.submit(product_id=sale.product_id, quantity=sale.quantity, total_price=total_price)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(schemas.SaleAccepted(**accepted))
+        )
+
     db_sale = crud.create_sale(db=db, sale=sale)
     if db_sale is None:
         # Check if product was not found
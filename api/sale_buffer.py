@@ -0,0 +1,452 @@
+from collections import deque
+from datetime import datetime, timezone
+from decimal import Decimal
+from functools import partial
+from pathlib import Path
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import List
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from . import crud, models
+from .cache_bus import mark_dirty
+from .config import env_flag
+from .database import SessionLocal, after_commit
+from .sale_events import sale_events
+
+try:
+    import fcntl
+except ImportError: # Windows: no advisory file locks (see SaleBuffer._adopt_orphans)
+    fcntl = None
+
+def _try_lock(wal) -> bool:
+    """Exclusive, non-blocking lock on an open WAL file; released when the file is closed or the process dies."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(wal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+def _fsync_dir(path: Path):
+    # Makes a file creation or rename in the directory durable
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class _Segment:
+    """One WAL file owned by this process and how many of its sales are still pending."""
+
+    def __init__(self, path: Path, wal, sealed: bool = False):
+        self.path = path
+        self.wal = wal # Kept open, and so locked, until the file is removed
+        self.pending = 0
+        self.sealed = sealed # No longer appended to; removed once nothing in it is pending
+
+class SaleBuffer:
+    """
+    Write-behind buffer for `POST /sales/` during traffic bursts.
+
+    Accepted sales are appended to a local write-ahead log (one JSON object per
+    line, fsync'd before the request is acknowledged) and flushed to the `sales`
+    table by a background thread using multi-row INSERTs.
+
+    Every process writes its own WAL segments next to `wal_path`
+    (`sales_buffer.<pid>-<token>.<n>.wal`) and holds an exclusive `flock` on each
+    until it is removed, so gunicorn workers never touch each other's files. A flush
+    seals the active segment (new sales go to a fresh one) and deletes the segments
+    whose sales have all been written: nothing is ever rewritten, and `submit` only
+    waits for its own append. Segments nobody holds a lock on were left by a crashed
+    worker (or are an older single-file `sales_buffer.wal`); whichever process locks
+    one first adopts it and replays its sales, at startup and every
+    `orphan_scan_interval` seconds.
+
+    A crash between a flush commit and the segment removal replays those sales
+    again; each sale is inserted with its `buffer_id` (unique in `sales`), and
+    the ones already there are skipped, counters and events included.
+    """
+
+    def __init__(self, wal_path: Path, batch_size: int = 500, flush_interval: float = 0.2, enabled: bool = False, orphan_scan_interval: float = 30.0):
+        self.wal_path = Path(wal_path)
+        self.rejected_path = self.wal_path.with_suffix(self.wal_path.suffix + ".rejected")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.orphan_scan_interval = orphan_scan_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = deque() # (entry, segment) in acceptance order
+        self._active = None
+        self._segments = [] # Sealed and adopted segments with sales still pending
+        self._owner = None
+        self._sequence = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self.accepted_total = 0
+        self.flushed_total = 0
+        self.rejected_total = 0
+        self.replayed_total = 0
+        self.failed_flushes = 0
+        self.last_flush_at = None
+        self.last_flush_seconds = None
+        self.last_error = None
+
+    # --- Lifecycle ---
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self.wal_path.parent.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            logging.warning("Sale buffer: no file locks on this platform, run a single worker per WAL directory")
+        # Set after the fork, so every worker gets its own segment names
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._active = self._new_segment()
+        self._adopt_orphans()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sale-buffer-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        # Drain whatever arrived while the flusher was shutting down; anything
+        # that still fails stays in its segment and is replayed by another worker
+        # or on the next start.
+        try:
+            while self._pending and self.flush():
+                pass
+        except Exception as e:
+            logging.error(f"Sale buffer: final flush failed, {len(self._pending)} sale(s) kept in WAL: {e}")
+        with self._lock:
+            segments = [*self._segments, self._active]
+            self._segments, self._active = [], None
+            self._pending.clear()
+        for segment in segments:
+            if segment.pending:
+                segment.wal.close() # Unlocked: adopted by the next process to scan
+            else:
+                self._remove(segment)
+
+    # --- Segments ---
+
+    def _new_segment(self) -> _Segment:
+        self._sequence += 1
+        path = self.wal_path.with_name(f"{self.wal_path.stem}.{self._owner}.{self._sequence:06d}{self.wal_path.suffix}")
+        # Locked under a name the orphan scan ignores, then renamed: no other worker
+        # can lock (and adopt) a segment between its creation and ours.
+        new_path = path.with_name(path.name + ".new")
+        wal = open(new_path, "x", encoding="utf-8")
+        _try_lock(wal)
+        os.replace(new_path, path)
+        _fsync_dir(path.parent)
+        return _Segment(path, wal)
+
+    def _remove(self, segment: _Segment):
+        # Unlinked before the lock is released, so nobody adopts a flushed segment
+        try:
+            segment.path.unlink()
+        except FileNotFoundError:
+            pass
+        segment.wal.close()
+
+    def _adopt_orphans(self) -> int:
+        """Locks and replays the WAL segments no running process holds. Returns how many sales were adopted."""
+        with self._lock:
+            owned = {segment.path for segment in self._segments}
+            if self._active is not None:
+                owned.add(self._active.path)
+        adopted = 0
+        for path in sorted(self.wal_path.parent.glob(f"{self.wal_path.stem}*{self.wal_path.suffix}")):
+            if path in owned:
+                continue
+            try:
+                wal = open(path, "r", encoding="utf-8")
+            except FileNotFoundError:
+                continue # Flushed and removed by its owner meanwhile
+            try:
+                locked = _try_lock(wal) and os.path.samestat(os.fstat(wal.fileno()), os.stat(path))
+            except FileNotFoundError:
+                locked = False
+            if not locked:
+                wal.close() # Held by a running worker, or removed after we opened it
+                continue
+            segment = _Segment(path, wal, sealed=True)
+            entries = self._read_segment(segment)
+            if not entries:
+                self._remove(segment)
+                continue
+            logging.warning(f"Sale buffer: replaying {len(entries)} sale(s) left in {path.name}")
+            with self._lock:
+                segment.pending = len(entries)
+                self._segments.append(segment)
+                self._pending.extend((entry, segment) for entry in entries)
+                self.replayed_total += len(entries)
+            adopted += len(entries)
+        if adopted:
+            self._wake.set()
+        return adopted
+
+    def _read_segment(self, segment: _Segment) -> List[dict]:
+        entries = []
+        for line_number, line in enumerate(segment.wal, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(self._decode(json.loads(line)))
+            except (ValueError, KeyError) as e:
+                # A torn final line from a crash mid-append was never acknowledged.
+                logging.error(f"Sale buffer: skipping unreadable line {line_number} of {segment.path.name}: {e}")
+        return entries
+
+    # --- Ingest ---
+
+    def submit(self, product_id: int, quantity: int, total_price: Decimal) -> dict:
+        entry = {
+            "buffer_id": uuid.uuid4().hex,
+            "product_id": product_id,
+            "quantity": quantity,
+            "total_price": total_price,
+            "accepted_at": datetime.now(timezone.utc),
+        }
+        line = json.dumps(self._encode(entry)) + "\n"
+        with self._lock:
+            segment = self._active
+            if segment is None:
+                raise RuntimeError("Sale buffer is not running.")
+            segment.wal.write(line)
+            segment.wal.flush()
+            os.fsync(segment.wal.fileno())
+            segment.pending += 1
+            self._pending.append((entry, segment))
+            self.accepted_total += 1
+            depth = len(self._pending)
+        if depth >= self.batch_size:
+            self._wake.set()
+        return entry
+
+    @staticmethod
+    def _encode(entry: dict) -> dict:
+        return {
+            **entry,
+            "total_price": str(entry["total_price"]),
+            "accepted_at": entry["accepted_at"].isoformat(),
+        }
+
+    @staticmethod
+    def _decode(data: dict) -> dict:
+        return {
+            "buffer_id": data["buffer_id"],
+            "product_id": int(data["product_id"]),
+            "quantity": int(data["quantity"]),
+            "total_price": Decimal(data["total_price"]),
+            "accepted_at": datetime.fromisoformat(data["accepted_at"]),
+        }
+
+    # --- Flushing ---
+
+    def _run(self):
+        backoff = self.flush_interval
+        next_scan = time.monotonic() + self.orphan_scan_interval
+        while not self._stopping.is_set():
+            self._wake.wait(backoff)
+            self._wake.clear()
+            try:
+                # Without file locks a live worker's segments would look orphaned
+                if fcntl is not None and time.monotonic() >= next_scan:
+                    next_scan = time.monotonic() + self.orphan_scan_interval
+                    self._adopt_orphans()
+                while self._pending and self.flush():
+                    if self._stopping.is_set():
+                        break
+                backoff = self.flush_interval
+            except Exception as e:
+                self.failed_flushes += 1
+                self.last_error = str(e)
+                logging.error(f"Sale buffer: flush failed, will retry: {e}")
+                backoff = min(backoff * 2, 30.0)
+
+    def flush(self) -> int:
+        """Writes up to `batch_size` pending sales to the database. Returns how many were taken off the buffer."""
+        with self._flush_lock:
+            with self._lock:
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+                rotate = bool(batch) and batch[-1][1] is self._active
+            if not batch:
+                return 0
+            if rotate:
+                # Seal the segment the batch reaches into, so it can be deleted once
+                # flushed; the new file is created outside the lock submit waits on.
+                segment = self._new_segment()
+                with self._lock:
+                    self._active.sealed = True
+                    self._segments.append(self._active)
+                    self._active = segment
+
+            started = time.perf_counter()
+            rejected = self._insert_batch([entry for entry, _ in batch])
+
+            done = []
+            with self._lock:
+                for _, segment in batch:
+                    self._pending.popleft()
+                    segment.pending -= 1
+                    if segment.pending == 0 and segment.sealed:
+                        done.append(segment)
+                        self._segments.remove(segment)
+                self.flushed_total += len(batch) - len(rejected)
+                self.rejected_total += len(rejected)
+                self.last_flush_at = datetime.now(timezone.utc)
+                self.last_flush_seconds = time.perf_counter() - started
+                self.last_error = None
+            if rejected:
+                self._write_rejected(rejected)
+            for segment in done:
+                self._remove(segment)
+            return len(batch)
+
+    def _insert_batch(self, batch: List[dict]) -> List[dict]:
+        rows = [self._to_row(entry) for entry in batch]
+        db = SessionLocal()
+        try:
+            try:
+                self._insert_rows(db, rows)
+                db.commit()
+                return []
+            except IntegrityError as e:
+                db.rollback()
+                logging.error(f"Sale buffer: batch of {len(rows)} rejected ({e.orig}), retrying row by row")
+
+            # Isolate the offending rows so one bad sale can't wedge the buffer.
+            rejected = []
+            for entry, row in zip(batch, rows):
+                try:
+                    self._insert_rows(db, [row])
+                    db.commit()
+                except IntegrityError as e:
+                    db.rollback()
+                    rejected.append({**self._encode(entry), "error": str(e.orig)})
+            return rejected
+        finally:
+            db.close()
+
+    def _insert_rows(self, db, rows: List[dict]):
+        # Sales already delivered by an earlier flush of a replayed segment are
+        # skipped here (counters and events too); ON CONFLICT is only the backstop.
+        delivered = set(db.execute(
+            select(models.Sale.buffer_id).where(models.Sale.buffer_id.in_([row["buffer_id"] for row in rows]))
+        ).scalars())
+        rows = [row for row in rows if row["buffer_id"] not in delivered]
+        if not rows:
+            return
+        # RETURNING gives the ids of the rows actually inserted (a conflict returns none)
+        inserted = dict(db.execute(
+            self._insert_statement(db).values(rows).returning(models.Sale.buffer_id, models.Sale.id)
+        ).all())
+        rows = [{**row, "id": inserted[row["buffer_id"]]} for row in rows if row["buffer_id"] in inserted]
+        if not rows:
+            return
+        self._apply_counters(db, rows)
+        events = self._sale_events(db, rows)
+        mark_dirty(db, "sales")
+        after_commit(db, partial(sale_events.publish_sales, events))
+
+    @staticmethod
+    def _insert_statement(db):
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(models.Sale.__table__).on_conflict_do_nothing(index_elements=["buffer_id"])
+        if dialect == "sqlite":
+            return sqlite.insert(models.Sale.__table__).on_conflict_do_nothing(index_elements=["buffer_id"])
+        # Elsewhere a duplicate raises IntegrityError and is rejected by the row-by-row retry
+        return insert(models.Sale.__table__)
+
+    @staticmethod
+    def _apply_counters(db, rows: List[dict]):
+        # One counter update per product in the batch, not per sale.
+        per_product = {}
+        for row in rows:
+            units, revenue, sold_at = per_product.get(row["product_id"], (0, Decimal("0"), row["date"]))
+            per_product[row["product_id"]] = (units + row["quantity"], revenue + row["total_price"], max(sold_at, row["date"]))
+        for product_id in sorted(per_product): # Stable lock order across concurrent flushes
+            units, revenue, sold_at = per_product[product_id]
+            crud.increment_product_sales_counters(db, product_id, units, revenue, sold_at)
+
+    @staticmethod
+    def _sale_events(db, rows: List[dict]) -> List[dict]:
+        # Dashboard stream events for the batch; skipped entirely when nobody is listening.
+        if not sale_events.has_subscribers:
+            return []
+        product_ids = {row["product_id"] for row in rows}
+        categories = dict(db.execute(
+            select(models.Product.id, models.Product.category_id).where(models.Product.id.in_(product_ids))
+        ).all())
+        return [{**row, "category_id": categories.get(row["product_id"])} for row in rows]
+
+    @staticmethod
+    def _to_row(entry: dict) -> dict:
+        return {
+            "product_id": entry["product_id"],
+            "quantity": entry["quantity"],
+            "total_price": entry["total_price"],
+            "date": entry["accepted_at"],
+            "buffer_id": entry["buffer_id"],
+        }
+
+    def _write_rejected(self, rejected: List[dict]):
+        logging.error(f"Sale buffer: {len(rejected)} sale(s) rejected by the database, see {self.rejected_path}")
+        with open(self.rejected_path, "a", encoding="utf-8") as f:
+            for entry in rejected:
+                f.write(json.dumps(entry) + "\n")
+
+    # --- Metrics ---
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = len(self._pending)
+            oldest = self._pending[0][0]["accepted_at"] if depth else None
+            segments = len(self._segments) + (self._active is not None)
+        lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        return {
+            "enabled": self.enabled,
+            "running": self._thread is not None,
+            "depth": depth,
+            "flush_lag_seconds": lag,
+            "accepted_total": self.accepted_total,
+            "flushed_total": self.flushed_total,
+            "rejected_total": self.rejected_total,
+            "replayed_total": self.replayed_total,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_at": self.last_flush_at,
+            "last_flush_seconds": self.last_flush_seconds,
+            "last_error": self.last_error,
+            "wal_path": str(self.wal_path),
+            "segments": segments,
+        }
+
+sale_buffer = SaleBuffer(
+    wal_path=Path(os.getenv("SALES_BUFFER_WAL_PATH", Path(__file__).parent / "sales_buffer.wal")),
+    batch_size=int(os.getenv("SALES_BUFFER_BATCH_SIZE", "500")),
+    flush_interval=int(os.getenv("SALES_BUFFER_FLUSH_INTERVAL_MS", "200")) / 1000,
+    enabled=env_flag("SALES_BUFFER_ENABLED"),
+)
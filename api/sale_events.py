@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+from .sale_watermark import SaleWatermark
+
+class Subscription:
+    """One connected `GET /dashboard/stream` client: a bounded queue on the server's event loop."""
+
+    def __init__(self, loop, category_id: Optional[int], max_queue: int):
+        self.loop = loop
+        self.category_id = category_id
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def offer(self, event: Optional[dict]):
+        # Runs on the event loop. A client that can't keep up gets a single `resync`
+        # event instead of an unbounded backlog, and should reload the snapshot.
+        if event is None:
+            # Closing: the sentinel must get in even when the queue is full
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+            return
+        self.dropped += 1
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait({"type": "resync", "data": {"reason": "client too slow, events dropped"}})
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Next event, `{"type": "heartbeat"}` after `timeout` seconds without one, or None once closed."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return {"type": "heartbeat"}
+
+class SaleEventBroadcaster:
+    """
+    Fans committed sales out to the dashboard streams connected to this process.
+
+    Writers (`crud.create_sale` in the threadpool, the sale buffer flusher thread)
+    call `publish_sales` after their commit; each event carries the sale and the KPI
+    delta it causes, so clients update a snapshot without querying the database.
+    Sales committed by another worker are read once per cache bus report (an id seek
+    past a `SaleWatermark`, see `on_invalidate`) and fanned out the same way. While
+    streams are open, every sale goes through the watermark, so none is sent twice.
+    """
+
+    def __init__(self, max_queue: int = 256, heartbeat_interval: float = 15.0):
+        self.max_queue = max_queue
+        self.heartbeat_interval = heartbeat_interval
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self.watermark = SaleWatermark()
+        self._following = False # The watermark is set: some stream's snapshot is its start
+        self.published_total = 0
+        self.fetched_total = 0
+        self.last_error = None
+
+    def subscribe(self, category_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), category_id, self.max_queue)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            if not self._subscriptions:
+                self._following = False
+
+    def follow_from(self, last_sale_id: int):
+        """
+        Starts following the `sales` table after a stream's snapshot (highest sale id it
+        counted), unless already following: streams subscribe before their snapshot,
+        so later streams miss nothing from the current position.
+        """
+        with self._lock:
+            if not self._following:
+                self.watermark.reset()
+                self.watermark.value = last_sale_id
+                self._following = True
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscriptions)
+
+    def publish_sales(self, sales: List[dict]):
+        """
+        Publishes sales that have just been committed. Safe to call from any thread.
+
+        Each sale is a dict with `id`, `product_id`, `category_id`, `quantity`,
+        `total_price` and `date`. Sales already sent (read from the table first) are skipped.
+        """
+        if not sales:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            if self._following:
+                sales = [sale for sale in sales if sale["id"] is None or self.watermark.accept(sale["id"])]
+        self.published_total += len(sales)
+        if not subscriptions:
+            return
+
+        events = [self._sale_event(sale) for sale in sales]
+        for subscription in subscriptions:
+            for event in events:
+                if subscription.category_id is not None and subscription.category_id != event["data"]["sale"]["category_id"]:
+                    continue
+                self._deliver(subscription, event)
+
+    def on_invalidate(self, session_factory, tags):
+        # Cache bus listener: sales committed by another worker, read once for every stream
+        if "sales" not in tags or not self._following:
+            return
+        from sqlalchemy import select
+        from . import crud, models
+
+        with self._fetch_lock:
+            with self._lock:
+                position = self.watermark.copy()
+            db = session_factory()
+            try:
+                for rows in crud._sales_after_watermark(db, position, lambda sale: (
+                    select(sale.id, sale.product_id, models.Product.category_id, sale.quantity, sale.total_price, sale.date)
+                    .join(models.Product, models.Product.id == sale.product_id)
+                )):
+                    self.fetched_total += len(rows)
+                    self.publish_sales([row._asdict() for row in rows])
+            except Exception as e:
+                self.last_error = str(e)
+                logging.error(f"Sale events: reading sales of other workers failed, resyncing the streams: {e}")
+                with self._lock:
+                    subscriptions = list(self._subscriptions)
+                    self._following = False
+                for subscription in subscriptions:
+                    self._deliver(subscription, {"type": "resync", "data": {"reason": "sales written by another worker"}})
+            finally:
+                db.close()
+
+    def close(self):
+        """Ends every open stream (on shutdown)."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            self._deliver(subscription, None)
+
+    def _deliver(self, subscription: Subscription, event: Optional[dict]):
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+        except RuntimeError: # Event loop already closed
+            self.unsubscribe(subscription)
+
+    @staticmethod
+    def _sale_event(sale: dict) -> dict:
+        total_price = float(sale["total_price"]) if isinstance(sale["total_price"], Decimal) else sale["total_price"]
+        sold_at = sale.get("date") or datetime.now(timezone.utc)
+        return {
+            "type": "sale",
+            "id": sale["id"],
+            "data": {
+                "sale": {
+                    "id": sale["id"],
+                    "product_id": sale["product_id"],
+                    "category_id": sale["category_id"],
+                    "quantity": sale["quantity"],
+                    "total_price": total_price,
+                    "date": sold_at.isoformat(),
+                },
+                "delta": {
+                    "total_sales_value": total_price,
+                    "total_items_sold": sale["quantity"],
+                    "sales_count": 1,
+                },
+            },
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return {
+            "subscribers": len(subscriptions),
+            "published_total": self.published_total,
+            "fetched_total": self.fetched_total,
+            "watermark": self.watermark.value if self._following else None,
+            "dropped_total": sum(subscription.dropped for subscription in subscriptions),
+            "heartbeat_interval": self.heartbeat_interval,
+            "last_error": self.last_error,
+        }
+
+sale_events = SaleEventBroadcaster(
+    max_queue=int(os.getenv("DASHBOARD_STREAM_QUEUE_SIZE", "256")),
+    heartbeat_interval=float(os.getenv("DASHBOARD_STREAM_HEARTBEAT_SECONDS", "15")),
+)
@@ -0,0 +1,206 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .sale_watermark import SaleWatermark
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative error guarantee (DDSketch-style).
+
+    Values fall into logarithmic buckets `gamma**(k-1) < value <= gamma**k`, with
+    `gamma = (1 + alpha) / (1 - alpha)`; a quantile is answered with the midpoint of
+    its bucket, so it is within `alpha` (relative) of the exact value of that rank.
+    Merging adds bucket counts, which keeps the same bound. The bucket count grows
+    with log(max / min) only: about 700 buckets span 1 cent to 10 million at 1%.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged.")
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The value of rank `floor(q * (count - 1))` in sorted order (within `relative_accuracy`), None when empty."""
+        if self.count == 0:
+            return None
+        rank = math.floor(q * (self.count - 1))
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {"zero_count": self.zero_count, "buckets": {str(key): count for key, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: dict, relative_accuracy: float) -> "QuantileSketch":
+        sketch = cls(relative_accuracy)
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(key): count for key, count in data["buckets"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+def sketch_month(sold_at: datetime) -> str:
+    """The UTC month ("YYYY-MM") a sale is counted in."""
+    if sold_at.tzinfo is not None:
+        sold_at = sold_at.astimezone(timezone.utc)
+    return f"{sold_at.year:04d}-{sold_at.month:02d}"
+
+class SaleValueSketches:
+    """
+    Sale value (`total_price`) quantile sketches per (category, month), for the dashboard.
+
+    The sketches follow the `sales` table through a `SaleWatermark`: `crud.sync_sale_sketches`
+    feeds them the sales committed since the last sync (by any worker), so they never need
+    a full scan after the first one. The category is the product's
+    category when the sale was first seen. The state is saved to a JSON snapshot so a
+    restart only catches up on the sales recorded since.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, snapshot_path: Optional[Path] = None,
+                 snapshot_interval: float = 60.0, gap_timeout: float = 300.0, max_gaps: int = 1000):
+        self.relative_accuracy = relative_accuracy
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.sync_lock = threading.Lock() # Held by crud.sync_sale_sketches around read + add
+        self._lock = threading.Lock()
+        self._sketches: Dict[Tuple[int, str], QuantileSketch] = {}
+        self.watermark = SaleWatermark(gap_timeout=gap_timeout, max_gaps=max_gaps)
+        self.synced_total = 0
+        self._last_snapshot = time.monotonic()
+        self.needs_check = False # Set by load_snapshot until crud checks it against the database
+
+    def reset(self):
+        with self._lock:
+            self._sketches = {}
+            self.watermark.reset()
+        self.needs_check = False
+
+    def add_sales(self, rows: Iterable[Tuple[int, float, datetime, int]]):
+        """Adds `(id, total_price, date, category_id)` rows ordered by id; already counted ids are ignored."""
+        with self._lock:
+            for sale_id, total_price, sold_at, category_id in rows:
+                if not self.watermark.accept(sale_id):
+                    continue
+                key = (category_id, sketch_month(sold_at))
+                sketch = self._sketches.get(key)
+                if sketch is None:
+                    sketch = self._sketches[key] = QuantileSketch(self.relative_accuracy)
+                sketch.add(float(total_price))
+                self.synced_total += 1
+
+    def merged(self, category_id: Optional[int] = None, month: Optional[str] = None) -> QuantileSketch:
+        merged = QuantileSketch(self.relative_accuracy)
+        with self._lock:
+            for (sketch_category_id, sketch_month_key), sketch in self._sketches.items():
+                if category_id is not None and sketch_category_id != category_id:
+                    continue
+                if month is not None and sketch_month_key != month:
+                    continue
+                merged.merge(sketch)
+        return merged
+
+    def quantiles(self, category_id: Optional[int] = None, month: Optional[str] = None, qs=(0.5, 0.9, 0.99)) -> Dict[float, Optional[float]]:
+        sketch = self.merged(category_id, month)
+        return {q: sketch.quantile(q) for q in qs}
+
+    # --- Snapshot ---
+
+    def load_snapshot(self):
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return
+        try:
+            data = json.loads(self.snapshot_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logging.error(f"Sale sketches: ignoring unreadable snapshot {self.snapshot_path}: {e}")
+            return
+        if data.get("relative_accuracy") != self.relative_accuracy:
+            logging.warning("Sale sketches: snapshot has a different relative accuracy, rebuilding from the database.")
+            return
+        with self._lock:
+            self.watermark.load(data)
+            self._sketches = {
+                (int(category_id), month): QuantileSketch.from_dict(sketch, self.relative_accuracy)
+                for category_id, months in data["sketches"].items()
+                for month, sketch in months.items()
+            }
+        self.needs_check = True
+
+    def save_snapshot(self):
+        if self.snapshot_path is None:
+            return
+        with self._lock:
+            sketches = {}
+            for (category_id, month), sketch in self._sketches.items():
+                sketches.setdefault(str(category_id), {})[month] = sketch.to_dict()
+            data = {
+                "relative_accuracy": self.relative_accuracy,
+                **self.watermark.to_dict(),
+                "saved_at": datetime.now(timezone.utc).isoformat(),
+                "sketches": sketches,
+            }
+            self._last_snapshot = time.monotonic()
+        # Written to a temporary file and renamed, so a crash never leaves half a snapshot.
+        # The name is per process and thread: workers sharing the path never write the same file.
+        tmp_path = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logging.error(f"Sale sketches: could not write snapshot {self.snapshot_path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+
+    def maybe_save_snapshot(self):
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.save_snapshot()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "relative_accuracy": self.relative_accuracy,
+                "sketches": len(self._sketches),
+                "buckets": sum(len(sketch.buckets) for sketch in self._sketches.values()),
+                "sales": sum(sketch.count for sketch in self._sketches.values()),
+                "watermark": self.watermark.value,
+                "pending_gaps": len(self.watermark),
+                "synced_total": self.synced_total,
+                "snapshot_path": str(self.snapshot_path) if self.snapshot_path else None,
+            }
+
+_snapshot_path = os.getenv("SALE_SKETCHES_SNAPSHOT_PATH", str(Path(__file__).parent / "sale_sketches.json"))
+
+sale_sketches = SaleValueSketches(
+    relative_accuracy=float(os.getenv("SALE_SKETCHES_RELATIVE_ACCURACY", "0.01")),
+    snapshot_path=Path(_snapshot_path) if _snapshot_path else None,
+    snapshot_interval=float(os.getenv("SALE_SKETCHES_SNAPSHOT_INTERVAL_SECONDS", "60")),
+)
@@ -0,0 +1,63 @@
+import time
+from typing import Dict, List
+
+class SaleWatermark:
+    """
+    How far an in-process follower of the `sales` table (the sale value sketches, the
+    columnar store) has read: the highest sale id consumed, plus the lower ids it
+    skipped. Ids are allocated when a sale is inserted but become visible when its
+    transaction commits, so a skipped id may still show up; skipped ids are re-read for
+    `gap_timeout` seconds (ids of rolled back inserts never do).
+    """
+
+    def __init__(self, gap_timeout: float = 300.0, max_gaps: int = 1000):
+        self.gap_timeout = gap_timeout
+        self.max_gaps = max_gaps
+        self.value = 0
+        self._gaps: Dict[int, float] = {}
+
+    def pending_gaps(self) -> List[int]:
+        """Skipped ids still worth re-reading (expired ones are dropped)."""
+        now = time.monotonic()
+        for sale_id in [sale_id for sale_id, seen in self._gaps.items() if now - seen > self.gap_timeout]:
+            del self._gaps[sale_id]
+        return sorted(self._gaps)
+
+    def can_track(self, sale_id: int) -> bool:
+        """Whether consuming `sale_id` next would keep every skipped id below it for re-reading."""
+        return sale_id <= self.value or sale_id - self.value - 1 + len(self._gaps) <= self.max_gaps
+
+    def accept(self, sale_id: int) -> bool:
+        """Consumes `sale_id` (read in id order); False if it was already consumed."""
+        if sale_id <= self.value:
+            return self._gaps.pop(sale_id, None) is not None
+        # Ids between the watermark and this one were not visible yet (or rolled back).
+        # Read in id order from the table, more than max_gaps of them are given up.
+        if self.can_track(sale_id):
+            now = time.monotonic()
+            for missing in range(self.value + 1, sale_id):
+                self._gaps[missing] = now
+        self.value = sale_id
+        return True
+
+    def copy(self) -> "SaleWatermark":
+        """A copy to read the table from while this one keeps consuming (expired gaps dropped)."""
+        copied = SaleWatermark(gap_timeout=self.gap_timeout, max_gaps=self.max_gaps)
+        copied.value = self.value
+        copied._gaps = {sale_id: self._gaps[sale_id] for sale_id in self.pending_gaps()}
+        return copied
+
+    def reset(self):
+        self.value = 0
+        self._gaps = {}
+
+    def to_dict(self) -> dict:
+        return {"watermark": self.value, "gaps": sorted(self._gaps)}
+
+    def load(self, data: dict):
+        now = time.monotonic()
+        self.value = data["watermark"]
+        self._gaps = {sale_id: now for sale_id in data.get("gaps", [])}
+
+    def __len__(self):
+        return len(self._gaps)
@@ -0,0 +1,251 @@
+import logging
+import os
+import threading
+from datetime import date, datetime, timezone
+from typing import Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency, only needed with ANALYTICS_ENGINE=numpy
+    np = None
+
+from .sale_watermark import SaleWatermark
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def epoch_day(day) -> int:
+    """Days since 1970-01-01 of a date, or of the UTC date of a datetime (naive ones are taken as UTC)."""
+    if isinstance(day, datetime):
+        if day.tzinfo is not None:
+            day = day.astimezone(timezone.utc)
+        day = day.date()
+    return day.toordinal() - _EPOCH_ORDINAL
+
+def month_label(month_index: int) -> str:
+    """"YYYY-MM" of a month counted from 1970-01."""
+    return f"{1970 + month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+class SalesColumnStore:
+    """
+    Every sale (live and archived) as NumPy column arrays, for vectorized dashboard KPIs.
+
+    One array per column: id, product_id, quantity, total_price in cents, UTC day and
+    month since 1970, and the product's category, about 30 bytes per sale. Filters
+    are boolean masks and monthly groups a `bincount`, so a KPI over millions of
+    sales costs a few passes over contiguous memory instead of a query.
+
+    The arrays follow the `sales` table through a `SaleWatermark` like the sale value
+    sketches: `crud.sync_sales_columns` appends the sales committed since the last
+    sync (by any worker), and `create_sale` appends its own sale right away. The
+    category column is recomputed when the product -> category mapping changes.
+    Capacity doubles as sales are appended; readers work on views of the filled part,
+    so an append or a recompute never changes an answer being computed.
+    """
+
+    def __init__(self, enabled: bool = False, initial_capacity: int = 1 << 16, gap_timeout: float = 300.0, max_gaps: int = 1000):
+        self.enabled = enabled
+        self.sync_lock = threading.Lock() # Held around read + append (see crud.sync_sales_columns)
+        self._lock = threading.Lock()
+        self._initial_capacity = initial_capacity
+        self.watermark = SaleWatermark(gap_timeout=gap_timeout, max_gaps=max_gaps)
+        self.size = 0
+        self.unknown_products = False # A sale referenced a product missing from the mapping
+        self.behind = False # An append was refused: sales below it were never read
+        self.synced_total = 0
+        self.last_error = None
+        self._product_categories = None
+        self._products = 0
+        if enabled:
+            self._allocate(initial_capacity)
+
+    def _allocate(self, capacity: int):
+        self._ids = np.zeros(capacity, dtype=np.int32)
+        self._product_ids = np.zeros(capacity, dtype=np.int32)
+        self._quantities = np.zeros(capacity, dtype=np.int32)
+        self._cents = np.zeros(capacity, dtype=np.int64)
+        self._days = np.zeros(capacity, dtype=np.int32)
+        self._months = np.zeros(capacity, dtype=np.int16)
+        self._category_ids = np.zeros(capacity, dtype=np.int32)
+        self._product_categories = np.full(0, -1, dtype=np.int32)
+
+    def reset(self):
+        with self._lock:
+            self._allocate(self._initial_capacity)
+            self.size = 0
+            self._products = 0
+            self.watermark.reset()
+            self.unknown_products = False
+            self.behind = False
+
+    # --- Writing ---
+
+    def _grow(self, needed: int):
+        # The caller holds the lock.
+        capacity = len(self._ids)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("_ids", "_product_ids", "_quantities", "_cents", "_days", "_months", "_category_ids"):
+            old = getattr(self, name)
+            grown = np.zeros(capacity, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, name, grown)
+
+    def _categories_of(self, product_ids):
+        # The caller holds the lock. -1 for products the mapping doesn't know (yet).
+        mapping = self._product_categories
+        known = product_ids < len(mapping)
+        categories = np.full(len(product_ids), -1, dtype=np.int32)
+        categories[known] = mapping[product_ids[known]]
+        return categories
+
+    def append_columns(self, ids, product_ids, quantities, cents, days):
+        """Appends sales given as arrays (ids not checked against the watermark, see `append`)."""
+        count = len(ids)
+        if count == 0:
+            return
+        days = np.asarray(days, dtype=np.int32)
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int16)
+        with self._lock:
+            self._grow(self.size + count)
+            end = self.size + count
+            self._ids[self.size:end] = ids
+            self._product_ids[self.size:end] = product_ids
+            self._quantities[self.size:end] = quantities
+            self._cents[self.size:end] = cents
+            self._days[self.size:end] = days
+            self._months[self.size:end] = months
+            categories = self._categories_of(self._product_ids[self.size:end])
+            self._category_ids[self.size:end] = categories
+            if (categories < 0).any():
+                self.unknown_products = True
+            self.size = end
+            self.synced_total += count
+
+    def append(self, rows: Iterable[Tuple[int, int, int, object, datetime]]):
+        """
+        Appends `(id, product_id, quantity, total_price, date)` rows ordered by id; sales
+        already in the arrays are ignored. The caller holds `sync_lock`.
+        """
+        fresh = [row for row in rows if self.watermark.accept(row[0])]
+        if not fresh:
+            return
+        ids, product_ids, quantities, prices, dates = zip(*fresh)
+        self.append_columns(
+            np.array(ids, dtype=np.int32),
+            np.array(product_ids, dtype=np.int32),
+            np.array(quantities, dtype=np.int32),
+            np.array([round(price * 100) for price in prices], dtype=np.int64),
+            np.array([epoch_day(sold_at) for sold_at in dates], dtype=np.int32),
+        )
+
+    def try_append(self, rows):
+        """
+        `append` unless a sync is running (it reads these sales anyway); never blocks a write.
+        Sales the watermark can't reach without skipping unread ids (never loaded, or
+        too many sales by other workers in between) are refused and the store is marked
+        `behind`, so the next read syncs them from the database in id order.
+        """
+        if not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            if self.watermark.value == 0 or not self.watermark.can_track(rows[-1][0]):
+                self.behind = True
+                return
+            self.append(rows)
+        finally:
+            self.sync_lock.release()
+
+    def set_products(self, product_ids, category_ids):
+        """Replaces the product -> category mapping and recomputes the category of every sale."""
+        product_ids = np.asarray(product_ids, dtype=np.int32)
+        mapping = np.full(int(product_ids.max()) + 1 if len(product_ids) else 0, -1, dtype=np.int32)
+        mapping[product_ids] = category_ids
+        with self._lock:
+            self._product_categories = mapping
+            self._products = len(product_ids)
+            # A new array, so readers keep a consistent view of the previous one
+            self._category_ids = self._categories_of(self._product_ids[:len(self._ids)])
+            self.unknown_products = bool((self._category_ids[:self.size] < 0).any())
+
+    # --- Queries ---
+
+    def _select(self, names, category_id: Optional[int], start_day: Optional[int], end_day: Optional[int]):
+        # The filled part of the `names` columns, restricted to the sales matching the filters
+        with self._lock:
+            columns = [getattr(self, name)[:self.size] for name in names]
+            category_ids, days = self._category_ids[:self.size], self._days[:self.size]
+        mask = None
+        if category_id is not None:
+            mask = category_ids == category_id
+        if start_day is not None:
+            mask = days >= start_day if mask is None else mask & (days >= start_day)
+        if end_day is not None:
+            mask = days <= end_day if mask is None else mask & (days <= end_day)
+        if mask is None:
+            return columns
+        selected = np.flatnonzero(mask) # Gathering by index beats boolean indexing for every column
+        return [column[selected] for column in columns]
+
+    def product_count(self, category_id: Optional[int] = None) -> int:
+        with self._lock:
+            if category_id is None:
+                return self._products
+            return int(np.count_nonzero(self._product_categories == category_id))
+
+    def summary(self, category_id: Optional[int] = None, start_day: Optional[int] = None, end_day: Optional[int] = None) -> dict:
+        """Sales count, units, value in cents and highest sale id of the sales matching the filters."""
+        ids, quantities, cents = self._select(("_ids", "_quantities", "_cents"), category_id, start_day, end_day)
+        return {
+            "sales_count": len(ids),
+            "quantity": int(quantities.sum(dtype=np.int64)),
+            "cents": int(cents.sum()),
+            "last_sale_id": int(ids.max()) if len(ids) else None,
+        }
+
+    def monthly(self, category_id: Optional[int] = None, start_day: Optional[int] = None, end_day: Optional[int] = None) -> List[dict]:
+        """Sales count, units and value in cents per UTC month ("YYYY-MM"), oldest first, months without sales omitted."""
+        months, quantities, cents = self._select(("_months", "_quantities", "_cents"), category_id, start_day, end_day)
+        if len(months) == 0:
+            return []
+        first = int(months.min())
+        offsets = (months - first).astype(np.intp) # bincount would convert it on every call
+        counts = np.bincount(offsets)
+        # Float64 weights add integers exactly up to 2**53 cents per month
+        units = np.bincount(offsets, weights=quantities)
+        values = np.bincount(offsets, weights=cents)
+        return [
+            {"month": month_label(first + offset), "sales_count": int(counts[offset]), "quantity": int(units[offset]), "cents": int(values[offset])}
+            for offset in np.flatnonzero(counts)
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            if not self.enabled:
+                return {"enabled": False, "last_error": self.last_error}
+            columns = (self._ids, self._product_ids, self._quantities, self._cents, self._days, self._months, self._category_ids)
+            return {
+                "enabled": True,
+                "sales": self.size,
+                "capacity": len(self._ids),
+                "bytes": sum(column.nbytes for column in columns) + self._product_categories.nbytes,
+                "bytes_per_sale": sum(column.itemsize for column in columns),
+                "products": self._products,
+                "watermark": self.watermark.value,
+                "pending_gaps": len(self.watermark),
+                "synced_total": self.synced_total,
+                "behind": self.behind,
+                "last_error": self.last_error,
+            }
+
+def _engine_enabled() -> bool:
+    engine = os.getenv("ANALYTICS_ENGINE", "sql").strip().lower()
+    if engine != "numpy":
+        return False
+    if np is None:
+        logging.error("ANALYTICS_ENGINE=numpy but NumPy is not installed; using SQL for the dashboard KPIs.")
+        return False
+    return True
+
+sales_columns = SalesColumnStore(enabled=_engine_enabled())
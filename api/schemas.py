@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -34,6 +34,16 @@ class CategoriesListResponse(BaseModel):
     categories: List[Category] # Uses the full Category schema
     total: int
 
+# Category with totals over its products (GET /categories?with_stats=true)
+class CategoryWithStats(Category):
+    product_count: int
+    units_sold: int # From the products' sales counters
+    revenue: float
+
+class CategoriesWithStatsListResponse(BaseModel):
+    categories: List[CategoryWithStats]
+    total: int
+
 
 # ========= Product Schemas =========
 class ProductBaseApiInput(BaseModel):
@@ -61,6 +71,9 @@ class ProductCreateInternal(ProductBaseDb):
 class Product(ProductBaseDb):
     id: int
     category: CategoryNested # CHANGED: Use CategoryNested here
+    units_sold: int = 0 # Denormalized sales counters
+    revenue: float = 0.0
+    last_sold_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -70,6 +83,43 @@ class ProductListResponse(BaseModel):
     products: List[Product] # Will now use Product schema with CategoryNested
     totalProducts: int
 
+# Schemas for fetching many products by ID (GET/POST /products/batch)
+class ProductSuggestion(BaseModel):
+    # Autocomplete match, served from the in-process prefix index
+    id: int
+    name: str
+    brand: Optional[str] = None
+    category_id: int
+
+class ProductBatchRequest(BaseModel):
+    ids: List[int]
+
+class ProductBatchResponse(BaseModel):
+    products: List[Product] # In request order, duplicates removed
+    missing_ids: List[int]
+
+MAX_INT4 = 2**31 - 1 # products.id and category_id are INTEGER columns
+
+# Schema for one row of PUT /products/bulk: a full product keyed by its ID. Bounded like
+# the products columns, so a bad row fails alone instead of its whole database batch.
+class ProductUpsertApiInput(ProductCreateApiInput):
+    id: int = Field(gt=0, le=MAX_INT4) # Serial ids start at 1
+    name: str = Field(max_length=255)
+    brand: Optional[str] = Field(None, max_length=100)
+    category_id: int = Field(le=MAX_INT4)
+
+class ProductUpsertOutcome(BaseModel):
+    row: int # 1-based position in the request (data rows for CSV)
+    id: Optional[int] = None
+    status: str # "inserted", "updated" or "error"
+    error: Optional[str] = None
+
+class ProductBulkUpsertResponse(BaseModel):
+    inserted: int
+    updated: int
+    failed: int
+    results: List[ProductUpsertOutcome]
+
 
 # ========= Sale Schemas =========
 class SaleBase(BaseModel):
@@ -87,6 +137,12 @@ class Sale(SaleBase):
     class Config:
         from_attributes = True
 
+# Schema returned when a sale is accepted into the write-behind buffer
+class SaleAccepted(SaleBase):
+    buffer_id: str
+    total_price: float
+    accepted_at: datetime
+
 # ========= Combined Schema for Listing Sales with Product Info and Profit =========
 class SaleWithProductInfo(Sale):
     product: Product
@@ -108,7 +164,36 @@ class DashboardSummary(BaseModel):
     total_sales_value: Optional[float] = 0.0 # Overall total
     total_items_sold: Optional[int] = 0    # Overall total
     average_sale_value: Optional[float] = 0.0 # Overall average
+    # Sale value quantiles from the mergeable sketches (within 1% of the exact value); None without sales
+    median_sale_value: Optional[float] = None
+    p90_sale_value: Optional[float] = None
+    p99_sale_value: Optional[float] = None
     sales_by_month: List[MonthlySalesSummary] # Changed from sales_with_info to sales_by_month
 
     class Config:
-        from_attributes = True # For potential future use with ORM objects 
\ No newline at end of file
+        from_attributes = True # For potential future use with ORM objects
+
+# ========= Analytics Schemas =========
+class TopProduct(BaseModel):
+    rank: int # Overall position (ties share a rank)
+    category_rank: int # Position within the product's category
+    product_id: int
+    name: str
+    brand: Optional[str] = None
+    category: CategoryNested
+    units_sold: int
+    revenue: float
+
+class TopCategory(BaseModel):
+    rank: int
+    category_id: int
+    name: str
+    products_sold: int # Distinct products with at least one sale in the window
+    units_sold: int
+    revenue: float
+
+class MonthlySales(BaseModel):
+    month: str # UTC month, "YYYY-MM"
+    sales_count: int
+    units_sold: int
+    revenue: float
@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# --- Configuration ---
+# Run from the repository root against a migrated database, e.g.:
+#   python -m api.scripts.archive_sales --older-than-days 365
+# Moves sales older than the horizon from `sales` to `sales_archive` in batches
+# (one transaction each, see crud.archive_sales) and keeps their totals in
+# sales_monthly_rollup. Safe to interrupt and re-run; schedule it e.g. nightly.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_HORIZON_DAYS = int(os.getenv("SALES_ARCHIVE_HORIZON_DAYS", "365"))
+
+
+def main(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    from api import crud
+    from api.database import SessionLocal
+
+    before = datetime.now(timezone.utc) - timedelta(days=args.older_than_days)
+    print(f"Archiving sales dated before {before.isoformat()} in batches of {args.batch_size}...")
+
+    moved_total = 0
+    batches = 0
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        while args.max_batches is None or batches < args.max_batches:
+            moved = crud.archive_sales(db, before=before, batch_size=args.batch_size)
+            if not moved:
+                break
+            moved_total += moved
+            batches += 1
+            print(f"-> Batch {batches}: {moved} sales archived ({moved_total} total)")
+            if args.pause_ms:
+                time.sleep(args.pause_ms / 1000)
+    except Exception as e:
+        print(f"An error occurred during archival: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"Done: {moved_total} sales archived in {batches} batch(es), {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old sales to the sales_archive table.")
+    parser.add_argument("--database-url", help="Database to archive (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--older-than-days", type=int, default=DEFAULT_HORIZON_DAYS,
+                        help="Archive horizon in days (default: SALES_ARCHIVE_HORIZON_DAYS or 365)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("SALES_ARCHIVE_BATCH_SIZE", "5000")))
+    parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+    parser.add_argument("--pause-ms", type=int, default=0, help="Sleep between batches to spare the primary")
+    main(parser.parse_args())
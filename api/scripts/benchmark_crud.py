@@ -0,0 +1,88 @@
+import os
+import sys
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+# --- Configuration ---
+# Run from the repository root: python -m api.scripts.benchmark_crud
+# Uses the same DATABASE_URL as the API (api/.env), so point it at a seeded database.
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "2000"))
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', '..'))
+
+from api import crud, models # noqa: E402
+from api.database import SessionLocal, statement_cache_stats # noqa: E402
+
+
+# --- Legacy Query-chain implementations (before the compiled-cache rewrite) ---
+def legacy_get_product(db, product_id):
+    return db.query(models.Product).options(joinedload(models.Product.category)).filter(models.Product.id == product_id).first()
+
+def legacy_get_products(db, name):
+    return db.query(models.Product).options(joinedload(models.Product.category)).filter(models.Product.name.ilike(f"%{name}%")).offset(0).limit(100).all()
+
+def legacy_get_sales(db, category_id):
+    return db.query(models.Sale).options(
+        joinedload(models.Sale.product).joinedload(models.Product.category)
+    ).join(models.Product).filter(models.Product.category_id == category_id).offset(0).limit(100).all()
+
+def legacy_get_dashboard_summary(db, category_id):
+    db.query(func.count(models.Product.id)).filter(models.Product.category_id == category_id).scalar()
+    base = db.query(models.Sale).join(models.Product).filter(models.Product.category_id == category_id)
+    base.with_entities(func.coalesce(func.sum(models.Sale.total_price), 0.0)).scalar()
+    base.with_entities(func.coalesce(func.sum(models.Sale.quantity), 0)).scalar()
+    base.with_entities(func.coalesce(func.avg(models.Sale.total_price), 0.0)).scalar()
+
+
+# --- Benchmark ---
+def measure(db, label, fn):
+    fn() # Warm up caches and connection
+    db.expunge_all()
+    statement_cache_stats.reset()
+    start_cpu = time.process_time()
+    start_wall = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+        db.expunge_all() # Keep the identity map from short-circuiting object loading
+    cpu_us = (time.process_time() - start_cpu) / ITERATIONS * 1e6
+    wall_us = (time.perf_counter() - start_wall) / ITERATIONS * 1e6
+    stats = statement_cache_stats.snapshot()
+    print(f"  {label:<32} cpu {cpu_us:9.1f} us/call   wall {wall_us:9.1f} us/call   cache hit rate {stats['hit_rate']:.2%}")
+    return cpu_us
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        product = db.query(models.Product).first()
+        if product is None:
+            print("No products found. Seed the database first (api/scripts/seed_database.py).")
+            sys.exit(1)
+        product_id, category_id = product.id, product.category_id
+        name = product.name[:3]
+
+        cases = [
+            ("get_product",
+             lambda: legacy_get_product(db, product_id),
+             lambda: crud.get_product(db, product_id)),
+            ("get_products(name=...)",
+             lambda: legacy_get_products(db, name),
+             lambda: crud.get_products(db, name=name)),
+            ("get_sales(category_id=...)",
+             lambda: legacy_get_sales(db, category_id),
+             lambda: crud.get_sales(db, category_id=category_id)),
+            ("get_dashboard_summary",
+             lambda: legacy_get_dashboard_summary(db, category_id),
+             lambda: crud.get_dashboard_summary(db, category_id=category_id)),
+        ]
+
+        print(f"Running {ITERATIONS} iterations per case...")
+        for label, legacy_fn, cached_fn in cases:
+            print(f"{label}:")
+            legacy_cpu = measure(db, "legacy Query chain", legacy_fn)
+            cached_cpu = measure(db, "cached select / lambda_stmt", cached_fn)
+            print(f"  -> CPU saved per call: {legacy_cpu - cached_cpu:.1f} us ({(legacy_cpu - cached_cpu) / legacy_cpu:.1%})")
+    finally:
+        db.close()
@@ -0,0 +1,118 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# --- Configuration ---
+# Run from the repository root, e.g.:
+#   python -m api.scripts.benchmark_fieldsets --database-url sqlite:///bench.db --seed --description-bytes 4000
+# Compares the full /products and /sales/ listings with sparse fieldsets (fields=...):
+# latency, response bytes and the bytes of column data read from the database.
+# --seed migrates and fills the database (see load_test.py), then pads every product
+# description to --description-bytes to model a catalog with long descriptions.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+VARIANTS = [
+    ("products, all fields", "/products", {}),
+    ("products, fields=name,price,category", "/products", {"fields": "name,price,category"}),
+    ("sales, all fields", "/sales/", {}),
+    ("sales, fields=quantity,total_price,date,product.name", "/sales/", {"fields": "quantity,total_price,date,product.name"}),
+]
+
+
+def pad_descriptions(description_bytes: int):
+    from sqlalchemy import update
+    from api import models
+    from api.database import engine
+
+    text = ("Long supplier description. " * (description_bytes // 27 + 1))[:description_bytes]
+    with engine.begin() as conn:
+        conn.execute(update(models.Product).values(description=text))
+    print(f"-> Product descriptions padded to {description_bytes} bytes.")
+
+
+def bytes_read(engine, statements):
+    # Re-runs the captured SELECTs and sums the size of every value returned.
+    total = 0
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            for statement, parameters in statements:
+                cursor.execute(statement, parameters)
+                for row in cursor.fetchall():
+                    total += sum(len(str(value).encode()) for value in row if value is not None)
+        finally:
+            cursor.close()
+    return total
+
+
+def measure(client, engine, path, params, iterations):
+    from sqlalchemy import event
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        response = client.get(path, params=params)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    response.raise_for_status()
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        client.get(path, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "median_ms": statistics.median(latencies),
+        "response_bytes": len(response.content),
+        "db_bytes": bytes_read(engine, captured),
+    }
+
+
+def main(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    if args.seed:
+        from api.scripts.load_test import seed_at_scale
+        seed_at_scale(args.categories, args.products, args.sales)
+        pad_descriptions(args.description_bytes)
+
+    from fastapi.testclient import TestClient
+    from api.database import engine
+    from api.main import app
+
+    results = {}
+    with TestClient(app) as client:
+        for label, path, params in VARIANTS:
+            results[label] = measure(client, engine, path, {**params, "limit": args.limit}, args.iterations)
+
+    print(f"\n{'variant':<55}{'median ms':>11}{'response B':>13}{'db B':>13}")
+    for label, result in results.items():
+        print(f"{label:<55}{result['median_ms']:>11.2f}{result['response_bytes']:>13}{result['db_bytes']:>13}")
+    for full, sparse in ((VARIANTS[0][0], VARIANTS[1][0]), (VARIANTS[2][0], VARIANTS[3][0])):
+        a, b = results[full], results[sparse]
+        print(f"{sparse}: response {1 - b['response_bytes'] / a['response_bytes']:.0%} smaller, "
+              f"db reads {1 - b['db_bytes'] / a['db_bytes']:.0%} smaller, "
+              f"median latency {1 - b['median_ms'] / a['median_ms']:.0%} lower")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure what sparse fieldsets save on the list endpoints.")
+    parser.add_argument("--database-url", help="Database to run against (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--seed", action="store_true", help="Migrate, seed synthetic data and pad descriptions first")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--sales", type=int, default=20000)
+    parser.add_argument("--description-bytes", type=int, default=4000)
+    parser.add_argument("--limit", type=int, default=100, help="Page size requested from each endpoint")
+    parser.add_argument("--iterations", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,217 @@
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+# --- Configuration ---
+# Run from the repository root (needs numpy), e.g.:
+#   python -m api.scripts.benchmark_sales_columns                        # against DATABASE_URL
+#   python -m api.scripts.benchmark_sales_columns --seed --sales 1000000
+#   python -m api.scripts.benchmark_sales_columns --synthetic-rows 10000000
+# Against a database: loads the NumPy sales columns (ANALYTICS_ENGINE=numpy), checks the
+# dashboard KPIs and monthly sales of every category, over all dates and over a date
+# window, against the SQL path, and times both. Exits non-zero if any answer differs.
+# With --synthetic-rows: fills a column store with random sales in memory only and
+# reports its load time, memory and query latencies (no database involved).
+# Both modes first check that an append far past the watermark is refused, not skipped to.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+
+def timed(fn, repeat):
+    """Result of fn() and its median wall time in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, statistics.median(timings)
+
+
+def same_number(a, b):
+    # SQLite sums DECIMAL columns as floats; the columns sum exact cents
+    if a is None or b is None:
+        return a == b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=0.005)
+
+
+def same_rows(sql_rows, numpy_rows):
+    if isinstance(sql_rows, dict):
+        sql_rows, numpy_rows = [sql_rows], [numpy_rows]
+    if len(sql_rows) != len(numpy_rows):
+        return False
+    return all(
+        sql_row.keys() == numpy_row.keys()
+        and all(sql_row[key] == numpy_row[key] if isinstance(sql_row[key], str) else same_number(sql_row[key], numpy_row[key]) for key in sql_row)
+        for sql_row, numpy_row in zip(sql_rows, numpy_rows)
+    )
+
+
+def check_database(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    if args.seed:
+        from api.scripts.load_test import seed_at_scale
+        seed_at_scale(args.categories, args.products, args.sales)
+
+    from sqlalchemy import func, select
+    from api import crud, models
+    from api.cache import query_cache
+    from api.database import SessionLocal
+    from api.sales_columns import sales_columns
+
+    sales_columns.enabled = True
+    sales_columns.reset()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        read = crud.sync_sales_columns(db)
+        load_seconds = time.perf_counter() - started
+        stats = sales_columns.stats()
+        print(f"Loaded {read} sales in {load_seconds:.1f}s: {stats['bytes'] / 1024 ** 2:.1f} MiB "
+              f"({stats['bytes_per_sale']} bytes per sale, capacity {stats['capacity']})")
+
+        sale = crud.sales_source(db)
+        first, last = db.execute(select(func.min(sale.date), func.max(sale.date))).one()
+        if first is None:
+            raise SystemExit("No sales to check; seed the database first (--seed).")
+        # A window over the middle half of the sales, to exercise the date masks
+        window = (first + (last - first) / 4).date(), (last - (last - first) / 4).date()
+        category_ids = list(db.execute(select(models.Category.id).order_by(models.Category.id)).scalars())
+        # SQL reports the highest live sale id, the columns the highest of all sales
+        archived = crud.get_sales_archive_bounds(db) is not None
+
+        checks = [("summary", category_id) for category_id in [None, *category_ids]]
+        checks += [("monthly", category_id, dates) for category_id in [None, *category_ids] for dates in ((None, None), window)]
+        failures = 0
+        sql_ms, numpy_ms = [], []
+        for check in checks:
+            if check[0] == "summary":
+                category_id = check[1]
+                sql_fn = lambda: crud._query_dashboard_summary(db, category_id)
+                numpy_fn = lambda: crud._columns_dashboard_summary(db, category_id)
+            else:
+                _, category_id, (start_date, end_date) = check
+                # The SQL path is cached: time the query itself
+                sql_fn = lambda: crud._query_monthly_sales(db, start_date, end_date, category_id)
+                numpy_fn = lambda: crud._columns_monthly_sales(db, start_date, end_date, category_id)
+            sql_rows, sql_time = timed(sql_fn, args.repeat)
+            numpy_rows, numpy_time = timed(numpy_fn, args.repeat)
+            if archived and check[0] == "summary":
+                sql_rows, numpy_rows = ({key: value for key, value in rows.items() if key != "last_sale_id"} for rows in (sql_rows, numpy_rows))
+            sql_ms.append(sql_time)
+            numpy_ms.append(numpy_time)
+            if not same_rows(sql_rows, numpy_rows):
+                print(f"FAIL  {check}:\n        sql:   {sql_rows}\n        numpy: {numpy_rows}")
+                failures += 1
+        query_cache.clear()
+    finally:
+        db.close()
+
+    print(f"{len(checks)} checks ({len(category_ids)} categories, window {window[0]} .. {window[1]})")
+    print(f"  median latency  sql: {statistics.median(sql_ms):8.2f} ms   numpy: {statistics.median(numpy_ms):8.3f} ms")
+    print(f"  max latency     sql: {max(sql_ms):8.2f} ms   numpy: {max(numpy_ms):8.3f} ms")
+    if failures:
+        raise SystemExit(f"{failures} check(s) differ from the SQL path.")
+    print("All column store answers match the SQL path.")
+
+
+def benchmark_synthetic(args):
+    import numpy as np
+    from api.sales_columns import SalesColumnStore
+
+    rows = args.synthetic_rows
+    rng = np.random.default_rng(42)
+    store = SalesColumnStore(enabled=True)
+    started = time.perf_counter()
+    chunk = 1_000_000
+    for start in range(0, rows, chunk):
+        count = min(chunk, rows - start)
+        store.append_columns(
+            np.arange(start + 1, start + count + 1, dtype=np.int32),
+            rng.integers(1, args.products + 1, count, dtype=np.int32),
+            rng.integers(1, 11, count, dtype=np.int32),
+            rng.integers(100, 5_000_000, count, dtype=np.int64),
+            # Three years from 2022; ids grow with the date, as they do when sales are recorded
+            (19_000 + np.arange(start, start + count) * (3 * 365) // rows).astype(np.int32),
+        )
+    append_seconds = time.perf_counter() - started
+    product_ids = np.arange(1, args.products + 1)
+    started = time.perf_counter()
+    store.set_products(product_ids, rng.integers(1, args.categories + 1, args.products))
+    categories_seconds = time.perf_counter() - started
+
+    stats = store.stats()
+    print(f"{rows} synthetic sales: appended in {append_seconds:.2f}s, categories set in {categories_seconds * 1000:.0f} ms")
+    print(f"  memory: {stats['bytes'] / 1024 ** 2:.1f} MiB for capacity {stats['capacity']} "
+          f"({stats['bytes_per_sale']} bytes per sale, {rows * stats['bytes_per_sale'] / 1024 ** 2:.1f} MiB filled)")
+
+    window = (19_000 + 365, 19_000 + 2 * 365 - 1)
+    queries = [
+        ("summary, all sales", lambda: store.summary()),
+        ("summary, one category", lambda: store.summary(1)),
+        ("summary, one year", lambda: store.summary(None, *window)),
+        ("summary, category + year", lambda: store.summary(1, *window)),
+        ("monthly, all sales", lambda: store.monthly()),
+        ("monthly, one category", lambda: store.monthly(1)),
+        ("monthly, category + year", lambda: store.monthly(1, *window)),
+        ("product count, one category", lambda: store.product_count(1)),
+    ]
+    for label, fn in queries:
+        _, median_ms = timed(fn, args.repeat)
+        print(f"  {label:<30} {median_ms:9.2f} ms")
+
+    # Cross-check the masked reductions against a differently computed answer
+    summary = store.summary(1, *window)
+    monthly = store.monthly(1, *window)
+    if summary["cents"] != sum(month["cents"] for month in monthly) or summary["sales_count"] != sum(month["sales_count"] for month in monthly):
+        raise SystemExit("FAIL  monthly totals don't add up to the summary.")
+    print("Monthly totals add up to the summary.")
+
+
+def check_gap_append():
+    """A sale more than max_gaps ids past the watermark is left to a sync instead of appended."""
+    from datetime import datetime
+    from api.sales_columns import SalesColumnStore
+
+    store = SalesColumnStore(enabled=True, max_gaps=10)
+    sold_at = datetime(2024, 1, 1)
+    store.append([(sale_id, 1, 1, 1, sold_at) for sale_id in range(1, 11)])
+    # Another worker committed sales 11..1510, this one commits 1511
+    store.try_append([(1511, 1, 1, 1, sold_at)])
+    if store.size != 10 or store.watermark.value != 10 or not store.behind:
+        raise SystemExit(f"FAIL  append past a large gap: {store.size} sales, watermark {store.watermark.value}, behind {store.behind}")
+    # The sync reads the skipped sales in id order, after which appends resume
+    store.append([(sale_id, 1, 1, 1, sold_at) for sale_id in range(11, 1512)])
+    store.behind = False
+    store.try_append([(1513, 1, 1, 1, sold_at)])
+    if store.size != 1512 or store.watermark.pending_gaps() != [1512] or store.behind:
+        raise SystemExit(f"FAIL  append after a small gap: {store.size} sales, gaps {store.watermark.pending_gaps()}")
+    print("An append past a large gap is refused and left to the sync.")
+
+
+def main(args):
+    try:
+        import numpy # noqa: F401
+    except ImportError:
+        raise SystemExit("This benchmark needs numpy: pip install numpy")
+    check_gap_append()
+    if args.synthetic_rows:
+        benchmark_synthetic(args)
+    else:
+        check_database(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the NumPy sales columns against SQL and measure their latency and memory.")
+    parser.add_argument("--database-url", help="Database to check (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--seed", action="store_true", help="Migrate and seed synthetic data first (see load_test.py)")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--synthetic-rows", type=int, default=0, help="Benchmark an in-memory store of this many random sales instead")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query; the median is reported")
+    main(parser.parse_args())
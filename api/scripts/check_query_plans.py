@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+# --- Configuration ---
+# Run from the repository root against a migrated database, e.g.:
+#   python -m api.scripts.check_query_plans --seed --products 50000 --sales 500000
+# Each check runs a crud function, captures the SELECTs it issues, EXPLAINs them
+# and asserts that the index added for that query shows up in the plan.
+# Exits non-zero if any check fails, so it can gate a migration change in CI.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+
+# --- Checks ---
+# (label, crud call, indexes that must all appear in the plans of the captured statements;
+# a tuple stands for any one of its indexes)
+CATEGORY_INDEXES = ("idx_products_category_units_sold", "idx_products_category_revenue", "idx_products_category_last_sold_at")
+
+def build_checks(crud, category_id, category_name):
+    today = date.today()
+    yesterday = datetime.combine(today - timedelta(days=1), datetime.min.time())
+    return [
+        ("get_category_by_name", lambda db: crud.get_category_by_name(db, category_name.upper()),
+         ["ux_categories_name_lower"]),
+        ("get_products_count(category_id)", lambda db: crud.get_products_count(db, category_id=category_id),
+         [CATEGORY_INDEXES]),
+        ("get_products(sort=units_sold)", lambda db: crud.get_products(db, limit=20, sort="units_sold"),
+         ["idx_products_units_sold"]),
+        ("get_products(category_id, sort=revenue)", lambda db: crud.get_products(db, limit=20, category_id=category_id, sort="revenue"),
+         ["idx_products_category_revenue"]),
+        ("get_sales(category_id)", lambda db: crud.get_sales(db, limit=100, category_id=category_id),
+         ["idx_sales_product_id_date"]),
+        ("get_dashboard_summary(category_id)", lambda db: crud.get_dashboard_summary(db, category_id=category_id),
+         [CATEGORY_INDEXES, "idx_sales_product_id_date"]),
+        ("get_sales_archive_bounds", lambda db: crud.get_sales_archive_bounds(db),
+         ["idx_sales_archive_date"]),
+        ("get_top_products(last 7 days)", lambda db: crud.get_top_products(db, start_date=today - timedelta(days=7), end_date=today),
+         ["idx_sales_date"]),
+        ("get_all_sales_with_details(since)", lambda db: crud.get_all_sales_with_details(db, since=yesterday),
+         ["idx_sales_date"]),
+    ]
+
+
+def explain(conn, statement, parameters):
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        explain_sql = "EXPLAIN " + statement
+    elif dialect == "sqlite":
+        explain_sql = "EXPLAIN QUERY PLAN " + statement
+    else:
+        raise SystemExit(f"Plan checks are not implemented for the {dialect} dialect.")
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(explain_sql, parameters)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def run_check(db, engine, call):
+    from sqlalchemy import event
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        call(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    with engine.connect() as conn:
+        return [explain(conn, statement, parameters) for statement, parameters in captured]
+
+
+def main(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    if args.seed:
+        from api.scripts.load_test import seed_at_scale
+        seed_at_scale(args.categories, args.products, args.sales)
+
+    from sqlalchemy import func, select, text
+    from api import crud, models
+    from api.cache import query_cache
+    from api.database import SessionLocal, engine
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    db = SessionLocal()
+    try:
+        product_count = db.execute(select(func.count(models.Product.id))).scalar()
+        sale_count = db.execute(select(func.count(models.Sale.id))).scalar()
+        # The busiest category is the least selective filter: the worst case for each plan.
+        category_id, category_name = db.execute(
+            select(models.Category.id, models.Category.name)
+            .join(models.Product)
+            .group_by(models.Category.id, models.Category.name)
+            .order_by(func.count(models.Product.id).desc())
+            .limit(1)
+        ).one()
+        print(f"Checking plans on {engine.dialect.name} with {product_count} products, {sale_count} sales "
+              f"(category {category_id} '{category_name}')")
+
+        failures = 0
+        for label, call, expected_indexes in build_checks(crud, category_id, category_name):
+            query_cache.clear()
+            plans = run_check(db, engine, call)
+            plan_text = "\n".join(plans)
+            missing = [
+                " or ".join(index) if isinstance(index, tuple) else index
+                for index in expected_indexes
+                if not any(name in plan_text for name in (index if isinstance(index, tuple) else (index,)))
+            ]
+            print(f"{'FAIL' if missing else 'ok':<6}{label}")
+            if missing or args.verbose:
+                if missing:
+                    print(f"      missing index: {', '.join(missing)}")
+                for plan in plans:
+                    print("      " + plan.replace("\n", "\n      "))
+            failures += bool(missing)
+    finally:
+        db.close()
+
+    if product_count < 10000 or sale_count < 100000:
+        print("Warning: small dataset, the planner may legitimately prefer sequential scans. Use --seed at scale.")
+    if failures:
+        raise SystemExit(f"{failures} plan check(s) failed.")
+    print("All plan checks passed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assert that the hot crud queries are served by their indexes.")
+    parser.add_argument("--database-url", help="Database to check (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--seed", action="store_true", help="Migrate and seed synthetic data first (see load_test.py)")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--sales", type=int, default=500000)
+    parser.add_argument("--verbose", action="store_true", help="Print every plan, not only the failing ones")
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+import argparse
+import math
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+# --- Configuration ---
+# Run from the repository root against a migrated database, e.g.:
+#   python -m api.scripts.check_sale_sketches --seed --products 20000 --sales 200000
+# Builds the sale value sketches behind /dashboard from the database, computes the
+# exact quantiles of the same sales and asserts that every sketch answer is within
+# the documented relative accuracy, overall, per category and per (category, month).
+# Also checks that a snapshot round-trip answers exactly the same.
+# Exits non-zero if any check fails.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def exact_quantile(sorted_values, q):
+    # Same rank definition as QuantileSketch.quantile
+    return sorted_values[math.floor(q * (len(sorted_values) - 1))]
+
+
+def relative_error(estimate, exact):
+    if exact == 0:
+        return 0.0 if estimate == 0 else math.inf
+    return abs(estimate - exact) / exact
+
+
+def main(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ["SALE_SKETCHES_SNAPSHOT_PATH"] = ""  # Build from the database only
+
+    if args.seed:
+        from api.scripts.load_test import seed_at_scale
+        seed_at_scale(args.categories, args.products, args.sales)
+
+    from sqlalchemy import select
+    from api import crud, models
+    from api.database import SessionLocal
+    from api.sale_sketches import SaleValueSketches, sale_sketches, sketch_month
+
+    db = SessionLocal()
+    try:
+        read = crud.sync_sale_sketches(db)
+        sale = crud.sales_source(db)
+        values = defaultdict(list)
+        for total_price, sold_at, category_id in db.execute(
+            select(sale.total_price, sale.date, models.Product.category_id)
+            .join(models.Product, models.Product.id == sale.product_id)
+        ):
+            value = float(total_price)
+            values[(None, None)].append(value)
+            values[(category_id, None)].append(value)
+            values[(category_id, sketch_month(sold_at))].append(value)
+    finally:
+        db.close()
+
+    alpha = sale_sketches.relative_accuracy
+    print(f"{read} sales sketched, relative accuracy {alpha:.2%}, {sale_sketches.stats()['buckets']} buckets "
+          f"in {sale_sketches.stats()['sketches']} sketches")
+
+    failures = 0
+    worst = 0.0
+    for (category_id, month), group in sorted(values.items(), key=lambda item: (item[0][0] or 0, item[0][1] or "")):
+        group.sort()
+        sketch = sale_sketches.merged(category_id, month)
+        if sketch.count != len(group):
+            print(f"FAIL  category={category_id} month={month}: sketch counts {sketch.count} sales, database has {len(group)}")
+            failures += 1
+            continue
+        for q in QUANTILES:
+            error = relative_error(sketch.quantile(q), exact_quantile(group, q))
+            worst = max(worst, error)
+            # A hair of slack for float rounding at bucket boundaries
+            if error > alpha * (1 + 1e-9):
+                print(f"FAIL  category={category_id} month={month} q={q}: estimate {sketch.quantile(q):.4f}, "
+                      f"exact {exact_quantile(group, q):.4f} ({error:.3%})")
+                failures += 1
+        if category_id is None or (month is None and args.verbose):
+            exact = ", ".join(f"p{q * 100:g}={exact_quantile(group, q):.2f}" for q in QUANTILES)
+            estimated = ", ".join(f"p{q * 100:g}={sketch.quantile(q):.2f}" for q in QUANTILES)
+            print(f"      {'overall' if category_id is None else f'category {category_id}'} ({len(group)} sales)\n"
+                  f"        exact:  {exact}\n        sketch: {estimated}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sale_sketches.snapshot_path = Path(tmp_dir) / "sketches.json"
+        sale_sketches.save_snapshot()
+        restored = SaleValueSketches(relative_accuracy=alpha, snapshot_path=sale_sketches.snapshot_path)
+        restored.load_snapshot()
+        for category_id, month in values:
+            if restored.quantiles(category_id, month, QUANTILES) != sale_sketches.quantiles(category_id, month, QUANTILES):
+                print(f"FAIL  snapshot round-trip differs for category={category_id} month={month}")
+                failures += 1
+        if restored.watermark.to_dict() != sale_sketches.watermark.to_dict():
+            print("FAIL  snapshot round-trip lost the watermark")
+            failures += 1
+
+    print(f"Worst relative error: {worst:.3%} (bound {alpha:.2%}) over {len(values)} groups")
+    if failures:
+        raise SystemExit(f"{failures} sketch check(s) failed.")
+    print("All sketch checks passed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the dashboard sale value sketches against exact quantiles.")
+    parser.add_argument("--database-url", help="Database to check (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--seed", action="store_true", help="Migrate and seed synthetic data first (see load_test.py)")
+    parser.add_argument("--categories", type=int, default=20)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--verbose", action="store_true", help="Also print the quantiles of every category")
+    main(parser.parse_args())
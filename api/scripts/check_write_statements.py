@@ -0,0 +1,195 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# --- Configuration ---
+# Run from the repository root: python -m api.scripts.check_write_statements
+# Sends each single-row write endpoint a request through the app (in-process) and
+# records every SQL statement it executes. Checks that each write commits exactly
+# once, reads server-generated columns back with INSERT/UPDATE ... RETURNING (no
+# SELECT of the written row after it), and stays within its statement budget.
+# Uses a fresh SQLite database unless --database-url points at a migrated one
+# (rows are created in it). The cache bus is off, so only the crud statements count.
+# Also checks that a product update in the same second as the previous write still
+# changes the ETag of the full sales export, and that a bulk upsert row too long for
+# its column fails alone.
+# Exits non-zero if any check fails.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+# Statements per request: the endpoint's own lookups plus one write per row
+BUDGETS = {
+    # exact-name check, INSERT ... RETURNING, cache_versions bump
+    "POST /categories": 3,
+    # get_category, name check, UPDATE ... RETURNING, cache_versions bump
+    "PATCH /categories/{id}": 4,
+    # get_category, INSERT ... RETURNING, cache_versions bump
+    "POST /products": 3,
+    # get_product, INSERT ... RETURNING, product counters UPDATE
+    "POST /sales/": 3,
+}
+
+
+class StatementRecorder:
+    """Statements and commits of the request threads (background workers excluded)."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._lock = threading.Lock()
+        self.statements = []
+        self.commits = 0
+        self.recording = False
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._commit)
+
+    @staticmethod
+    def _background():
+        return threading.current_thread().name.startswith(("cache-bus", "product-index", "export-render", "sale-buffer"))
+
+    def _statement(self, conn, cursor, statement, parameters, context, executemany):
+        if self.recording and not self._background():
+            with self._lock:
+                self.statements.append(" ".join(statement.split()))
+
+    def _commit(self, conn):
+        if self.recording and not self._background():
+            with self._lock:
+                self.commits += 1
+
+    def start(self):
+        with self._lock:
+            self.statements, self.commits, self.recording = [], 0, True
+
+    def stop(self):
+        with self._lock:
+            self.recording = False
+            return list(self.statements), self.commits
+
+
+def check(label, response, expected_status, recorder, table, verbose):
+    statements, commits = recorder.stop()
+    failures = []
+    if response.status_code != expected_status:
+        failures.append(f"status {response.status_code}, expected {expected_status}: {response.text}")
+    if commits != 1:
+        failures.append(f"{commits} commits, expected 1")
+    if len(statements) > BUDGETS[label]:
+        failures.append(f"{len(statements)} statements, budget {BUDGETS[label]}")
+    writes = [i for i, statement in enumerate(statements) if statement.startswith((f"INSERT INTO {table}", f"UPDATE {table}"))]
+    if not writes or "RETURNING" not in statements[writes[0]]:
+        failures.append(f"no INSERT/UPDATE ... RETURNING on {table}")
+    elif any(statement.startswith("SELECT") and f"FROM {table}" in statement for statement in statements[writes[0] + 1:]):
+        failures.append(f"{table} re-selected after the write")
+
+    print(f"{'FAIL' if failures else 'ok  '}  {label:<24} {len(statements)} statements, {commits} commit(s)")
+    for failure in failures:
+        print(f"        {failure}")
+    if verbose or failures:
+        for statement in statements:
+            print(f"          {statement[:160]}")
+    return len(failures)
+
+
+def main(args):
+    os.environ["CACHE_BUS"] = "off"
+    os.environ["SALES_BUFFER_ENABLED"] = "false"
+    os.environ["SALE_SKETCHES_SNAPSHOT_PATH"] = ""
+    tmp_dir = tempfile.TemporaryDirectory()
+    os.environ["EXPORT_CACHE_DIR"] = os.path.join(tmp_dir.name, "exports")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp_dir.name, 'writes.db')}"
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select, update
+    from api import models
+    from api.database import engine
+    from api.main import app
+    from api.migrate import upgrade_database
+
+    upgrade_database()
+    recorder = StatementRecorder(engine)
+    failures = 0
+    suffix = os.urandom(4).hex()
+    with TestClient(app) as client:
+        recorder.start()
+        response = client.post("/categories", json={"name": f"Write check {suffix}"})
+        failures += check("POST /categories", response, 201, recorder, "categories", args.verbose)
+        category_id = response.json()["id"]
+
+        recorder.start()
+        response = client.patch(f"/categories/{category_id}", json={"name": f"Write check {suffix} renamed"})
+        failures += check("PATCH /categories/{id}", response, 200, recorder, "categories", args.verbose)
+
+        recorder.start()
+        response = client.post("/products", json={"name": f"Write check {suffix}", "price": "12.50", "category_id": category_id})
+        failures += check("POST /products", response, 201, recorder, "products", args.verbose)
+        product_id = response.json()["id"]
+
+        recorder.start()
+        response = client.post("/sales/", json={"product_id": product_id, "quantity": 2})
+        failures += check("POST /sales/", response, 201, recorder, "sales", args.verbose)
+
+        # A failing write rolls the whole request back: nothing commits
+        recorder.start()
+        response = client.post("/sales/", json={"product_id": 0, "quantity": 1})
+        statements, commits = recorder.stop()
+        if response.status_code != 404 or commits != 0:
+            print(f"FAIL  POST /sales/ (unknown product): status {response.status_code}, {commits} commit(s), expected 404 and none")
+            failures += 1
+        else:
+            print(f"ok    POST /sales/ (unknown product) rolled back after {len(statements)} statement(s)")
+
+        # A price change committed in the same second (or, on PostgreSQL, late) leaves
+        # updated_at where it was: put it back to make that deterministic
+        etag = client.get("/export-csv/sales_with_products").headers["etag"]
+        products = models.Product.__table__
+        with engine.begin() as conn:
+            updated_at = conn.execute(select(products.c.updated_at).where(products.c.id == product_id)).scalar()
+        response = client.put("/products/bulk", json=[{
+            "id": product_id, "name": f"Write check {suffix}", "price": "99.00", "category_id": category_id,
+        }])
+        with engine.begin() as conn:
+            conn.execute(update(products).where(products.c.id == product_id).values(updated_at=updated_at))
+        # The previous file is served until the new version is rendered in the background
+        for _ in range(50):
+            response = client.get("/export-csv/sales_with_products", headers={"If-None-Match": etag})
+            if response.status_code != 304:
+                break
+            time.sleep(0.1)
+        if response.status_code != 200 or response.headers.get("etag") == etag:
+            print(f"FAIL  export ETag after a product update: status {response.status_code}, ETag {response.headers.get('etag')} (was {etag})")
+            failures += 1
+        else:
+            print("ok    export ETag changes with a same-second product update")
+
+        response = client.put("/products/bulk", json=[
+            {"id": product_id, "name": "x" * 256, "price": "1.00", "category_id": category_id},
+            {"id": product_id, "name": f"Write check {suffix}", "price": "2.00", "category_id": category_id, "brand": "x" * 101},
+            {"id": 2**31, "name": f"Write check {suffix}", "price": "3.00", "category_id": category_id},
+        ])
+        statuses = [result["status"] for result in response.json()["results"]] if response.status_code == 200 else []
+        if statuses != ["error", "error", "error"]:
+            print(f"FAIL  bulk upsert of oversized fields: status {response.status_code}, outcomes {statuses or response.text}")
+            failures += 1
+        else:
+            print("ok    bulk upsert reports oversized fields per row")
+
+    engine.dispose()
+    tmp_dir.cleanup()
+    if failures:
+        raise SystemExit(f"{failures} write check(s) failed.")
+    print("All writes commit once and read server defaults back with RETURNING.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count the SQL statements and commits of each single-row write endpoint.")
+    parser.add_argument("--database-url", help="Migrated database to write to (defaults to a temporary SQLite file)")
+    parser.add_argument("--verbose", action="store_true", help="Print the statements of every request")
+    main(parser.parse_args())
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+# --- Configuration ---
+# Run from the repository root, e.g.:
+#   python -m api.scripts.load_test --seed --products 10000 --sales 200000 --concurrency 32 --duration 60 --output report.json
+#   python -m api.scripts.load_test --compare baseline.json --output report.json
+# By default requests are driven in-process against api.main:app through its ASGI interface,
+# using the DATABASE_URL from api/.env (or --database-url). Use --base-url to target a running server instead.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.join(SCRIPT_DIR, '..', '..')
+sys.path.insert(0, REPO_ROOT)
+
+DEFAULT_MIX = "products_search=70,create_sale=20,dashboard=5,export_csv=5"
+SEARCH_WORDS = ["smart", "pro", "max", "ultra", "mini", "tv", "phone", "laptop", "oven", "fridge", "air", "plus"]
+
+
+# --- Seeding ---
+def seed_at_scale(categories: int, products: int, sales: int, batch_size: int = 5000):
+    """Fills an empty database with synthetic categories, products and sales."""
+    from sqlalchemy import insert, select
+    from api import crud, models
+    from api.database import SessionLocal, engine
+    from api.migrate import upgrade_database
+
+    rng = random.Random(42)
+    now = datetime.now(timezone.utc)
+    print(f"Seeding {categories} categories, {products} products, {sales} sales...")
+    upgrade_database()
+    with engine.begin() as conn:
+        conn.execute(insert(models.Category.__table__), [{"name": f"Load Category {i}"} for i in range(1, categories + 1)])
+        category_ids = [row.id for row in conn.execute(models.Category.__table__.select())]
+
+        prices = {}
+        for start in range(0, products, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, products)):
+                words = " ".join(rng.sample(SEARCH_WORDS, 2))
+                rows.append({
+                    "name": f"Product {i} {words}",
+                    "description": f"Synthetic product {i} " + "lorem ipsum " * rng.randint(5, 50),
+                    "price": Decimal(rng.randint(100, 500000)) / 100,
+                    "category_id": rng.choice(category_ids),
+                    "brand": f"Brand {rng.randint(1, 50)}",
+                })
+            conn.execute(insert(models.Product.__table__), rows)
+        for row in conn.execute(select(models.Product.id, models.Product.price)):
+            prices[row.id] = row.price
+        product_ids = list(prices)
+
+        for start in range(0, sales, batch_size):
+            rows = []
+            for _ in range(start, min(start + batch_size, sales)):
+                product_id = rng.choice(product_ids)
+                quantity = rng.randint(1, 10)
+                rows.append({
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "total_price": prices[product_id] * quantity,
+                    "date": now - timedelta(seconds=rng.randint(0, 365 * 24 * 3600)),
+                })
+            conn.execute(insert(models.Sale.__table__), rows)
+            print(f"  sales: {min(start + batch_size, sales)}/{sales}")
+
+    db = SessionLocal()
+    try:
+        crud.reconcile_product_sales_counters(db)
+    finally:
+        db.close()
+    print("-> Seeding complete.")
+
+
+# --- Scenarios ---
+class Scenarios:
+    def __init__(self, product_ids, category_ids, rng):
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.rng = rng
+
+    def products_search(self, client):
+        params = {"name": self.rng.choice(SEARCH_WORDS), "limit": 20}
+        if self.rng.random() < 0.3 and self.category_ids:
+            params["category_id"] = self.rng.choice(self.category_ids)
+        return client.get("/products", params=params)
+
+    def create_sale(self, client):
+        return client.post("/sales/", json={"product_id": self.rng.choice(self.product_ids), "quantity": self.rng.randint(1, 5)})
+
+    def dashboard(self, client):
+        params = {"category_id": self.rng.choice(self.category_ids)} if self.rng.random() < 0.5 and self.category_ids else {}
+        return client.get("/dashboard", params=params)
+
+    def export_csv(self, client):
+        return client.get("/export-csv/sales_with_products")
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(Scenarios, name):
+            raise SystemExit(f"Unknown scenario '{name}'.")
+        weights[name] = float(weight)
+    return weights
+
+
+# --- Runner ---
+async def run_load(client, scenarios, weights, concurrency, duration, total_requests):
+    names, weight_values = list(weights), list(weights.values())
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [total_requests] if total_requests else None
+
+    async def worker():
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            name = scenarios.rng.choices(names, weights=weight_values)[0]
+            started = time.perf_counter()
+            try:
+                response = await getattr(scenarios, name)(client)
+                ok = response.status_code < 400
+            except Exception:
+                ok = False
+            samples[name].append(time.perf_counter() - started)
+            if not ok:
+                errors[name] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - started
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def build_report(samples, errors, elapsed, args):
+    routes = {}
+    for name, latencies in samples.items():
+        latencies.sort()
+        count = len(latencies)
+        routes[name] = {
+            "requests": count,
+            "errors": errors[name],
+            "error_rate": errors[name] / count if count else 0.0,
+            "throughput_rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000 if count else None,
+            "p95_ms": percentile(latencies, 95) * 1000 if count else None,
+            "p99_ms": percentile(latencies, 99) * 1000 if count else None,
+            "max_ms": latencies[-1] * 1000 if count else None,
+        }
+    total = sum(len(v) for v in samples.values())
+    total_errors = sum(errors.values())
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "target": args.base_url or "in-process api.main:app",
+            "concurrency": args.concurrency,
+            "duration_s": elapsed,
+            "mix": parse_mix(args.mix),
+        },
+        "overall": {
+            "requests": total,
+            "errors": total_errors,
+            "error_rate": total_errors / total if total else 0.0,
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+        },
+        "routes": routes,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_report(report, baseline=None):
+    overall = report["overall"]
+    print(f"\nTotal: {overall['requests']} requests, {overall['throughput_rps']:.1f} req/s, error rate {overall['error_rate']:.2%}")
+    print(f"{'route':<18}{'reqs':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, route in report["routes"].items():
+        if not route["requests"]:
+            continue
+        line = (f"{name:<18}{route['requests']:>8}{route['throughput_rps']:>9.1f}"
+                f"{route['p50_ms']:>10.1f}{route['p95_ms']:>10.1f}{route['p99_ms']:>10.1f}{route['error_rate']:>9.2%}")
+        base = (baseline or {}).get("routes", {}).get(name)
+        if base and base.get("p99_ms"):
+            line += f"   p99 vs baseline: {(route['p99_ms'] - base['p99_ms']) / base['p99_ms']:+.1%}"
+        print(line)
+
+
+async def main(args):
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+
+    import httpx
+
+    if args.seed:
+        seed_at_scale(args.categories, args.products, args.sales)
+
+    from api import models
+    from api.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        product_ids = [row[0] for row in db.query(models.Product.id).all()]
+        category_ids = [row[0] for row in db.query(models.Category.id).all()]
+    finally:
+        db.close()
+    if not product_ids:
+        raise SystemExit("No products found. Seed the database first (--seed).")
+
+    scenarios = Scenarios(product_ids, category_ids, random.Random(args.random_seed))
+    weights = parse_mix(args.mix)
+    print(f"Running mix {weights} with concurrency {args.concurrency}...")
+
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+            samples, errors, elapsed = await run_load(client, scenarios, weights, args.concurrency, args.duration, args.requests)
+    else:
+        from api.main import app
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=args.timeout) as client:
+                samples, errors, elapsed = await run_load(client, scenarios, weights, args.concurrency, args.duration, args.requests)
+
+    report = build_report(samples, errors, elapsed, args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive api.main:app with a weighted mix of realistic requests.")
+    parser.add_argument("--database-url", help="Database to run against (defaults to DATABASE_URL / api/.env)")
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--seed", action="store_true", help="Seed synthetic data before running")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted scenarios (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run (0 to use --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Total requests to send when --duration is 0")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Baseline JSON report to compare p99 latencies against")
+    asyncio.run(main(parser.parse_args()))
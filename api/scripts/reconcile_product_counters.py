@@ -0,0 +1,26 @@
+import os
+import sys
+
+# --- Configuration ---
+# Run from the repository root: python -m api.scripts.reconcile_product_counters
+# Uses the same DATABASE_URL as the API (api/.env).
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, '..', '..'))
+
+from api import crud # noqa: E402
+from api.database import SessionLocal # noqa: E402
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    print("Rebuilding product sales counters (units_sold, revenue, last_sold_at) from sales...")
+    db_session = SessionLocal()
+    try:
+        fixed = crud.reconcile_product_sales_counters(db_session)
+        print(f"-> Products with drifted counters corrected: {fixed}")
+    except Exception as e:
+        print(f"An error occurred during reconciliation: {e}")
+        db_session.rollback()
+        sys.exit(1)
+    finally:
+        db_session.close()
@@ -0,0 +1,162 @@
+from collections import deque
+from datetime import datetime, timezone
+import json
+import logging
+import random
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+
+_WHITESPACE = re.compile(r"\s+")
+# An expanded IN list, e.g. "IN (%(id_1_1)s, %(id_1_2)s)" or "IN (?, ?, ?)"
+_PLACEHOLDER = r"(?:%\([^)]+\)s|%s|\?|:\w+)"
+_EXPANDED_LIST = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")+\s*\)")
+
+class SlowQueryLog:
+    """
+    Records statements slower than `threshold_ms` in a bounded in-memory ring buffer.
+
+    Each record holds the normalized SQL, the shape (names and types, never the
+    values) of its parameters, the crud function that issued it and, for a sample
+    of SELECTs, the plan from `EXPLAIN (ANALYZE off)` run on the same connection
+    (inside a savepoint on PostgreSQL, so a failing EXPLAIN can't abort the
+    request's transaction).
+    Records can also be appended to a JSON-lines file.
+    """
+
+    def __init__(self, threshold_ms: float = 200.0, explain_sample_rate: float = 0.1, max_entries: int = 200, log_file: Optional[str] = None):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.log_file = log_file
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self.recorded_total = 0
+
+    def install(self, engine):
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < self.threshold_ms:
+            return
+
+        record = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "sql": self.normalize(statement),
+            "parameters": self.parameter_shape(parameters, executemany),
+            "caller": self._find_caller(),
+            "plan": None,
+        }
+        if not executemany and random.random() < self.explain_sample_rate:
+            record["plan"] = self._explain(conn, statement, parameters)
+        self._store(record)
+
+    @staticmethod
+    def normalize(statement: str) -> str:
+        statement = _WHITESPACE.sub(" ", statement).strip()
+        return _EXPANDED_LIST.sub("(...)", statement)
+
+    @staticmethod
+    def parameter_shape(parameters, executemany: bool):
+        def shape(params):
+            if isinstance(params, dict):
+                return {key: type(value).__name__ for key, value in params.items()}
+            if isinstance(params, (list, tuple)):
+                return [type(value).__name__ for value in params]
+            return type(params).__name__
+
+        if executemany:
+            rows = list(parameters)
+            return {"executemany": len(rows), "row": shape(rows[0]) if rows else None}
+        return shape(parameters)
+
+    @staticmethod
+    def _find_caller() -> Optional[str]:
+        # The innermost frame from our crud module, else the innermost app frame.
+        frame = sys._getframe(2)
+        fallback = None
+        while frame is not None:
+            module = frame.f_globals.get("__name__", "")
+            if module.endswith(".crud"):
+                return f"{module}.{frame.f_code.co_name}"
+            if fallback is None and module.startswith("api.") and not module.endswith(".slow_query_log"):
+                fallback = f"{module}.{frame.f_code.co_name}"
+            frame = frame.f_back
+        return fallback
+
+    @staticmethod
+    def _explain(conn, statement: str, parameters) -> Optional[str]:
+        if not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            explain_sql = "EXPLAIN (ANALYZE off) " + statement
+        elif dialect == "sqlite":
+            explain_sql = "EXPLAIN QUERY PLAN " + statement
+        else:
+            explain_sql = "EXPLAIN " + statement
+        # PostgreSQL aborts the whole transaction on any error; the savepoint confines
+        # a failing EXPLAIN to itself (not needed, nor allowed, in autocommit).
+        savepoint = dialect == "postgresql" and not getattr(conn.connection, "autocommit", False)
+        # A raw DBAPI cursor keeps EXPLAIN out of the engine events (and this log).
+        cursor = conn.connection.cursor()
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(explain_sql, parameters)
+                plan = "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+            except Exception as e:
+                if savepoint:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                return f"EXPLAIN failed: {e}"
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            cursor.close()
+
+    def _store(self, record: dict):
+        with self._lock:
+            self._entries.append(record)
+            self.recorded_total += 1
+            if self.log_file:
+                try:
+                    with open(self.log_file, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    logging.error(f"Slow query log: could not write to {self.log_file}: {e}")
+
+    def entries(self, limit: Optional[int] = None):
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse() # Most recent first
+        return entries[:limit] if limit is not None else entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "capacity": self._entries.maxlen,
+            "recorded_total": self.recorded_total,
+            "log_file": self.log_file,
+        }